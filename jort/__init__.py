@@ -3,8 +3,9 @@ from __future__ import absolute_import, division, print_function
 from ._version import __version__
 
 from .exceptions import JortException, JortCredentialException
-from .config import init, config_general, config_email, config_text
+from .config import init, config_general, config_email, config_text, config_webhook
 from .tracker import Tracker, track
 from .track_cli import track_new, track_existing
-from .reporting_callbacks import EmailNotification, TextNotification, PrintReport
-from .database import print_jobs
\ No newline at end of file
+from .reporting_callbacks import EmailNotification, TextNotification, PrintReport, WebhookNotification
+from .database import print_jobs
+from .dispatch import flush as flush_notifications
@@ -0,0 +1,776 @@
+"""Aggregate and compare runtime statistics over saved job history."""
+
+import contextlib
+import itertools
+import json
+import math
+import random
+
+import click
+
+from . import database
+from . import datetime_utils
+from . import exceptions
+from . import phases
+from . import rollups
+from . import sketch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+GROUP_KEYS = {
+    "command": "jobs.command_hash",
+    "session": "sessions.session_name",
+    "machine": "jobs.machine",
+    "git_sha": "jobs.git_sha",
+}
+QUANTILES = (50, 95, 99)
+ROLLUP_FILTERS = ("session", "since", "until", "command_hash")
+PARQUET_COLUMNS = (
+    ("job_id", "jobs.job_id", "string"),
+    ("session_name", "sessions.session_name", "string"),
+    ("name", "jobs.job_name", "string"),
+    ("command_hash", "jobs.command_hash", "string"),
+    ("status", "jobs.status", "string"),
+    ("machine", "jobs.machine", "string"),
+    ("git_sha", "jobs.git_sha", "string"),
+    ("date_created", "jobs.date_created", "timestamp"),
+    ("runtime", "jobs.runtime", "float64"),
+    ("exit_code", "jobs.exit_code", "int64"),
+    ("peak_rss_bytes", "json_extract(jobs.metrics_json, '$.peak_rss_bytes')", "int64"),
+    ("cpu_user_seconds", "json_extract(jobs.metrics_json, '$.cpu_user_seconds')", "float64"),
+    ("cpu_system_seconds", "json_extract(jobs.metrics_json, '$.cpu_system_seconds')", "float64"),
+)
+
+
+def _read_samples(by, batch_size=10000, **filters):
+    """
+    Read creation times, runtimes, and peak RSS ordered by group, with each
+    group's key, start offset, and most recent job name.
+    """
+    if by not in GROUP_KEYS:
+        raise exceptions.JortException(f"Cannot group by `{by}`")
+    database.ensure_database()
+    clauses, params = database._job_filters(**filters)
+    clauses.extend(["jobs.runtime IS NOT NULL", "jobs.date_created IS NOT NULL"])
+    key = GROUP_KEYS[by]
+    sql = (
+        f"SELECT {key}, jobs.date_created, jobs.runtime, "
+        "json_extract(jobs.metrics_json, '$.peak_rss_bytes'), jobs.job_name FROM jobs "
+    )
+    if by == "session" or filters.get("session") is not None:
+        sql += "JOIN sessions ON jobs.session_id = sessions.session_id "
+    sql += f"WHERE {' AND '.join(clauses)} ORDER BY {key}, jobs.date_created"
+    keys, created, runtimes, rss, names = [], [], [], [], []
+    with contextlib.closing(database._connect()) as connection:
+        cursor = connection.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = list(zip(*rows))
+            keys.extend(batch[0])
+            created.extend(batch[1])
+            runtimes.extend(batch[2])
+            rss.extend(batch[3])
+            names.extend(batch[4])
+    starts = [index for index in range(len(keys)) if index == 0 or keys[index] != keys[index - 1]]
+    latest_names = [names[index - 1] for index in starts[1:] + [len(keys)]]
+    return [keys[index] for index in starts], latest_names, starts, created, runtimes, rss
+
+
+def _interpolate(values, fraction):
+    """Linearly interpolated quantile of sorted values, as numpy.percentile."""
+    position = fraction * (len(values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _summarize_python(starts, created, runtimes, rss):
+    ends = starts[1:] + [len(runtimes)]
+    summaries = []
+    for start, end in zip(starts, ends):
+        values = runtimes[start:end]
+        count = len(values)
+        mean = sum(values) / count
+        first_day = rollups.day_of(created[start])
+        days = [rollups.day_of(value) - first_day for value in created[start:end]]
+        mean_day = sum(days) / count
+        sxx = sum((day - mean_day) ** 2 for day in days)
+        sxy = sum((day - mean_day) * (value - mean) for day, value in zip(days, values))
+        syy = sum((value - mean) ** 2 for value in values)
+        ordered = sorted(values)
+        peaks = [value for value in rss[start:end] if value is not None]
+        summaries.append({
+            "count": count,
+            "mean": mean,
+            "stdev": math.sqrt(syy / (count - 1)) if count > 1 else 0.0,
+            "min": ordered[0],
+            "max": ordered[-1],
+            **{f"p{q}": _interpolate(ordered, q / 100) for q in QUANTILES},
+            "trend_per_day": sxy / sxx if sxx > 0 else 0.0,
+            "peak_rss_bytes": max(peaks) if peaks else None,
+        })
+    return summaries
+
+
+def _summarize_numpy(starts, created, runtimes, rss):
+    runtimes = numpy.asarray(runtimes, dtype=float)
+    created = numpy.asarray(created, dtype=numpy.int64)
+    rss = numpy.asarray(rss, dtype=float)
+    starts = numpy.asarray(starts)
+    counts = numpy.diff(numpy.append(starts, len(runtimes)))
+    groups = numpy.repeat(numpy.arange(len(starts)), counts)
+
+    means = numpy.add.reduceat(runtimes, starts) / counts
+    # Whole days since each group's first run, as in the daily rollups.
+    days = rollups.day_of(created)
+    days = (days - days[starts][groups]).astype(float)
+    mean_days = numpy.add.reduceat(days, starts) / counts
+    dx = days - mean_days[groups]
+    dy = runtimes - means[groups]
+    sxx = numpy.add.reduceat(dx * dx, starts)
+    sxy = numpy.add.reduceat(dx * dy, starts)
+    syy = numpy.add.reduceat(dy * dy, starts)
+    stdevs = numpy.sqrt(numpy.divide(syy, counts - 1, out=numpy.zeros_like(syy),
+                                     where=counts > 1))
+    trends = numpy.divide(sxy, sxx, out=numpy.zeros_like(sxy), where=sxx > 0)
+
+    # Sort runtimes within each group once; quantile positions are then offsets.
+    ordered = runtimes[numpy.lexsort((runtimes, groups))]
+    quantiles = {}
+    for q in QUANTILES:
+        position = starts + q / 100 * (counts - 1)
+        lower = numpy.floor(position).astype(int)
+        upper = numpy.minimum(lower + 1, starts + counts - 1)
+        quantiles[q] = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+    peaks = numpy.fmax.reduceat(rss, starts)
+
+    return [
+        {
+            "count": int(counts[index]),
+            "mean": float(means[index]),
+            "stdev": float(stdevs[index]),
+            "min": float(ordered[starts[index]]),
+            "max": float(ordered[starts[index] + counts[index] - 1]),
+            **{f"p{q}": float(quantiles[q][index]) for q in QUANTILES},
+            "trend_per_day": float(trends[index]),
+            "peak_rss_bytes": None if math.isnan(peaks[index]) else int(peaks[index]),
+        }
+        for index in range(len(starts))
+    ]
+
+
+def _summarize_rollups(by, session=None, since=None, until=None, command_hash=None):
+    """Summarize daily rollups of successful jobs; days overlapping the range count."""
+    database.ensure_database()
+    key = "runtime_rollups.command_hash" if by == "command" else "sessions.session_name"
+    clauses, params = [], []
+    if session is not None:
+        clauses.append("sessions.session_name = ?")
+        params.append(session)
+    if since is not None:
+        clauses.append("(runtime_rollups.day + 1) * ? > ?")
+        params.extend([rollups.US_PER_DAY, datetime_utils.parse_time(since)])
+    if until is not None:
+        clauses.append("runtime_rollups.day * ? < ?")
+        params.extend([rollups.US_PER_DAY, datetime_utils.parse_time(until)])
+    if command_hash is not None:
+        clauses.append("runtime_rollups.command_hash = ?")
+        params.append(command_hash)
+    sql = (
+        f"SELECT {key}, runtime_rollups.day, runtime_rollups.count, runtime_rollups.total, "
+        "runtime_rollups.total_squares, runtime_rollups.minimum, runtime_rollups.maximum, "
+        "runtime_rollups.max_rss, runtime_rollups.sketch FROM runtime_rollups "
+        "JOIN sessions ON runtime_rollups.session_id = sessions.session_id"
+    )
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {key}, runtime_rollups.day"
+    groups = []
+    with contextlib.closing(database._connect()) as connection:
+        for value, rows in itertools.groupby(connection.execute(sql, params).fetchall(),
+                                             key=lambda row: row[0]):
+            rows = list(rows)
+            merged = sketch.QuantileSketch.from_json(rows[0][8])
+            for row in rows[1:]:
+                merged.merge(sketch.QuantileSketch.from_json(row[8]))
+            count = sum(row[2] for row in rows)
+            total = sum(row[3] for row in rows)
+            squares = sum(row[4] for row in rows)
+            # Weighted least squares over whole days since the group's first day.
+            first_day = rows[0][1]
+            sx = sum(row[2] * (row[1] - first_day) for row in rows)
+            sxx = sum(row[2] * (row[1] - first_day) ** 2 for row in rows)
+            sxy = sum(row[3] * (row[1] - first_day) for row in rows)
+            denominator = count * sxx - sx * sx
+            peaks = [row[7] for row in rows if row[7] is not None]
+            groups.append({
+                "command_hash" if by == "command" else by: value,
+                "count": count,
+                "mean": total / count,
+                "stdev": (math.sqrt(max(0.0, (squares - total * total / count) / (count - 1)))
+                          if count > 1 else 0.0),
+                "min": min(row[5] for row in rows),
+                "max": max(row[6] for row in rows),
+                **{f"p{q}": merged.quantile(q / 100) for q in QUANTILES},
+                "trend_per_day": ((count * sxy - sx * total) / denominator
+                                  if denominator > 0 else 0.0),
+                "peak_rss_bytes": max(peaks) if peaks else None,
+            })
+        if by == "command":
+            for group in groups:
+                row = connection.execute(
+                    "SELECT job_name FROM jobs WHERE command_hash = ? LIMIT 1",
+                    (group["command_hash"],),
+                ).fetchone()
+                group["name"] = row[0] if row else None
+    return groups
+
+
+def _on_day_boundary(value):
+    """Whether a time bound selects whole UTC days of rollups exactly."""
+    return value is None or datetime_utils.parse_time(value) % rollups.US_PER_DAY == 0
+
+
+def summarize(by="command", status="success", exact=False, **filters):
+    """
+    Summarize runtimes of saved jobs per group.
+
+    Summaries of successful jobs by ``command`` or ``session``, filtered at
+    most by session, command, and ``since``/``until`` bounds falling on UTC
+    midnight, are read from the daily runtime rollups: they cover pruned
+    history too, and their percentiles are nearest-rank values (the sample at
+    rank ``q * (count - 1)``, rounded down) within 1%, rather than
+    interpolated between samples. Other summaries, including any sub-day time
+    bound such as ``since="2h"``, or ``exact=True``, scan the matching jobs,
+    computing aggregates with NumPy when it is installed and in pure Python
+    otherwise.
+
+    Parameters
+    ----------
+    by : str, optional
+        Group by ``command`` (fingerprint), ``session``, ``machine``, or ``git_sha``
+    status : str or list, optional
+        Only include jobs with these statuses
+    exact : bool, optional
+        Always scan saved jobs instead of reading rollups
+    **filters
+        Further filters accepted by :func:`jort.database.iter_jobs`
+
+    Returns
+    -------
+    groups : list
+        One dictionary per group with ``count``, ``mean``, ``stdev``, ``min``,
+        ``max``, ``p50``, ``p95``, ``p99``, ``trend_per_day`` (seconds of
+        runtime change per UTC day, by least squares), and ``peak_rss_bytes``,
+        ordered by total runtime
+    """
+    statuses = [status] if isinstance(status, str) else list(status or [])
+    if (not exact and by in ("command", "session") and statuses == ["success"]
+            and all(value is None for name, value in filters.items()
+                    if name not in ROLLUP_FILTERS)
+            and all(_on_day_boundary(filters.get(name)) for name in ("since", "until"))):
+        groups = _summarize_rollups(by, **{name: filters.get(name) for name in ROLLUP_FILTERS})
+        groups.sort(key=lambda group: group["count"] * group["mean"], reverse=True)
+        return groups
+    keys, names, starts, created, runtimes, rss = _read_samples(by, status=status, **filters)
+    if not starts:
+        return []
+    summarize_groups = _summarize_python if numpy is None else _summarize_numpy
+    field = "command_hash" if by == "command" else by
+    groups = [
+        {field: key, **summary}
+        for key, summary in zip(keys, summarize_groups(starts, created, runtimes, rss))
+    ]
+    if by == "command":
+        for group, name in zip(groups, names):
+            group["name"] = name
+    groups.sort(key=lambda group: group["count"] * group["mean"], reverse=True)
+    return groups
+
+
+def summarize_phases(status="success", **filters):
+    """
+    Compare phase durations across saved runs of each command.
+
+    Phases are read from jobs tracked with a phase regex (see
+    :class:`jort.phases.PhaseTimer`); a phase repeated within one run counts
+    with its total duration.
+
+    Parameters
+    ----------
+    status : str or list, optional
+        Only include jobs with these statuses
+    **filters
+        Further filters accepted by :func:`jort.database.iter_jobs`
+
+    Returns
+    -------
+    groups : list
+        One dictionary per command and phase, in phase order, with
+        ``command_hash``, ``name`` (the latest job name), ``phase``, ``count``,
+        ``mean``, ``p50``, ``p95``, ``latest`` seconds, and ``change_percent``
+        of the latest run against the median of the earlier ones
+    """
+    database.ensure_database()
+    clauses, params = database._job_filters(status=status, **filters)
+    clauses.append("json_extract(jobs.metadata_json, '$.phases') IS NOT NULL")
+    sql = ("SELECT jobs.command_hash, jobs.job_name, "
+           "json_extract(jobs.metadata_json, '$.phases') FROM jobs ")
+    if filters.get("session") is not None:
+        sql += "JOIN sessions ON jobs.session_id = sessions.session_id "
+    sql += f"WHERE {' AND '.join(clauses)} ORDER BY jobs.command_hash, jobs.date_created"
+    with contextlib.closing(database._connect()) as connection:
+        rows = connection.execute(sql, params).fetchall()
+    groups = []
+    for command_hash, runs in itertools.groupby(rows, key=lambda row: row[0]):
+        runs = list(runs)
+        durations = {}
+        for run in runs:
+            for phase, seconds in phases.totals(json.loads(run[2])).items():
+                durations.setdefault(phase, []).append(seconds)
+        for phase, values in durations.items():
+            ordered = sorted(values)
+            earlier = sorted(values[:-1])
+            baseline = _interpolate(earlier, 0.5) if earlier else None
+            groups.append({
+                "command_hash": command_hash,
+                "name": runs[-1][1],
+                "phase": phase,
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": _interpolate(ordered, 0.5),
+                "p95": _interpolate(ordered, 0.95),
+                "latest": values[-1],
+                "change_percent": (100 * (values[-1] - baseline) / baseline
+                                   if baseline else None),
+            })
+    return groups
+
+
+def write_parquet(path, batch_size=100000, **filters):
+    """
+    Write saved jobs, with resource metrics as columns, to a Parquet file.
+
+    Rows are written in record batches, so memory use does not grow with the
+    size of the history. Requires ``pyarrow``.
+
+    Parameters
+    ----------
+    path : str
+        Output filename
+    batch_size : int, optional
+        Rows per record batch
+    **filters
+        Filters accepted by :func:`jort.database.iter_jobs`
+
+    Returns
+    -------
+    count : int
+        Number of jobs written
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise exceptions.JortException(
+            "Parquet export requires pyarrow; install it with `pip install jort[analytics]`"
+        ) from error
+    types = {
+        "string": pyarrow.string(),
+        "timestamp": pyarrow.timestamp("us", tz="UTC"),
+        "float64": pyarrow.float64(),
+        "int64": pyarrow.int64(),
+    }
+    schema = pyarrow.schema([(name, types[kind]) for name, _, kind in PARQUET_COLUMNS])
+    database.ensure_database()
+    clauses, params = database._job_filters(**filters)
+    sql = (
+        f"SELECT {', '.join(expression for _, expression, _ in PARQUET_COLUMNS)} FROM jobs "
+        "LEFT JOIN sessions ON jobs.session_id = sessions.session_id"
+    )
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY jobs.date_created, jobs.job_id"
+    count = 0
+    with contextlib.closing(database._connect()) as connection, \
+            pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        cursor = connection.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(column, type=field.type)
+                 for column, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            count += len(rows)
+    return count
+
+
+COMPARE_METRICS = {
+    "runtime": "jobs.runtime",
+    "peak_rss_bytes": "json_extract(jobs.metrics_json, '$.peak_rss_bytes')",
+}
+# Exact Mann-Whitney p-values are enumerated up to this many sample pairs.
+EXACT_U_PAIRS = 400
+
+
+def _ranks(values):
+    """Average ranks (1-based) and tie-group sizes of values."""
+    order = sorted(range(len(values)), key=values.__getitem__)
+    ranks = [0.0] * len(values)
+    ties = []
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for position in range(start, end + 1):
+            ranks[order[position]] = (start + end) / 2 + 1
+        ties.append(end - start + 1)
+        start = end + 1
+    return ranks, ties
+
+
+def _u_distribution(n1, n2):
+    """Counts of each U statistic value over all arrangements of two samples."""
+    # counts[j][u]: arrangements of i and j values with statistic u, built row by row.
+    counts = [[1] for _ in range(n2 + 1)]
+    for i in range(1, n1 + 1):
+        row = [[1]]
+        for j in range(1, n2 + 1):
+            left, up = counts[j], row[j - 1]
+            size = i * j + 1
+            current = [0] * size
+            for u, count in enumerate(left):
+                if u + j < size:
+                    current[u + j] += count
+            for u, count in enumerate(up):
+                current[u] += count
+            row.append(current)
+        counts = row
+    return counts[n2]
+
+
+def mann_whitney_u(a, b):
+    """
+    Two-sided Mann-Whitney U test of whether two samples differ in location.
+
+    The p-value is exact for small samples without ties, and otherwise uses
+    the normal approximation with tie and continuity corrections.
+
+    Returns
+    -------
+    u : float
+        U statistic of ``a``
+    p_value : float
+        Two-sided p-value
+    """
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        raise ValueError("Both samples must be non-empty")
+    ranks, ties = _ranks(list(a) + list(b))
+    u = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    if n1 * n2 <= EXACT_U_PAIRS and max(ties) == 1:
+        distribution = _u_distribution(n1, n2)
+        extreme = min(u, n1 * n2 - u)
+        tail = sum(distribution[:math.floor(extreme) + 1]) / sum(distribution)
+        return u, min(1.0, 2 * tail)
+    n = n1 + n2
+    tie_term = sum(t ** 3 - t for t in ties) / (n * (n - 1))
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term)
+    if variance <= 0:
+        return u, 1.0
+    z = max(0.0, abs(u - mean) - 0.5) / math.sqrt(variance)
+    return u, math.erfc(z / math.sqrt(2))
+
+
+def bootstrap_change(a, b, resamples=2000, confidence=0.95, seed=None):
+    """
+    Percent change of the median from ``a`` to ``b`` with a bootstrap interval.
+
+    Returns
+    -------
+    change : float
+        ``(median(b) / median(a) - 1) * 100``
+    interval : tuple
+        Percentile bootstrap confidence interval of the change
+    """
+    median_a = _interpolate(sorted(a), 0.5)
+    median_b = _interpolate(sorted(b), 0.5)
+    if median_a == 0:
+        return None, (None, None)
+    change = (median_b / median_a - 1) * 100
+    tail = (1 - confidence) / 2
+    if numpy is not None:
+        generator = numpy.random.default_rng(seed)
+        medians_a = numpy.median(generator.choice(a, (resamples, len(a))), axis=1)
+        medians_b = numpy.median(generator.choice(b, (resamples, len(b))), axis=1)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            changes = (medians_b / medians_a - 1) * 100
+        changes = numpy.sort(changes[numpy.isfinite(changes)])
+        if not len(changes):
+            return change, (None, None)
+        low, high = numpy.quantile(changes, (tail, 1 - tail))
+        return change, (float(low), float(high))
+    generator = random.Random(seed)
+    changes = []
+    for _ in range(resamples):
+        resampled_a = _interpolate(sorted(generator.choices(a, k=len(a))), 0.5)
+        resampled_b = _interpolate(sorted(generator.choices(b, k=len(b))), 0.5)
+        if resampled_a:
+            changes.append((resampled_b / resampled_a - 1) * 100)
+    if not changes:
+        return change, (None, None)
+    changes.sort()
+    return change, (_interpolate(changes, tail), _interpolate(changes, 1 - tail))
+
+
+def _session_samples(session):
+    """Successful samples of each metric per command fingerprint in a session."""
+    database.ensure_database()
+    sql = (
+        "SELECT jobs.command_hash, jobs.job_name, "
+        + ", ".join(COMPARE_METRICS.values())
+        + " FROM jobs JOIN sessions ON jobs.session_id = sessions.session_id "
+        "WHERE sessions.session_name = ? AND jobs.status = 'success' "
+        "AND jobs.command_hash IS NOT NULL"
+    )
+    samples = {}
+    with contextlib.closing(database._connect()) as connection:
+        for row in connection.execute(sql, (session,)):
+            entry = samples.setdefault(
+                row[0], {"name": row[1], **{metric: [] for metric in COMPARE_METRICS}}
+            )
+            for metric, value in zip(COMPARE_METRICS, tuple(row)[2:]):
+                if value is not None:
+                    entry[metric].append(value)
+    return samples
+
+
+def compare_sessions(baseline, candidate, threshold=5.0, alpha=0.05, resamples=2000,
+                     confidence=0.95, seed=None):
+    """
+    Compare every command run in two sessions, paired by command fingerprint.
+
+    For runtime and peak RSS, the change in median from ``baseline`` to
+    ``candidate`` gets a bootstrap confidence interval and a Mann-Whitney U
+    test. A change is significant when the test rejects at ``alpha`` and the
+    interval excludes zero; it is a regression or improvement when it is also
+    larger than ``threshold`` percent.
+
+    Parameters
+    ----------
+    baseline, candidate : str
+        Session names
+    threshold : float, optional
+        Smallest percent change reported as a regression or improvement
+    alpha : float, optional
+        Significance level of the Mann-Whitney U test
+    resamples : int, optional
+        Bootstrap resamples per comparison
+    confidence : float, optional
+        Confidence level of the bootstrap interval
+    seed : int, optional
+        Seed for reproducible intervals
+
+    Returns
+    -------
+    comparisons : list
+        One dictionary per command with ``command_hash``, ``name``, and
+        per-metric results, including a ``verdict`` of ``regression``,
+        ``improvement``, ``unchanged``, or ``insufficient``; commands run in
+        only one session have a ``verdict`` of ``added`` or ``removed``
+    """
+    before = _session_samples(baseline)
+    after = _session_samples(candidate)
+    if not before:
+        raise exceptions.JortException(f"No successful jobs in session `{baseline}`")
+    if not after:
+        raise exceptions.JortException(f"No successful jobs in session `{candidate}`")
+    comparisons = []
+    for command_hash in sorted(set(before) | set(after),
+                               key=lambda key: (after.get(key) or before[key])["name"] or ""):
+        if command_hash not in after or command_hash not in before:
+            entry = before.get(command_hash) or after[command_hash]
+            comparisons.append({
+                "command_hash": command_hash,
+                "name": entry["name"],
+                "verdict": "removed" if command_hash not in after else "added",
+            })
+            continue
+        comparison = {"command_hash": command_hash, "name": after[command_hash]["name"]}
+        for metric in COMPARE_METRICS:
+            a, b = before[command_hash][metric], after[command_hash][metric]
+            result = {"baseline_count": len(a), "candidate_count": len(b)}
+            if len(a) < 2 or len(b) < 2:
+                result["verdict"] = "insufficient"
+                comparison[metric] = result
+                continue
+            change, (low, high) = bootstrap_change(a, b, resamples=resamples,
+                                                   confidence=confidence, seed=seed)
+            _, p_value = mann_whitney_u(a, b)
+            significant = (p_value < alpha and low is not None
+                           and (low > 0 or high < 0))
+            verdict = "unchanged"
+            if significant and change is not None and abs(change) > threshold:
+                verdict = "regression" if change > 0 else "improvement"
+            result.update({
+                "baseline_median": _interpolate(sorted(a), 0.5),
+                "candidate_median": _interpolate(sorted(b), 0.5),
+                "change_percent": change,
+                "ci_low_percent": low,
+                "ci_high_percent": high,
+                "p_value": p_value,
+                "verdict": verdict,
+            })
+            comparison[metric] = result
+        verdicts = [comparison[metric]["verdict"] for metric in COMPARE_METRICS]
+        comparison["verdict"] = next(
+            (verdict for verdict in ("regression", "improvement", "unchanged")
+             if verdict in verdicts),
+            "insufficient",
+        )
+        comparisons.append(comparison)
+    return comparisons
+
+
+def _format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024 or unit == "GiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+@click.command(name="stats", options_metavar="[<options>]")
+@click.option("--by", type=click.Choice(tuple(GROUP_KEYS)), default="command",
+              show_default=True, help="group jobs by this field")
+@click.option("-s", "--session", help="filter by session name")
+@click.option("--status", multiple=True, help="include jobs with this status [default: success]")
+@click.option("--machine", help="filter by machine name")
+@click.option("--since", help="created at or after an ISO date or a duration ago, e.g. 7d")
+@click.option("--until", help="created before an ISO date or a duration ago")
+@click.option("--command-hash", help="filter by command fingerprint")
+@click.option("--exact", is_flag=True,
+              help="scan saved jobs instead of reading daily rollups, "
+                   "as is done for sub-day --since/--until")
+@click.option("--phases", "by_phase", is_flag=True,
+              help="compare phase durations per command across runs")
+@click.option("--json", "as_json", is_flag=True, help="print machine-readable JSON")
+def stats(by, session, status, machine, since, until, command_hash, exact, by_phase, as_json):
+    """Summarize runtime percentiles and trends over saved jobs.
+
+    With --phases, summarizes the phases of jobs tracked with --phase-regex
+    instead, comparing each command's latest run to its earlier ones.
+    """
+    try:
+        for value in (since, until):
+            if value is not None:
+                datetime_utils.parse_time(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error)) from error
+    if by_phase:
+        _echo_phase_stats(
+            summarize_phases(status=status or "success", session=session, machine=machine,
+                             since=since, until=until, command_hash=command_hash),
+            as_json,
+        )
+        return
+    groups = summarize(by=by, status=status or "success", exact=exact, session=session,
+                       machine=machine, since=since, until=until, command_hash=command_hash)
+    if as_json:
+        click.echo(json.dumps(groups, indent=2, sort_keys=True))
+        return
+    if not groups:
+        click.echo("No matching jobs")
+        return
+    click.echo(f"{by:<24} {'count':>7} {'mean':>10} {'p50':>10} {'p95':>10} "
+               f"{'p99':>10} {'trend/day':>10} {'peak rss':>10}")
+    for group in groups:
+        label = group.get("name") or group.get(by) or group.get("command_hash") or "-"
+        if len(label) > 24:
+            label = label[:21] + "..."
+        click.echo(
+            f"{label:<24} {group['count']:>7} {group['mean']:>10.3f} {group['p50']:>10.3f} "
+            f"{group['p95']:>10.3f} {group['p99']:>10.3f} {group['trend_per_day']:>+10.3f} "
+            f"{_format_bytes(group['peak_rss_bytes']):>10}"
+        )
+
+
+def _echo_phase_stats(groups, as_json):
+    if as_json:
+        click.echo(json.dumps(groups, indent=2, sort_keys=True))
+        return
+    if not groups:
+        click.echo("No matching jobs with phases")
+        return
+    click.echo(f"{'command':<24} {'phase':<16} {'count':>7} {'mean':>10} {'p50':>10} "
+               f"{'p95':>10} {'latest':>10} {'vs p50':>8}")
+    for group in groups:
+        label = group["name"] or group["command_hash"] or "-"
+        if len(label) > 24:
+            label = label[:21] + "..."
+        phase = group["phase"] if len(group["phase"]) <= 16 else group["phase"][:13] + "..."
+        change = ("-" if group["change_percent"] is None
+                  else f"{group['change_percent']:+.1f}%")
+        click.echo(
+            f"{label:<24} {phase:<16} {group['count']:>7} {group['mean']:>10.3f} "
+            f"{group['p50']:>10.3f} {group['p95']:>10.3f} {group['latest']:>10.3f} {change:>8}"
+        )
+
+
+def _format_change(result):
+    if result.get("change_percent") is None:
+        return "-"
+    text = f"{result['change_percent']:+.1f}%"
+    if result.get("ci_low_percent") is not None:
+        text += f" [{result['ci_low_percent']:+.1f}, {result['ci_high_percent']:+.1f}]"
+    return text
+
+
+@click.command(name="compare", options_metavar="[<options>]")
+@click.argument("baseline", metavar="<baseline-session>")
+@click.argument("candidate", metavar="<candidate-session>")
+@click.option("--threshold", type=click.FloatRange(min=0), default=5.0, show_default=True,
+              help="smallest significant percent change that counts as a regression")
+@click.option("--alpha", type=click.FloatRange(0, 1, min_open=True, max_open=True),
+              default=0.05, show_default=True, help="significance level")
+@click.option("--resamples", type=click.IntRange(min=100), default=2000, show_default=True,
+              help="bootstrap resamples per comparison")
+@click.option("--seed", type=int, help="seed for reproducible confidence intervals")
+@click.option("--json", "as_json", is_flag=True, help="print machine-readable JSON")
+def compare(baseline, candidate, threshold, alpha, resamples, seed, as_json):
+    """Compare runtime and peak RSS per command between two sessions.
+
+    Exits with status 1 when any command has a significant regression.
+    """
+    try:
+        comparisons = compare_sessions(baseline, candidate, threshold=threshold,
+                                       alpha=alpha, resamples=resamples, seed=seed)
+    except exceptions.JortException as error:
+        raise click.ClickException(str(error)) from error
+    if as_json:
+        click.echo(json.dumps(comparisons, indent=2, sort_keys=True))
+    else:
+        click.echo(f"{'command':<32} {'runtime change [95% CI]':<28} "
+                   f"{'peak rss change [95% CI]':<28} verdict")
+        for comparison in comparisons:
+            label = comparison["name"] or comparison["command_hash"]
+            if len(label) > 32:
+                label = label[:29] + "..."
+            runtime = _format_change(comparison.get("runtime", {}))
+            rss = _format_change(comparison.get("peak_rss_bytes", {}))
+            click.echo(f"{label:<32} {runtime:<28} {rss:<28} {comparison['verdict']}")
+    if any(comparison["verdict"] == "regression" for comparison in comparisons):
+        raise click.exceptions.Exit(1)
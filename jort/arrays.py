@@ -0,0 +1,234 @@
+"""Run one command over many inputs as an array of tracked jobs."""
+
+import concurrent.futures
+import re
+import time
+
+import shortuuid
+
+from . import analytics
+from . import database
+from . import datetime_utils
+from . import exceptions
+from . import track_cli
+
+
+PLACEHOLDER = "{i}"
+# Finished instances are saved together, at most this many per transaction
+# and at least once per FLUSH_SECONDS.
+SAVE_BATCH_SIZE = 200
+FLUSH_SECONDS = 1.0
+RANGE_PATTERN = re.compile(r"^(-?\d+)(?:-(-?\d+)(?::(\d+))?)?$")
+
+
+def parse_range(text):
+    """
+    Parse an array specification such as ``1-1000``, ``0-99:10``, or
+    ``1,4,10-12`` into its values, as strings.
+
+    Parameters
+    ----------
+    text : str
+        Comma-separated integers and inclusive ``start-end`` ranges, each with
+        an optional ``:step``
+
+    Returns
+    -------
+    values : list
+        Array values in the order given
+    """
+    values = []
+    for part in str(text).split(","):
+        match = RANGE_PATTERN.match(part.strip())
+        if match is None:
+            raise exceptions.JortException(
+                f"Array must look like `1-100`, `0-99:10`, or `1,4,10-12`: `{text}`"
+            )
+        start = int(match[1])
+        end = int(match[2]) if match[2] is not None else start
+        step = int(match[3] or 1)
+        if end < start or step == 0:
+            raise exceptions.JortException(f"Array range `{part.strip()}` is empty")
+        values.extend(str(value) for value in range(start, end + 1, step))
+    return values
+
+
+def load_inputs(path):
+    """Read array values from a file, one per non-empty line."""
+    try:
+        with open(path, "r") as stream:
+            values = [line.rstrip("\r\n") for line in stream if line.strip()]
+    except OSError as error:
+        raise exceptions.JortException(f"Cannot read array inputs {path}: {error}") from error
+    if not values:
+        raise exceptions.JortException(f"Array inputs file {path} is empty")
+    return values
+
+
+def expand(command, value):
+    """Substitute an array value for ``{i}`` in a command string or argv list."""
+    if isinstance(command, str):
+        return command.replace(PLACEHOLDER, value)
+    return [argument.replace(PLACEHOLDER, value) for argument in command]
+
+
+def _has_placeholder(command):
+    if isinstance(command, str):
+        return PLACEHOLDER in command
+    return any(PLACEHOLDER in argument for argument in command)
+
+
+def _run_instance(command, value, index, array_id, track_kwargs):
+    track_kwargs = dict(track_kwargs)
+    for key in ("inputs", "outputs"):
+        if track_kwargs.get(key):
+            track_kwargs[key] = expand(list(track_kwargs[key]), value)
+    try:
+        # Instances are saved and notified about together by the parent.
+        return track_cli.track_new(
+            expand(command, value), quiet=True,
+            extra_metadata={"array_id": array_id, "array_index": index, "array_value": value},
+            **track_kwargs,
+        )
+    except Exception as error:
+        # Any instance error, e.g. failing to move its captured output, is a
+        # failed instance rather than the end of the array.
+        now = datetime_utils.get_iso_date()
+        return {"job_id": shortuuid.uuid(), "name": str(expand(command, value)),
+                "status": "error", "date_created": now, "date_modified": now, "runtime": 0.0,
+                "error_message": str(error), "exit_code": None, "notification_channels": [],
+                "metadata": {"array_id": array_id, "array_index": index, "array_value": value}}
+
+
+def summarize(payloads):
+    """
+    Aggregate finished array instances.
+
+    Returns
+    -------
+    summary : dict
+        ``instances``, per-status ``counts``, the ``runtime`` distribution
+        (``min``, ``median``, ``p90``, ``p99``, ``max``, ``mean``, and
+        ``total`` seconds), and the ``failures`` in array order
+    """
+    counts = {}
+    for payload in payloads:
+        counts[payload["status"]] = counts.get(payload["status"], 0) + 1
+    runtimes = sorted(payload["runtime"] for payload in payloads
+                      if payload.get("runtime") is not None)
+    distribution = None
+    if runtimes:
+        distribution = {
+            "min": runtimes[0],
+            "median": analytics._interpolate(runtimes, 0.5),
+            "p90": analytics._interpolate(runtimes, 0.9),
+            "p99": analytics._interpolate(runtimes, 0.99),
+            "max": runtimes[-1],
+            "mean": sum(runtimes) / len(runtimes),
+            "total": sum(runtimes),
+        }
+    failures = [
+        {"index": payload["metadata"]["array_index"], "value": payload["metadata"]["array_value"],
+         "job_id": payload["job_id"], "status": payload["status"],
+         "exit_code": payload.get("exit_code"), "error_message": payload.get("error_message")}
+        for payload in sorted(payloads, key=lambda payload: payload["metadata"]["array_index"])
+        if payload["status"] != "success"
+    ]
+    return {"instances": len(payloads), "counts": counts, "runtime": distribution,
+            "failures": failures}
+
+
+def run_array(command, values, parallel=4, session_name=None, array_id=None,
+              on_result=None, **track_kwargs):
+    """
+    Run a command once per array value with bounded parallelism.
+
+    Every instance is tracked by :func:`jort.track_new` under one parent and
+    saved as its own job, with ``array_id``, ``array_index``, and
+    ``array_value`` in its metadata. Instances skip the per-job session
+    lookup, database writes, and notifications: the parent saves finished
+    instances in batched transactions and the caller notifies once, using the
+    returned summary.
+
+    Parameters
+    ----------
+    command : str or list
+        Command string or argv list containing ``{i}``
+    values : list
+        Array values substituted for ``{i}``, as from :func:`parse_range` or
+        :func:`load_inputs`
+    parallel : int, optional
+        Maximum number of instances running at once
+    session_name : str, optional
+        Session for all instances, by default the array id
+    array_id : str, optional
+        Identifier shared by the instances
+    on_result : callable, optional
+        Called with each instance's payload as it finishes
+    **track_kwargs
+        Options passed to :func:`jort.track_new`, such as ``use_shell``,
+        ``cwd``, ``timeout_seconds``, or ``store_stdout``; ``{i}`` in
+        ``inputs`` and ``outputs`` is substituted as in the command
+
+    Returns
+    -------
+    result : dict
+        Array details and :func:`summarize` fields, with the ``payloads`` of
+        all instances in array order
+    """
+    if not _has_placeholder(command):
+        raise exceptions.JortException(f"Array command has no `{PLACEHOLDER}` placeholder")
+    if not values:
+        raise exceptions.JortException("Array has no values")
+    array_id = array_id or shortuuid.uuid()
+    session_name = session_name or array_id
+    session_id = database.get_or_create_session(session_name)
+    date_created = datetime_utils.get_iso_date()
+    started = time.monotonic()
+    payloads = []
+    pending = []
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal last_flush
+        if pending:
+            database.save_jobs(pending)
+            pending.clear()
+        last_flush = time.monotonic()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(_run_instance, command, value, index, array_id, track_kwargs)
+                   for index, value in enumerate(values)]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                payload = future.result()
+                payload["session_id"] = session_id
+                payload["session_name"] = session_name
+                payloads.append(payload)
+                pending.append(payload)
+                if on_result is not None:
+                    on_result(payload)
+                if (len(pending) >= SAVE_BATCH_SIZE
+                        or time.monotonic() - last_flush >= FLUSH_SECONDS):
+                    flush()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            flush()
+
+    payloads.sort(key=lambda payload: payload["metadata"]["array_index"])
+    summary = summarize(payloads)
+    return {
+        "array_id": array_id,
+        "command": command,
+        "session": session_name,
+        "status": "success" if summary["counts"].get("success") == len(payloads) else "error",
+        "date_created": date_created,
+        "date_modified": datetime_utils.get_iso_date(),
+        "wall_seconds": time.monotonic() - started,
+        "parallel": parallel,
+        **summary,
+        "payloads": payloads,
+    }
@@ -12,7 +12,9 @@ import click
 import socket
 from pathlib import Path
 
+from . import datetime_utils
 from . import exceptions
+from . import rollups
 
 # Create internal jort directory
 JORT_DIR = os.path.join(os.path.expanduser('~'), ".jort")
@@ -190,6 +192,47 @@ def config_text(twilio_receive_number, twilio_send_number, twilio_account_sid, t
     _write_config_data(config_data)
 
 
+@click.command(name='webhook', options_metavar='[<options>]')
+@click.option("--url", prompt="Webhook URL",
+              default=lambda: _get_config_data().get("webhook_url", ""),
+              show_default=_get_config_data().get("webhook_url"))
+def config_webhook(url):
+    """
+    Configure webhook notifications
+    """
+    config_data = _get_config_data()
+    if url != "":
+        config_data["webhook_url"] = url
+    _write_config_data(config_data)
+
+
+def digest_seconds(channel):
+    """
+    Return the coalescing window for a notification channel, 0 if disabled.
+    """
+    try:
+        return max(0.0, float(_get_config_data().get(f"{channel}_digest_seconds") or 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@click.command(name='digest', options_metavar='[<options>]')
+@click.option("--email", "email_seconds", type=click.FloatRange(min=0),
+              default=lambda: _get_config_data().get("email_digest_seconds", 0),
+              help="seconds to coalesce e-mails over, 0 to disable")
+@click.option("--text", "text_seconds", type=click.FloatRange(min=0),
+              default=lambda: _get_config_data().get("text_digest_seconds", 0),
+              help="seconds to coalesce texts over, 0 to disable")
+def config_digest(email_seconds, text_seconds):
+    """
+    Configure notification digests
+    """
+    config_data = _get_config_data()
+    config_data["email_digest_seconds"] = email_seconds
+    config_data["text_digest_seconds"] = text_seconds
+    _write_config_data(config_data)
+
+
 @click.command(name='all', options_metavar='[<options>]')
 @click.option("--machine", prompt="Machine name", 
               default=lambda: _get_config_data().get("machine", socket.gethostname()),
@@ -249,6 +292,8 @@ def config_all(ctx, machine, data_dir,
 config_group.add_command(config_general)
 config_group.add_command(config_email)
 config_group.add_command(config_text)
+config_group.add_command(config_webhook)
+config_group.add_command(config_digest)
 config_group.add_command(config_all)
 
 
@@ -300,90 +345,320 @@ def _get_database_path():
     return os.path.join(_get_data_dir(), "jort.db")
 
 
-def _initialize_db():
+SCHEMA_VERSION = 9
+MIGRATION_BATCH_SIZE = 10000
+
+
+def _initialize_db(batch_size=MIGRATION_BATCH_SIZE):
     """
-    Populate database sessions and jobs tables if they
-    don't exist already.
+    Create or upgrade the database schema.
+
+    Schema v3 stores job timestamps as integer microseconds since the epoch,
+    keeps each command's argv, working directory, and input digests once in a
+    ``commands`` table, and indexes the session, fingerprint, and status
+    lookups; v4 adds a creation-time index for tails and paging, v5 a
+    ``metrics_json`` column for resource usage, v6 daily runtime rollups
+    per command and session, v7 retry scheduling and claim leases for
+    notification deliveries, v8 heartbeat columns recording when running
+    jobs' monitors last reported and which process they are, and v9 a
+    paging index that also orders jobs without a creation time. Older
+    ``jobs`` tables are moved across in
+    batches, each in its own short transaction, so other jort processes keep
+    working during an upgrade and an interrupted upgrade resumes on the next
+    call; rollups are then backfilled the same way.
     """
-    with contextlib.closing(sqlite3.connect(_get_database_path())) as con:
-        cur = con.cursor()
+    with contextlib.closing(sqlite3.connect(_get_database_path(), timeout=30)) as con:
+        con.isolation_level = None
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        # Only takes effect before the first table exists; older databases are
+        # switched over by ``jort gc --full-vacuum``.
+        con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                    "session_id TEXT PRIMARY KEY,"
+                    "session_name TEXT"
+                ")"
+            )
+            _deduplicate_sessions(con)
+            con.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_name "
+                "ON sessions(session_name)"
+            )
+            job_columns = _table_columns(con, "jobs")
+            if "argv_json" in job_columns:
+                _prepare_legacy_jobs(con, job_columns)
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS commands ("
+                "    command_hash TEXT PRIMARY KEY,"
+                "    argv_json TEXT,"
+                "    cwd TEXT,"
+                "    inputs_json TEXT"
+                ")"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "    job_id TEXT PRIMARY KEY,"
+                "    session_id TEXT,"
+                "    job_name TEXT,"
+                "    status TEXT,"
+                "    machine TEXT,"
+                "    date_created INTEGER,"
+                "    date_finished INTEGER,"
+                "    runtime REAL,"
+                "    stdout_fn TEXT,"
+                "    error_message TEXT,"
+                "    pid INTEGER,"
+                "    exit_code INTEGER,"
+                "    signal INTEGER,"
+                "    git_sha TEXT,"
+                "    metadata_json TEXT,"
+                "    command_hash TEXT,"
+                "    notification_channels_json TEXT,"
+                "    notifications_json TEXT,"
+                "    metrics_json TEXT,"
+                "    heartbeat_at INTEGER,"
+                "    heartbeat_interval REAL,"
+                "    last_output_at INTEGER,"
+                "    monitor_pid INTEGER,"
+                "    monitor_create_time REAL,"
+                "    FOREIGN KEY(session_id) REFERENCES sessions(session_id),"
+                "    FOREIGN KEY(command_hash) REFERENCES commands(command_hash)"
+                ")"
+            )
+            job_columns = _table_columns(con, "jobs")
+            for column, column_type in (("metrics_json", "TEXT"),
+                                        ("heartbeat_at", "INTEGER"),
+                                        ("heartbeat_interval", "REAL"),
+                                        ("last_output_at", "INTEGER"),
+                                        ("monitor_pid", "INTEGER"),
+                                        ("monitor_create_time", "REAL")):
+                if column not in job_columns:
+                    con.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_session_created "
+                "ON jobs(session_id, date_created)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_session_hash_created "
+                "ON jobs(session_id, command_hash, date_created)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_command_hash "
+                "ON jobs(command_hash)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_created "
+                "ON jobs(date_created, job_id)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_created_key "
+                "ON jobs(COALESCE(date_created, 0), job_id)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status "
+                "ON jobs(status)"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS notifications ("
+                "    notification_id TEXT PRIMARY KEY,"
+                "    job_id TEXT NOT NULL,"
+                "    channel TEXT NOT NULL,"
+                "    status TEXT NOT NULL,"
+                "    attempts INTEGER NOT NULL DEFAULT 0,"
+                "    error_message TEXT,"
+                "    date_created TEXT NOT NULL,"
+                "    date_modified TEXT NOT NULL,"
+                "    next_attempt_at INTEGER,"
+                "    claimed_by TEXT,"
+                "    claimed_until INTEGER,"
+                "    UNIQUE(job_id, channel),"
+                "    FOREIGN KEY(job_id) REFERENCES jobs(job_id)"
+                ")"
+            )
+            notification_columns = _table_columns(con, "notifications")
+            for column, column_type in (("next_attempt_at", "INTEGER"),
+                                        ("claimed_by", "TEXT"),
+                                        ("claimed_until", "INTEGER")):
+                if column not in notification_columns:
+                    con.execute(f"ALTER TABLE notifications ADD COLUMN {column} {column_type}")
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_notifications_due "
+                "ON notifications(status, next_attempt_at)"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                "    path TEXT PRIMARY KEY,"
+                "    device INTEGER,"
+                "    inode INTEGER,"
+                "    size INTEGER,"
+                "    mtime_ns INTEGER,"
+                "    sha256 TEXT NOT NULL"
+                ")"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS runtime_rollups ("
+                "    command_hash TEXT NOT NULL,"
+                "    session_id TEXT NOT NULL,"
+                "    day INTEGER NOT NULL,"
+                "    count INTEGER NOT NULL,"
+                "    total REAL NOT NULL,"
+                "    total_squares REAL NOT NULL,"
+                "    minimum REAL,"
+                "    maximum REAL,"
+                "    max_rss INTEGER,"
+                "    sketch TEXT NOT NULL,"
+                "    PRIMARY KEY(command_hash, session_id, day)"
+                ")"
+            )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+        while _migrate_legacy_jobs_batch(con, batch_size):
+            pass
+        if version < 6:
+            _backfill_rollups(con)
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
-        sql = (
-            "CREATE TABLE IF NOT EXISTS sessions ("
-                "session_id TEXT PRIMARY KEY,"
-                "session_name TEXT"
-            ")"
-        )
-        cur.execute(sql)
-
-        sql = (
-            "CREATE TABLE IF NOT EXISTS jobs ("
-            "    job_id TEXT PRIMARY KEY,"
-            "    session_id TEXT,"
-            "    job_name TEXT,"
-            "    status TEXT,"
-            "    machine TEXT,"
-            "    date_created TEXT,"
-            "    date_finished TEXT,"
-            "    runtime REAL,"
-            "    stdout_fn TEXT,"
-            "    error_message TEXT,"
-            "    pid INTEGER,"
-            "    exit_code INTEGER,"
-            "    signal INTEGER,"
-            "    cwd TEXT,"
-            "    argv_json TEXT,"
-            "    git_sha TEXT,"
-            "    metadata_json TEXT,"
-            "    command_hash TEXT,"
-            "    notification_channels_json TEXT,"
-            "    notifications_json TEXT,"
-            "    FOREIGN KEY(session_id) REFERENCES sessions(session_id)"
-            ")"
-        )
-        cur.execute(sql)
-
-        existing_columns = {
-            row[1] for row in cur.execute("PRAGMA table_info(jobs)").fetchall()
-        }
-        migrations = {
-            "pid": "INTEGER",
-            "exit_code": "INTEGER",
-            "signal": "INTEGER",
-            "cwd": "TEXT",
-            "argv_json": "TEXT",
-            "git_sha": "TEXT",
-            "metadata_json": "TEXT",
-            "command_hash": "TEXT",
-            "notification_channels_json": "TEXT",
-            "notifications_json": "TEXT",
-        }
-        for column, data_type in migrations.items():
-            if column not in existing_columns:
-                cur.execute(f"ALTER TABLE jobs ADD COLUMN {column} {data_type}")
-
-        cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_jobs_session_created "
-            "ON jobs(session_id, date_created)"
+
+def _table_columns(con, table):
+    return {row[1] for row in con.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _deduplicate_sessions(con):
+    """
+    Merge sessions that share a name into the oldest one, so that the unique
+    session-name index can be created on databases from older versions.
+    """
+    duplicates = con.execute(
+        "SELECT session_name, MIN(rowid) FROM sessions "
+        "WHERE session_name IS NOT NULL GROUP BY session_name HAVING COUNT(*) > 1"
+    ).fetchall()
+    has_jobs = bool(_table_columns(con, "jobs"))
+    for session_name, keep_rowid in duplicates:
+        keep_id = con.execute(
+            "SELECT session_id FROM sessions WHERE rowid = ?", (keep_rowid,)
+        ).fetchone()[0]
+        if has_jobs:
+            con.execute(
+                "UPDATE jobs SET session_id = ? WHERE session_id IN "
+                "(SELECT session_id FROM sessions WHERE session_name = ? AND rowid != ?)",
+                (keep_id, session_name, keep_rowid),
+            )
+        if "session_id" in _table_columns(con, "jobs_v2"):
+            con.execute(
+                "UPDATE jobs_v2 SET session_id = ? WHERE session_id IN "
+                "(SELECT session_id FROM sessions WHERE session_name = ? AND rowid != ?)",
+                (keep_id, session_name, keep_rowid),
+            )
+        con.execute(
+            "DELETE FROM sessions WHERE session_name = ? AND rowid != ?",
+            (session_name, keep_rowid),
         )
-        cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_jobs_command_hash "
-            "ON jobs(command_hash)"
+
+
+def _prepare_legacy_jobs(con, job_columns):
+    """
+    Set a v1/v2 jobs table aside as ``jobs_v2`` for batched migration.
+    """
+    legacy_columns = {
+        "pid": "INTEGER",
+        "exit_code": "INTEGER",
+        "signal": "INTEGER",
+        "cwd": "TEXT",
+        "argv_json": "TEXT",
+        "git_sha": "TEXT",
+        "metadata_json": "TEXT",
+        "command_hash": "TEXT",
+        "notification_channels_json": "TEXT",
+        "notifications_json": "TEXT",
+    }
+    for column, data_type in legacy_columns.items():
+        if column not in job_columns:
+            con.execute(f"ALTER TABLE jobs ADD COLUMN {column} {data_type}")
+    con.execute("DROP INDEX IF EXISTS idx_jobs_session_created")
+    con.execute("DROP INDEX IF EXISTS idx_jobs_command_hash")
+    # Keep other tables' foreign keys pointing at the name `jobs`.
+    con.execute("PRAGMA legacy_alter_table = ON")
+    con.execute("ALTER TABLE jobs RENAME TO jobs_v2")
+    con.execute("PRAGMA legacy_alter_table = OFF")
+
+
+def _legacy_epoch_us(value):
+    try:
+        return datetime_utils.iso_to_epoch_us(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _migrate_legacy_jobs_batch(con, batch_size):
+    """
+    Move one batch of rows from ``jobs_v2`` into the v3 tables.
+
+    Returns
+    -------
+    more : bool
+        Whether rows may remain to be moved
+    """
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if not _table_columns(con, "jobs_v2"):
+            con.execute("COMMIT")
+            return False
+        rows = con.execute(
+            "SELECT rowid, job_id, session_id, job_name, status, machine, date_created, "
+            "date_finished, runtime, stdout_fn, error_message, pid, exit_code, signal, "
+            "cwd, argv_json, git_sha, metadata_json, command_hash, "
+            "notification_channels_json, notifications_json "
+            "FROM jobs_v2 ORDER BY rowid LIMIT ?",
+            (batch_size,),
+        ).fetchall()
+        if not rows:
+            con.execute("DROP TABLE jobs_v2")
+            con.execute("COMMIT")
+            return False
+        con.executemany(
+            "INSERT OR IGNORE INTO commands (command_hash, argv_json, cwd) VALUES (?, ?, ?)",
+            [(row[18], row[15], row[14]) for row in rows if row[18] is not None],
         )
-        cur.execute(
-            "CREATE TABLE IF NOT EXISTS notifications ("
-            "    notification_id TEXT PRIMARY KEY,"
-            "    job_id TEXT NOT NULL,"
-            "    channel TEXT NOT NULL,"
-            "    status TEXT NOT NULL,"
-            "    attempts INTEGER NOT NULL DEFAULT 0,"
-            "    error_message TEXT,"
-            "    date_created TEXT NOT NULL,"
-            "    date_modified TEXT NOT NULL,"
-            "    UNIQUE(job_id, channel),"
-            "    FOREIGN KEY(job_id) REFERENCES jobs(job_id)"
-            ")"
+        # Rows already written by a newer jort take precedence.
+        con.executemany(
+            "INSERT OR IGNORE INTO jobs (job_id, session_id, job_name, status, machine, "
+            "date_created, date_finished, runtime, stdout_fn, error_message, pid, "
+            "exit_code, signal, git_sha, metadata_json, command_hash, "
+            "notification_channels_json, notifications_json) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (row[1], row[2], row[3], row[4], row[5],
+                 _legacy_epoch_us(row[6]), _legacy_epoch_us(row[7]),
+                 *row[8:14], *row[16:21])
+                for row in rows
+            ],
         )
-        cur.execute("PRAGMA user_version = 2")
+        con.execute("DELETE FROM jobs_v2 WHERE rowid <= ?", (rows[-1][0],))
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    return True
 
-        con.commit()
+
+def _backfill_rollups(con, commands_per_batch=100):
+    """Build runtime rollups from existing jobs, a batch of commands at a time."""
+    command_hashes = [row[0] for row in con.execute(
+        "SELECT DISTINCT command_hash FROM jobs WHERE command_hash IS NOT NULL"
+    ).fetchall()]
+    for start in range(0, len(command_hashes), commands_per_batch):
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            rollups.rebuild(con, command_hashes[start:start + commands_per_batch])
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
@@ -7,17 +7,29 @@ import sqlite3
 import uuid
 
 import click
+import shortuuid
 
 from . import config
 from . import datetime_utils
+from . import rollups
 
 
 JOB_COLUMNS = (
     "job_id", "session_id", "job_name", "status", "machine",
     "date_created", "date_finished", "runtime", "stdout_fn",
-    "error_message", "pid", "exit_code", "signal", "cwd", "argv_json",
+    "error_message", "pid", "exit_code", "signal",
     "git_sha", "metadata_json", "command_hash",
-    "notification_channels_json", "notifications_json",
+    "notification_channels_json", "notifications_json", "metrics_json",
+)
+TIMESTAMP_COLUMNS = ("date_created", "date_finished", "heartbeat_at", "last_output_at")
+# Time a caller has to deliver its own notifications before drainers may.
+NOTIFICATION_GRACE_SECONDS = 300
+# Job rows joined with their deduplicated command details, in the v2 row shape.
+JOB_SELECT = (
+    "SELECT jobs.*, sessions.session_name, commands.cwd, commands.argv_json, "
+    "commands.inputs_json FROM jobs "
+    "LEFT JOIN sessions ON jobs.session_id = sessions.session_id "
+    "LEFT JOIN commands ON jobs.command_hash = commands.command_hash"
 )
 
 
@@ -39,49 +51,156 @@ def _json(value):
     return json.dumps(value, sort_keys=True) if value is not None else None
 
 
-def save_job(payload):
-    """Insert or replace a completed/running job using named columns."""
+def get_or_create_session(session_name=None):
+    """Return the id of the named session, creating the session if needed.
+
+    Without a name, a new session is created whose name is its id, matching
+    :class:`jort.Tracker`.
+    """
     ensure_database()
+    with contextlib.closing(_connect()) as connection:
+        if session_name is None:
+            session_id = shortuuid.uuid()
+            connection.execute(
+                "INSERT INTO sessions(session_id, session_name) VALUES(?, ?)",
+                (session_id, session_id),
+            )
+            connection.commit()
+            return session_id
+        sql = "SELECT session_id FROM sessions WHERE session_name = ?"
+        row = connection.execute(sql, (session_name,)).fetchone()
+        if row is None:
+            # Session names are unique; a concurrent creator wins the insert.
+            connection.execute(
+                "INSERT OR IGNORE INTO sessions(session_id, session_name) VALUES(?, ?)",
+                (shortuuid.uuid(), session_name),
+            )
+            connection.commit()
+            row = connection.execute(sql, (session_name,)).fetchone()
+    return row[0]
+
+
+def _write_job(connection, payload):
+    """Upsert one job, its command details, and its rollup in an open transaction."""
+    metadata = payload.get("metadata")
+    inputs = None
+    if metadata and "inputs" in metadata:
+        # Input digests are part of the command fingerprint, stored in `commands`.
+        inputs = metadata["inputs"]
+        metadata = {key: value for key, value in metadata.items() if key != "inputs"}
     values = {
         "job_id": payload.get("job_id"),
         "session_id": payload.get("session_id"),
         "job_name": payload.get("name"),
         "status": payload.get("status"),
         "machine": payload.get("machine"),
-        "date_created": payload.get("date_created"),
-        "date_finished": payload.get("date_modified"),
+        "date_created": datetime_utils.iso_to_epoch_us(payload.get("date_created")),
+        "date_finished": datetime_utils.iso_to_epoch_us(payload.get("date_modified")),
         "runtime": payload.get("runtime"),
         "stdout_fn": payload.get("stdout_fn"),
         "error_message": payload.get("error_message"),
         "pid": payload.get("pid"),
         "exit_code": payload.get("exit_code"),
         "signal": payload.get("signal"),
-        "cwd": payload.get("cwd"),
-        "argv_json": _json(payload.get("argv")),
         "git_sha": payload.get("git_sha"),
-        "metadata_json": _json(payload.get("metadata")),
+        "metadata_json": _json(metadata),
         "command_hash": payload.get("command_hash"),
         "notification_channels_json": _json(payload.get("notification_channels", [])),
         "notifications_json": _json(payload.get("notifications", {})),
+        "metrics_json": _json(payload.get("metrics")),
     }
     placeholders = ", ".join(f":{column}" for column in JOB_COLUMNS)
     columns = ", ".join(JOB_COLUMNS)
     updates = ", ".join(
         f"{column} = excluded.{column}" for column in JOB_COLUMNS if column != "job_id"
     )
+    previous = connection.execute(
+        "SELECT status FROM jobs WHERE job_id = ?", (values["job_id"],)
+    ).fetchone()
+    if values["command_hash"] is not None:
+        connection.execute(
+            "INSERT OR IGNORE INTO commands (command_hash, argv_json, cwd, inputs_json) "
+            "VALUES (?, ?, ?, ?)",
+            (values["command_hash"], _json(payload.get("argv")), payload.get("cwd"),
+             _json(inputs)),
+        )
+    connection.execute(
+        f"INSERT INTO jobs ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT(job_id) DO UPDATE SET {updates}",
+        values,
+    )
+    # Count each success once, when the job first reaches it.
+    if (values["status"] == "success" and (previous is None or previous[0] != "success")
+            and None not in (values["runtime"], values["command_hash"],
+                             values["session_id"], values["date_created"])):
+        rollups.add_samples(
+            connection, values["command_hash"], values["session_id"],
+            rollups.day_of(values["date_created"]), [values["runtime"]],
+            [(payload.get("metrics") or {}).get("peak_rss_bytes")],
+        )
+
+
+def save_job(payload):
+    """Insert or replace a completed/running job using named columns."""
+    save_jobs([payload])
+
+
+def record_heartbeat(payload, interval, monitor, last_output=None):
+    """
+    Save a running job together with its monitor's heartbeat.
+
+    Heartbeat columns are not among ``JOB_COLUMNS``, so the job's final save
+    keeps the last heartbeat rather than clearing it.
+
+    Parameters
+    ----------
+    payload : dict
+        Running job payload, with its latest runtime and metrics
+    interval : float
+        Seconds between heartbeats, used by ``jort reap`` to judge staleness
+    monitor : tuple
+        Process ID and creation time of the process sending heartbeats
+    last_output : float, optional
+        Epoch seconds of the job's latest output line
+    """
+    ensure_database()
+    now = datetime_utils.get_iso_date()
     with contextlib.closing(_connect()) as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        _write_job(connection, payload)
         connection.execute(
-            f"INSERT INTO jobs ({columns}) VALUES ({placeholders}) "
-            f"ON CONFLICT(job_id) DO UPDATE SET {updates}",
-            values,
+            "UPDATE jobs SET heartbeat_at = ?, heartbeat_interval = ?, last_output_at = ?, "
+            "monitor_pid = ?, monitor_create_time = ? WHERE job_id = ?",
+            (datetime_utils.iso_to_epoch_us(now), interval,
+             None if last_output is None else int(last_output * 10**6),
+             monitor[0], monitor[1], payload["job_id"]),
         )
         connection.commit()
 
 
+def save_jobs(payloads):
+    """Insert or replace several jobs in a single transaction."""
+    ensure_database()
+    with contextlib.closing(_connect()) as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        for payload in payloads:
+            _write_job(connection, payload)
+        connection.commit()
+
+
+def _row_dict(row):
+    """Return a row as a dictionary with ISO 8601 timestamps."""
+    values = dict(row)
+    for column in TIMESTAMP_COLUMNS:
+        if column in values:
+            values[column] = datetime_utils.epoch_us_to_iso(values[column])
+    return values
+
+
 def _decode_job(row):
     if row is None:
         return None
-    payload = dict(row)
+    payload = _row_dict(row)
     payload["name"] = payload.pop("job_name", None)
     payload["date_modified"] = payload.pop("date_finished", None)
     for column, target in (
@@ -89,6 +208,7 @@ def _decode_job(row):
         ("metadata_json", "metadata"),
         ("notification_channels_json", "notification_channels"),
         ("notifications_json", "notifications"),
+        ("metrics_json", "metrics"),
     ):
         value = payload.pop(column, None)
         try:
@@ -96,6 +216,9 @@ def _decode_job(row):
             payload[target] = json.loads(value) if value else default
         except json.JSONDecodeError:
             payload[target] = [] if target in ("argv", "notification_channels") else {}
+    inputs = payload.pop("inputs_json", None)
+    if inputs:
+        payload["metadata"]["inputs"] = json.loads(inputs)
     return payload
 
 
@@ -103,42 +226,166 @@ def get_job(job_id):
     ensure_database()
     with contextlib.closing(_connect()) as connection:
         row = connection.execute(
-            "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            f"{JOB_SELECT} WHERE jobs.job_id = ?", (job_id,)
         ).fetchone()
     return _decode_job(row)
 
 
-def list_jobs(session=None, tail=None, full_details=False):
-    ensure_database()
-    if full_details:
-        sql = "SELECT jobs.* FROM jobs"
-        if session is not None:
-            sql += " JOIN sessions ON jobs.session_id = sessions.session_id"
-    else:
-        sql = (
-            "SELECT jobs.job_id, jobs.job_name, sessions.session_name, jobs.status, "
-            "jobs.machine, jobs.date_created, jobs.date_finished, jobs.runtime, "
-            "jobs.pid, jobs.exit_code, jobs.error_message "
-            "FROM jobs JOIN sessions ON jobs.session_id = sessions.session_id"
-        )
+SUMMARY_SELECT = (
+    "SELECT jobs.job_id, jobs.job_name, sessions.session_name, jobs.status, "
+    "jobs.machine, jobs.date_created, jobs.date_finished, jobs.runtime, "
+    "jobs.pid, jobs.exit_code, jobs.error_message, jobs.heartbeat_at "
+    "FROM jobs JOIN sessions ON jobs.session_id = sessions.session_id"
+)
+
+
+# Jobs are paged in this order. Jobs without a creation time, e.g. migrated
+# from a legacy date that could not be parsed, sort as created at the epoch.
+CREATED_KEY = "COALESCE(jobs.date_created, 0)"
+
+
+def encode_cursor(row):
+    """Return the keyset pagination cursor that resumes after ``row``."""
+    created = datetime_utils.iso_to_epoch_us(row["date_created"])
+    return f"{created or 0}:{row['job_id']}"
+
+
+def _decode_cursor(cursor):
+    created, _, job_id = str(cursor).partition(":")
+    try:
+        return int(created), job_id
+    except ValueError as error:
+        raise ValueError(f"Invalid cursor `{cursor}`") from error
+
+
+def _job_filters(session=None, status=None, machine=None, since=None, until=None,
+                 command_hash=None, name=None):
+    """Build a WHERE clause and parameters for job filters."""
+    clauses = []
     params = []
     if session is not None:
-        sql += " WHERE sessions.session_name = ?"
+        clauses.append("sessions.session_name = ?")
         params.append(session)
-    sql += " ORDER BY jobs.date_created"
-
-    with contextlib.closing(_connect()) as connection:
-        rows = [dict(row) for row in connection.execute(sql, params).fetchall()]
+    if status:
+        statuses = [status] if isinstance(status, str) else list(status)
+        clauses.append(f"jobs.status IN ({', '.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    if machine is not None:
+        clauses.append("jobs.machine = ?")
+        params.append(machine)
+    if since is not None:
+        clauses.append("jobs.date_created >= ?")
+        params.append(datetime_utils.parse_time(since))
+    if until is not None:
+        clauses.append("jobs.date_created < ?")
+        params.append(datetime_utils.parse_time(until))
+    if command_hash is not None:
+        clauses.append("jobs.command_hash = ?")
+        params.append(command_hash)
+    if name is not None:
+        clauses.append("jobs.job_name GLOB ?")
+        params.append(name)
+    return clauses, params
+
+
+def iter_jobs(session=None, tail=None, full_details=False, status=None, machine=None,
+              since=None, until=None, command_hash=None, name=None, after=None,
+              limit=None, decode=False, batch_size=1000):
+    """
+    Yield saved jobs in creation order, filtering and paging in SQL.
+
+    Rows are read from the database in keyset-paged batches as the generator
+    is consumed, each in its own short read, so memory use does not grow with
+    the size of the history and a slow consumer does not block writers.
+
+    Parameters
+    ----------
+    session : str, optional
+        Session name
+    tail : int, optional
+        Only yield the most recent ``tail`` matching jobs
+    full_details : bool, optional
+        Include every stored column rather than the summary columns
+    status : str or list, optional
+        Job status or statuses
+    machine : str, optional
+        Machine name
+    since, until : str, optional
+        Creation time bounds, as ISO 8601 dates or durations such as ``7d``
+    command_hash : str, optional
+        Command fingerprint
+    name : str, optional
+        Glob pattern matched against job names
+    after : str, optional
+        Cursor from :func:`encode_cursor`; yield jobs created after that row
+    limit : int, optional
+        Maximum number of jobs to yield after ``after``
+    decode : bool, optional
+        Yield job payloads, as returned by :func:`get_job`, instead of rows
+
+    Yields
+    ------
+    row : dict
+        Job row with ISO 8601 dates
+    """
+    convert = _decode_job if decode else _row_dict
+    ensure_database()
+    clauses, params = _job_filters(session=session, status=status, machine=machine,
+                                   since=since, until=until, command_hash=command_hash,
+                                   name=name)
+    sql = JOB_SELECT if full_details or decode else SUMMARY_SELECT
+    if after is not None:
+        clauses.append(f"({CREATED_KEY}, jobs.job_id) > (?, ?)")
+        params.extend(_decode_cursor(after))
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if tail is not None:
+        if tail <= 0:
+            return
+        # Read the newest rows through the index, then restore creation order.
+        sql += f" ORDER BY {CREATED_KEY} DESC, jobs.job_id DESC LIMIT ?"
+        with contextlib.closing(_connect()) as connection:
+            rows = connection.execute(sql, params + [tail]).fetchall()
+        for row in reversed(rows):
+            yield convert(row)
+        return
+    # Each batch is its own short read, resuming after the last row yielded, so
+    # no read lock is held while the consumer is busy and writers are not blocked.
+    keyset = " AND " if clauses else " WHERE "
+    keyset += f"({CREATED_KEY}, jobs.job_id) > (?, ?)"
+    order = f" ORDER BY {CREATED_KEY}, jobs.job_id LIMIT ?"
+    last = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        with contextlib.closing(_connect()) as connection:
+            if last is None:
+                rows = connection.execute(sql + order, params + [size]).fetchall()
+            else:
+                rows = connection.execute(sql + keyset + order,
+                                          params + [*last, size]).fetchall()
+        if not rows:
+            return
+        last = (rows[-1]["date_created"] or 0, rows[-1]["job_id"])
+        if remaining is not None:
+            remaining -= len(rows)
+        for row in rows:
+            yield convert(row)
+        if len(rows) < size:
+            return
+
+
+def list_jobs(session=None, tail=None, full_details=False, **filters):
+    """Return saved jobs as a list; see :func:`iter_jobs` for the filters."""
+    rows = list(iter_jobs(session=session, tail=tail, full_details=full_details, **filters))
     if session is not None and not rows:
         raise ValueError(f"No jobs found with session `{session}`")
-    if tail is not None:
-        rows = rows[-tail:] if tail > 0 else []
     return rows
 
 
-def print_jobs(session=None, tail=None, full_details=False):
+def print_jobs(session=None, tail=None, full_details=False, **filters):
     """Return saved jobs as a DataFrame when pandas is installed."""
-    rows = list_jobs(session=session, tail=tail, full_details=full_details)
+    rows = list_jobs(session=session, tail=tail, full_details=full_details, **filters)
     try:
         import pandas as pd
     except ImportError:
@@ -147,23 +394,42 @@ def print_jobs(session=None, tail=None, full_details=False):
 
 
 def enqueue_notifications(payload):
+    """
+    Record pending deliveries for a job's notification channels.
+
+    The caller normally delivers them right away; ``jort notify drain`` only
+    picks up rows still undelivered after ``NOTIFICATION_GRACE_SECONDS``.
+    Channels with a digest window are left to the drainer, which sends them
+    once the window has passed.
+    """
     channels = payload.get("notification_channels", [])
     if not channels:
         return
     ensure_database()
     now = datetime_utils.get_iso_date()
+    now_us = datetime_utils.iso_to_epoch_us(now)
     with contextlib.closing(_connect()) as connection:
         for channel in channels:
+            delay = config.digest_seconds(channel) or NOTIFICATION_GRACE_SECONDS
             connection.execute(
                 "INSERT OR IGNORE INTO notifications "
-                "(notification_id, job_id, channel, status, attempts, date_created, date_modified) "
-                "VALUES (?, ?, ?, 'pending', 0, ?, ?)",
-                (uuid.uuid4().hex, payload["job_id"], channel, now, now),
+                "(notification_id, job_id, channel, status, attempts, date_created, date_modified, "
+                "next_attempt_at) VALUES (?, ?, ?, 'pending', 0, ?, ?, ?)",
+                (uuid.uuid4().hex, payload["job_id"], channel, now, now,
+                 now_us + int(delay * 10**6)),
             )
         connection.commit()
 
 
-def update_notification(job_id, channel, status, error_message=None):
+def update_notification(job_id, channel, status, error_message=None, outcome=None):
+    """
+    Record a delivery attempt for a job's notification channel.
+
+    With ``outcome``, the per-channel result is also stored in the job's
+    ``notifications`` in the same transaction, without rewriting the rest of
+    the job, so deliveries finishing in the background cannot overwrite each
+    other.
+    """
     ensure_database()
     now = datetime_utils.get_iso_date()
     with contextlib.closing(_connect()) as connection:
@@ -172,6 +438,13 @@ def update_notification(job_id, channel, status, error_message=None):
             "error_message = ?, date_modified = ? WHERE job_id = ? AND channel = ?",
             (status, error_message, now, job_id, channel),
         )
+        if outcome is not None:
+            connection.execute(
+                "UPDATE jobs SET notifications_json = json_set("
+                "COALESCE(notifications_json, '{}'), '$.' || json_quote(?), json(?)) "
+                "WHERE job_id = ?",
+                (channel, _json(outcome), job_id),
+            )
         connection.commit()
 
 
@@ -186,6 +459,21 @@ def pending_notifications(job_id=None):
         return [dict(row) for row in connection.execute(sql, params).fetchall()]
 
 
+def recent_runs(command_hash, limit=30, status="success"):
+    """
+    Return the runtime and peak RSS of a command's newest runs, newest first.
+    """
+    ensure_database()
+    with contextlib.closing(_connect()) as connection:
+        rows = connection.execute(
+            "SELECT runtime, json_extract(metrics_json, '$.peak_rss_bytes') AS peak_rss "
+            "FROM jobs WHERE command_hash = ? AND status = ? "
+            "ORDER BY date_created DESC LIMIT ?",
+            (command_hash, status, limit),
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
 def runtimes(session=None, command_hash=None):
     """Return successful runtimes for simple benchmark comparison."""
     ensure_database()
@@ -205,18 +493,70 @@ def runtimes(session=None, command_hash=None):
         return [row[0] for row in connection.execute(sql, params).fetchall() if row[0] is not None]
 
 
+INSPECT_WIDTHS = {
+    "job_id": 22, "job_name": 40, "session_name": 22, "status": 10, "machine": 16,
+    "date_created": 32, "date_finished": 32, "runtime": 12, "pid": 8, "exit_code": 9,
+    "heartbeat_at": 32,
+}
+
+
+def _format_inspect_row(values, columns):
+    cells = []
+    for column, value in zip(columns, values):
+        width = INSPECT_WIDTHS.get(column, 24)
+        if column == "runtime" and isinstance(value, float):
+            value = f"{value:.3f}"
+        text = "" if value is None else " ".join(str(value).split())
+        if len(text) > width:
+            text = text[:width - 3] + "..."
+        cells.append(text.ljust(width))
+    return "  ".join(cells).rstrip()
+
+
 @click.command(options_metavar='[<options>]')
 @click.option('-s', '--session', type=str, help='filter by session name')
-@click.option('-r', '--rows', type=int, help='number of rows to print')
+@click.option('-r', '--rows', type=int, help='number of rows to print (most recent, or after --after)')
 @click.option('-f', '--full-details', is_flag=True, help='show all details, including ids')
+@click.option('--status', multiple=True, help='filter by status (repeatable)')
+@click.option('--machine', help='filter by machine name')
+@click.option('--since', help='created at or after an ISO date or a duration ago, e.g. 7d')
+@click.option('--until', help='created before an ISO date or a duration ago')
+@click.option('--command-hash', help='filter by command fingerprint')
+@click.option('--name', help='filter by job name glob pattern, e.g. "pytest*"')
+@click.option('--after', metavar='<cursor>',
+              help='page forward from a cursor; use 0 for the first page')
 @click.option('--json', 'as_json', is_flag=True, help='print machine-readable JSON')
-def inspect(session, rows, full_details, as_json):
+def inspect(session, rows, full_details, status, machine, since, until, command_hash,
+            name, after, as_json):
     """Get saved job details from the local database."""
-    result = list_jobs(session=session, tail=rows, full_details=full_details)
-    if as_json:
-        click.echo(json.dumps(result, default=str))
+    filters = dict(status=status, machine=machine, since=since, until=until,
+                   command_hash=command_hash, name=name)
+    if after is not None:
+        jobs = iter_jobs(session=session, full_details=full_details, after=after,
+                         limit=rows, **filters)
     else:
-        click.echo(print_jobs(session=session, tail=rows, full_details=full_details))
+        jobs = iter_jobs(session=session, tail=rows, full_details=full_details, **filters)
+    count = 0
+    last = None
+    try:
+        for row in jobs:
+            if as_json:
+                click.echo("[" if count == 0 else ",", nl=False)
+                click.echo(json.dumps(row, default=str), nl=False)
+            else:
+                if count == 0:
+                    click.echo(_format_inspect_row(row.keys(), row.keys()))
+                click.echo(_format_inspect_row(row.values(), row.keys()))
+            count += 1
+            last = row
+    except ValueError as error:
+        raise click.ClickException(str(error)) from error
+    if as_json:
+        click.echo("[]" if count == 0 else "]")
+    elif count == 0:
+        click.echo("No jobs found")
+    if after is not None and rows is not None and count == rows:
+        click.echo(f"next page: --after {encode_cursor(last)}", err=True)
 
 
 @click.command()
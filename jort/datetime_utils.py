@@ -1,7 +1,10 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import time
 
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
 def get_iso_date(timestamp=None):
     """
     Return start date in ISO 8601 format
@@ -22,6 +25,81 @@ def get_iso_date(timestamp=None):
         value = datetime.now(timezone.utc)
     return value.isoformat(timespec="microseconds")
 
+def iso_to_epoch_us(iso_date):
+    """
+    Convert an ISO 8601 date to integer microseconds since the Unix epoch.
+
+    Parameters
+    ----------
+    iso_date : string
+        ISO 8601 date; naive dates are treated as UTC
+
+    Returns
+    -------
+    epoch_us : int
+        Microseconds since the epoch, or None for a missing date
+    """
+    if iso_date is None:
+        return None
+    value = datetime.fromisoformat(iso_date)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def epoch_us_to_iso(epoch_us):
+    """
+    Convert integer microseconds since the Unix epoch to an ISO 8601 date.
+
+    Parameters
+    ----------
+    epoch_us : int
+        Microseconds since the epoch
+
+    Returns
+    -------
+    iso_time : string
+        ISO time (UTC), or None for a missing timestamp
+    """
+    if epoch_us is None:
+        return None
+    value = EPOCH + timedelta(microseconds=int(epoch_us))
+    return value.isoformat(timespec="microseconds")
+
+
+RELATIVE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_time(value):
+    """
+    Parse an absolute or relative time into epoch microseconds.
+
+    Parameters
+    ----------
+    value : string
+        ISO 8601 date or datetime (naive values are UTC), or a duration before
+        now such as ``90s``, ``30m``, ``12h``, ``7d``, or ``2w``
+
+    Returns
+    -------
+    epoch_us : int
+        Microseconds since the epoch
+    """
+    value = str(value).strip()
+    unit = RELATIVE_UNITS.get(value[-1:].lower())
+    if unit is not None:
+        try:
+            seconds = float(value[:-1]) * unit
+        except ValueError:
+            pass
+        else:
+            return iso_to_epoch_us(get_iso_date()) - int(seconds * 1e6)
+    try:
+        return iso_to_epoch_us(value)
+    except ValueError as error:
+        raise ValueError(f"Invalid time `{value}`; use ISO 8601 or a duration like 7d") from error
+
+
 def get_runtime(iso_date1, iso_date2):
     """
     Return runtime in seconds between two dates in ISO format.
@@ -60,6 +60,7 @@ def launch(spec):
             channel for channel, enabled in (
                 ("email", spec.get("send_email", False)),
                 ("text", spec.get("send_text", False)),
+                ("webhook", spec.get("send_webhook", False)),
             ) if enabled
         ],
     })
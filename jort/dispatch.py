@@ -0,0 +1,274 @@
+"""Synchronous, concurrent, and background delivery of notification callbacks."""
+
+import asyncio
+import atexit
+import concurrent.futures
+import queue
+import sys
+import threading
+
+from . import database
+from . import exceptions
+from . import reporting_callbacks
+
+
+MAX_WORKERS = 4
+MAX_PENDING = 256
+EXIT_FLUSH_SECONDS = 30.0
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def channel_of(callback):
+    return getattr(callback, "channel", callback.__class__.__name__.lower())
+
+
+def callback_for_channel(channel, validate=True):
+    """Build the notification callback for a stored channel name."""
+    if channel == "email":
+        return reporting_callbacks.EmailNotification(validate=validate)
+    if channel == "text":
+        return reporting_callbacks.TextNotification(validate=validate)
+    if channel == "webhook":
+        return reporting_callbacks.WebhookNotification(validate=validate)
+    raise exceptions.JortException(f"Unknown notification channel: {channel}")
+
+
+def deliver(callback, payload, persist=False):
+    """
+    Execute one notification callback and record its outcome.
+
+    Parameters
+    ----------
+    callback : Callback
+        Notification callback
+    payload : dict
+        Job payload passed to the callback
+    persist : bool, optional
+        Record the outcome for the job in the database; the print channel is
+        never recorded
+
+    Returns
+    -------
+    outcome : dict
+        ``status`` of ``sent`` with the callback's ``result``, or ``failed``
+        with the ``error``
+    """
+    channel = channel_of(callback)
+    try:
+        outcome = {"status": "sent", "result": callback.execute(payload=payload)}
+    except Exception as error:
+        outcome = {"status": "failed", "error": str(error)}
+    if persist and channel != "print":
+        database.update_notification(payload["job_id"], channel, outcome["status"],
+                                     outcome.get("error"), outcome=outcome)
+    return outcome
+
+
+async def _deliver_async(callback, payload, timeout):
+    if hasattr(callback, "execute_async"):
+        delivery = callback.execute_async(payload)
+    else:
+        # Any object with `execute` can be a callback.
+        delivery = reporting_callbacks._in_daemon_thread(callback.execute, payload)
+    try:
+        result = await asyncio.wait_for(delivery, timeout)
+    except asyncio.TimeoutError:
+        # The send may still complete on its thread, so it is not a failure
+        # for `jort notify drain` to retry.
+        return {"status": "timeout", "error": f"timed out after {timeout:g} s"}
+    except Exception as error:
+        return {"status": "failed", "error": str(error)}
+    return {"status": "sent", "result": result}
+
+
+async def deliver_all_async(callbacks, payload, timeouts=None):
+    """
+    Send every channel for a payload concurrently on the running event loop.
+
+    Parameters
+    ----------
+    callbacks : list
+        Notification callbacks, one per channel
+    payload : dict
+        Job payload passed to each callback
+    timeouts : dict, optional
+        Seconds allowed per channel, overriding each callback's ``timeout``
+
+    Returns
+    -------
+    outcomes : dict
+        Outcome per channel, as from :func:`deliver`; a channel that exceeds
+        its timeout has status ``timeout``, since its delivery may still
+        complete, and is not retried
+    """
+    timeouts = timeouts or {}
+    outcomes = await asyncio.gather(*(
+        _deliver_async(callback, payload,
+                       timeouts.get(channel_of(callback), getattr(callback, "timeout", None)))
+        for callback in callbacks
+    ))
+    return {channel_of(callback): outcome for callback, outcome in zip(callbacks, outcomes)}
+
+
+def deliver_all(callbacks, payload, persist=False, timeouts=None):
+    """
+    Send every channel for a payload concurrently and record the outcomes.
+
+    The call takes as long as the slowest channel rather than the sum of
+    all of them. See :func:`deliver_all_async`; ``persist`` records outcomes
+    as in :func:`deliver`.
+    """
+    if not callbacks:
+        return {}
+    coroutine = deliver_all_async(callbacks, payload, timeouts=timeouts)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        outcomes = asyncio.run(coroutine)
+    else:
+        # Called from async code; run on a private loop instead of nesting.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            outcomes = executor.submit(asyncio.run, coroutine).result()
+    if persist:
+        for channel, outcome in outcomes.items():
+            if channel != "print":
+                database.update_notification(payload["job_id"], channel, outcome["status"],
+                                             outcome.get("error"), outcome=outcome)
+    return outcomes
+
+
+class _Digest(object):
+    """Adapt a callback so that delivering a list of payloads sends one digest."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.channel = channel_of(callback)
+        self.timeout = getattr(callback, "timeout", None)
+
+    def execute(self, payload):
+        return self.callback.execute_digest(payload)
+
+
+def deliver_digest(callbacks, payloads, timeouts=None):
+    """
+    Send one digest of several finished jobs per channel, concurrently.
+
+    Outcomes are as from :func:`deliver_all`; they are not recorded in the
+    database.
+    """
+    return deliver_all([_Digest(callback) for callback in callbacks], payloads,
+                       timeouts=timeouts)
+
+
+class Dispatcher(object):
+    """
+    Deliver notifications on a bounded pool of background threads.
+
+    Deliveries are queued up to ``max_pending``, beyond which submitting
+    blocks until a worker frees a slot. Workers are daemon threads, so a
+    stuck delivery cannot keep the interpreter alive; :meth:`flush` waits for
+    queued deliveries with a timeout instead.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Number of deliveries in flight at once
+    max_pending : int, optional
+        Number of deliveries queued before submitting blocks
+    """
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING):
+        self.max_workers = max_workers
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._workers = []
+        self._unfinished = 0
+        self._idle = threading.Condition()
+
+    @property
+    def pending(self):
+        """Number of queued or running deliveries."""
+        with self._idle:
+            return self._unfinished
+
+    def submit(self, callback, payload, persist=False):
+        """
+        Queue a delivery, returning a future of its outcome.
+
+        The outcome is also stored under the callback's channel in
+        ``payload["notifications"]`` once it is known.
+        """
+        future = concurrent.futures.Future()
+        with self._idle:
+            self._unfinished += 1
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, name="jort-notify", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        # Callbacks see the payload as it was when the job stopped.
+        self._queue.put((callback, dict(payload), payload, persist, future))
+        return future
+
+    def _work(self):
+        while True:
+            callback, snapshot, payload, persist, future = self._queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        outcome = deliver(callback, snapshot, persist=persist)
+                    except BaseException as error:
+                        future.set_exception(error)
+                    else:
+                        payload.setdefault("notifications", {})[channel_of(callback)] = outcome
+                        future.set_result(outcome)
+            finally:
+                with self._idle:
+                    self._unfinished -= 1
+                    self._idle.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wait for queued deliveries to finish.
+
+        Returns
+        -------
+        drained : bool
+            Whether every delivery finished within ``timeout`` seconds
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unfinished == 0, timeout)
+
+
+def get_dispatcher():
+    """Return the shared dispatcher, flushed when the interpreter exits."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher()
+            atexit.register(_flush_at_exit)
+        return _dispatcher
+
+
+def submit(callback, payload, persist=False):
+    """Queue a delivery on the shared dispatcher, see :meth:`Dispatcher.submit`."""
+    return get_dispatcher().submit(callback, payload, persist=persist)
+
+
+def flush(timeout=None):
+    """
+    Wait for background notifications to be delivered.
+
+    Returns
+    -------
+    drained : bool
+        Whether every delivery finished within ``timeout`` seconds
+    """
+    if _dispatcher is None:
+        return True
+    return _dispatcher.flush(timeout)
+
+
+def _flush_at_exit():
+    if not flush(EXIT_FLUSH_SECONDS):
+        print(f"jort: {_dispatcher.pending} notifications were not delivered before exit; "
+              "see `jort notify pending`", file=sys.stderr)
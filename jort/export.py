@@ -0,0 +1,140 @@
+"""Stream saved job history to NDJSON or CSV."""
+
+import contextlib
+import csv
+import gzip
+import io
+import json
+import sys
+
+import click
+
+from . import analytics
+from . import database
+from . import datetime_utils
+from . import exceptions
+
+
+EXPORT_COLUMNS = (
+    "job_id", "session_id", "session_name", "name", "status", "machine",
+    "date_created", "date_modified", "runtime", "stdout_fn", "error_message",
+    "pid", "exit_code", "signal", "cwd", "argv", "git_sha", "command_hash",
+    "metadata", "metrics", "notification_channels", "notifications",
+)
+FORMATS = ("ndjson", "csv")
+
+
+@contextlib.contextmanager
+def open_output(path=None, compress=False, append=False):
+    """
+    Open a text stream for export, optionally gzip-compressed.
+
+    Parameters
+    ----------
+    path : str, optional
+        Output filename; standard output when omitted or ``-``
+    compress : bool, optional
+        Write gzip-compressed output (implied by a ``.gz`` filename)
+    append : bool, optional
+        Append to an existing file; compressed output gains a new gzip member
+    """
+    to_stdout = path in (None, "-")
+    compress = compress or (not to_stdout and path.endswith(".gz"))
+    if to_stdout and not compress:
+        yield sys.stdout
+        return
+    mode = "ab" if append else "wb"
+    if compress:
+        raw = sys.stdout.buffer if to_stdout else open(path, mode)
+        binary = gzip.GzipFile(fileobj=raw, mode="wb")
+    else:
+        raw = binary = open(path, mode)
+    stream = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+    try:
+        yield stream
+    finally:
+        stream.flush()
+        stream.detach()
+        # Closing a GzipFile writes its trailer but leaves the file object open.
+        binary.close()
+        if to_stdout:
+            raw.flush()
+        elif raw is not binary:
+            raw.close()
+
+
+def write_jobs(jobs, stream, fmt="ndjson"):
+    """
+    Write decoded job payloads to a text stream one row at a time.
+
+    Parameters
+    ----------
+    jobs : iterable
+        Job payloads, e.g. from :func:`jort.database.iter_jobs` with ``decode=True``
+    stream : file
+        Writable text stream
+    fmt : str, optional
+        ``ndjson`` (one JSON object per line) or ``csv`` (nested values as JSON)
+
+    Returns
+    -------
+    count : int
+        Number of jobs written
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format `{fmt}`")
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for job in jobs:
+        if writer is None:
+            stream.write(json.dumps(job, default=str, sort_keys=True))
+            stream.write("\n")
+        else:
+            writer.writerow([
+                json.dumps(job.get(column), sort_keys=True)
+                if isinstance(job.get(column), (dict, list)) else job.get(column)
+                for column in EXPORT_COLUMNS
+            ])
+        count += 1
+    return count
+
+
+@click.command(name="export", options_metavar="[<options>]")
+@click.option("--format", "fmt", type=click.Choice(FORMATS + ("parquet",)), default="ndjson",
+              show_default=True, help="output format (parquet needs pyarrow and -o)")
+@click.option("-o", "--output", "path", metavar="<file>",
+              help="write to a file instead of standard output")
+@click.option("-z", "--gzip", "compress", is_flag=True,
+              help="gzip-compress the output (implied by a .gz filename)")
+@click.option("-s", "--session", help="filter by session name")
+@click.option("--status", multiple=True, help="filter by status (repeatable)")
+@click.option("--machine", help="filter by machine name")
+@click.option("--since", help="created at or after an ISO date or a duration ago, e.g. 1d")
+@click.option("--until", help="created before an ISO date or a duration ago")
+def export(fmt, path, compress, session, status, machine, since, until):
+    """Stream saved jobs as NDJSON, CSV, or Parquet with constant memory."""
+    try:
+        for value in (since, until):
+            if value is not None:
+                datetime_utils.parse_time(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error)) from error
+    if fmt == "parquet":
+        if path in (None, "-") or compress:
+            raise click.UsageError("Parquet export needs an -o file and is compressed already")
+        try:
+            count = analytics.write_parquet(path, session=session, status=status,
+                                            machine=machine, since=since, until=until)
+        except exceptions.JortException as error:
+            raise click.ClickException(str(error)) from error
+        click.echo(f"Exported {count} jobs to {path}", err=True)
+        return
+    jobs = database.iter_jobs(session=session, status=status, machine=machine,
+                              since=since, until=until, decode=True)
+    with open_output(path, compress=compress) as stream:
+        count = write_jobs(jobs, stream, fmt=fmt)
+    if path not in (None, "-"):
+        click.echo(f"Exported {count} jobs to {path}", err=True)
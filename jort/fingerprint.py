@@ -0,0 +1,134 @@
+"""Content fingerprints for declared command inputs and outputs."""
+
+import contextlib
+import glob
+import hashlib
+import json
+import os
+
+from . import database
+from . import exceptions
+
+
+CHUNK_BYTES = 1 << 20
+
+
+def expand_paths(patterns, cwd):
+    """
+    Expand glob patterns and directories into a sorted list of files.
+
+    Parameters
+    ----------
+    patterns : list
+        Glob patterns or paths, relative to ``cwd`` unless absolute
+    cwd : str
+        Directory that relative patterns are resolved against
+
+    Returns
+    -------
+    paths : list
+        Absolute file paths
+    """
+    paths = set()
+    for pattern in patterns:
+        # Only the pattern may contain wildcards, not the directory it is in.
+        pattern_path = os.path.join(glob.escape(cwd), os.path.expanduser(pattern))
+        matches = glob.glob(pattern_path, recursive=True)
+        if not matches:
+            raise exceptions.JortException(f"No input files match `{pattern}`")
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, files in os.walk(match):
+                    paths.update(os.path.join(root, name) for name in files)
+            else:
+                paths.add(match)
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digests(paths):
+    """
+    Return SHA-256 digests, reusing cached values for unchanged files.
+
+    A cached digest is reused when the file's device, inode, size, and
+    modification time all match, so large unchanged inputs are not re-read.
+
+    Parameters
+    ----------
+    paths : list
+        Absolute file paths
+
+    Returns
+    -------
+    digests : dict
+        Mapping of path to hex digest
+    """
+    database.ensure_database()
+    digests = {}
+    changed = {}
+    with contextlib.closing(database._connect()) as connection:
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError as error:
+                raise exceptions.JortException(f"Cannot read input {path}: {error}") from error
+            key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            row = connection.execute(
+                "SELECT device, inode, size, mtime_ns, sha256 FROM file_hashes WHERE path = ?",
+                (path,),
+            ).fetchone()
+            if row is not None and tuple(row)[:4] == key:
+                digests[path] = row["sha256"]
+            else:
+                changed[path] = key
+    if not changed:
+        return digests
+    # Hash with no connection open, so reading large inputs never holds a
+    # database lock; the new digests are then saved in one short transaction.
+    for path in changed:
+        digests[path] = _sha256(path)
+    with contextlib.closing(database._connect()) as connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO file_hashes "
+            "(path, device, inode, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+            [(path, *key, digests[path]) for path, key in changed.items()],
+        )
+        connection.commit()
+    return {path: digests[path] for path in paths}
+
+
+def inputs_fingerprint(patterns, cwd):
+    """
+    Fingerprint the files matched by input patterns.
+
+    Returns
+    -------
+    fingerprint : str
+        Digest over every input path and content digest
+    inputs : dict
+        Mapping of path (relative to ``cwd`` where possible) to content digest
+    """
+    digests = file_digests(expand_paths(patterns, cwd))
+    inputs = {}
+    for path, digest in digests.items():
+        relative = os.path.relpath(path, cwd)
+        inputs[path if relative.startswith(os.pardir) else relative] = digest
+    fingerprint = hashlib.sha256(
+        json.dumps(inputs, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return fingerprint, inputs
+
+
+def missing_outputs(paths, cwd):
+    """Return declared outputs that do not exist, relative to ``cwd``."""
+    return [
+        path for path in paths
+        if not os.path.exists(os.path.join(cwd, os.path.expanduser(path)))
+    ]
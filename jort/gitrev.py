@@ -0,0 +1,181 @@
+"""In-process resolution of the git revision checked out in a directory."""
+
+import os
+import re
+import subprocess
+
+
+SHA_PATTERN = re.compile(r"^[0-9a-f]{40}(?:[0-9a-f]{24})?$")
+MAX_SYMREF_DEPTH = 5
+# Refs kept per worktree rather than in the common directory.
+WORKTREE_REF_PREFIXES = ("refs/bisect/", "refs/worktree/", "refs/rewritten/")
+
+# Working directory -> (git directory, common directory).
+_locations = {}
+# Git directory -> (paths read, their stat keys, resolved revision).
+_heads = {}
+
+
+class _UnsupportedLayout(Exception):
+    """A repository layout only the git executable can resolve."""
+
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _is_git_dir(path):
+    return (os.path.isfile(os.path.join(path, "HEAD"))
+            and os.path.isdir(os.path.join(path, "objects"))
+            and os.path.isdir(os.path.join(path, "refs")))
+
+
+def find_git_dir(cwd):
+    """
+    Locate the repository containing a directory, like ``git rev-parse``.
+
+    Parent directories are searched for a ``.git`` directory or a ``.git``
+    file holding a ``gitdir:`` pointer, as used by worktrees and submodules,
+    or for a bare repository. Results are cached per directory.
+
+    Returns
+    -------
+    location : tuple or None
+        ``(git_dir, common_dir)``, where the common directory holds shared
+        refs and differs from the git directory in linked worktrees; ``None``
+        outside a repository
+    """
+    cached = _locations.get(cwd)
+    if cached is not None and os.path.isdir(cached[0]):
+        return cached
+    directory = cwd
+    while True:
+        dot_git = os.path.join(directory, ".git")
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+            break
+        if os.path.isfile(dot_git):
+            pointer = _read(dot_git)
+            if not pointer.startswith("gitdir:"):
+                raise _UnsupportedLayout(dot_git)
+            git_dir = os.path.normpath(os.path.join(directory, pointer[len("gitdir:"):].strip()))
+            break
+        if _is_git_dir(directory):
+            git_dir = directory
+            break
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+    common_dir = _read(os.path.join(git_dir, "commondir"))
+    common_dir = os.path.normpath(os.path.join(git_dir, common_dir)) if common_dir else git_dir
+    if os.path.isdir(os.path.join(common_dir, "reftable")):
+        raise _UnsupportedLayout(common_dir)
+    _locations[cwd] = git_dir, common_dir
+    return git_dir, common_dir
+
+
+def _packed_ref(common_dir, ref):
+    packed = os.path.join(common_dir, "packed-refs")
+    try:
+        with open(packed, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("#", "^")):
+                    continue
+                sha, _, name = line.rstrip("\n").partition(" ")
+                if name == ref:
+                    return sha
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def _resolve_head(git_dir, common_dir):
+    """Follow HEAD to a revision, returning it with every path consulted."""
+    ref = "HEAD"
+    paths = []
+    for _ in range(MAX_SYMREF_DEPTH):
+        per_worktree = ref == "HEAD" or ref.startswith(WORKTREE_REF_PREFIXES)
+        path = os.path.join(git_dir if per_worktree else common_dir, *ref.split("/"))
+        paths.append(path)
+        content = _read(path)
+        if content is None:
+            paths.append(os.path.join(common_dir, "packed-refs"))
+            content = _packed_ref(common_dir, ref)
+            if content is None:
+                # An unborn branch has no revision yet.
+                return None, paths
+        if content.startswith("ref:"):
+            ref = content[len("ref:"):].strip()
+        elif SHA_PATTERN.match(content):
+            return content, paths
+        else:
+            raise _UnsupportedLayout(path)
+    raise _UnsupportedLayout(git_dir)
+
+
+def _rev_parse(cwd):
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            timeout=2,
+            check=False,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def head_sha(cwd):
+    """
+    Return the revision checked out in the repository containing ``cwd``.
+
+    ``HEAD``, loose refs, and ``packed-refs`` are read directly, without
+    starting git. The result is cached per repository and reused while the
+    files it was read from keep their modification time, size, and inode.
+    Layouts this reader does not handle, such as reftable repositories or a
+    ``GIT_DIR`` set in the environment, fall back to ``git rev-parse HEAD``.
+
+    Returns
+    -------
+    sha : str or None
+        Full commit hash, or ``None`` outside a repository or before the
+        first commit
+    """
+    if os.environ.get("GIT_DIR") or os.environ.get("GIT_COMMON_DIR"):
+        return _rev_parse(cwd)
+    try:
+        location = find_git_dir(os.path.abspath(cwd))
+        if location is None:
+            return None
+        cached = _heads.get(location[0])
+        if cached is not None:
+            paths, keys, sha = cached
+            if [_stat_key(path) for path in paths] == keys:
+                return sha
+        _, paths = _resolve_head(*location)
+        keys = [_stat_key(path) for path in paths]
+        # Resolve again after taking the keys, so a ref rewritten in between
+        # is never cached under its new keys with its old revision.
+        sha, latest_paths = _resolve_head(*location)
+        if latest_paths == paths:
+            _heads[location[0]] = paths, keys, sha
+        return sha
+    except (_UnsupportedLayout, OSError, UnicodeDecodeError):
+        return _rev_parse(cwd)
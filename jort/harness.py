@@ -0,0 +1,679 @@
+"""Low-overhead repeated command execution for benchmarks."""
+
+import itertools
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import psutil
+import shortuuid
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from . import analytics
+from . import database
+from . import datetime_utils
+from . import exceptions
+from . import track_cli
+
+
+# Two-sided 95% Student t critical values; untabulated degrees of freedom
+# use the next smaller entry, which errs towards wider intervals.
+T_CRITICAL_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365,
+    8: 2.306, 9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086,
+    25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980,
+}
+CALIBRATION_RUNS = 20
+STEADY_WINDOW = 3
+STEADY_TOLERANCE = 0.05
+IONICE_CLASSES = ("realtime", "best-effort", "idle")
+GOVERNOR_PATH = "/sys/devices/system/cpu/cpu{}/cpufreq/scaling_governor"
+
+
+def _t_critical(degrees_of_freedom):
+    if degrees_of_freedom > max(T_CRITICAL_95):
+        return 1.960
+    return T_CRITICAL_95[max(df for df in T_CRITICAL_95 if df <= degrees_of_freedom)]
+
+
+def ci_half_width(samples):
+    """Half-width of the 95% confidence interval of the mean of ``samples``."""
+    if len(samples) < 2:
+        return math.inf
+    return _t_critical(len(samples) - 1) * statistics.stdev(samples) / math.sqrt(len(samples))
+
+
+def is_steady(runtimes, window=STEADY_WINDOW, tolerance=STEADY_TOLERANCE):
+    """
+    Whether warmup runs have stopped getting faster.
+
+    The mean of the last ``window`` runs must be no more than ``tolerance``
+    below the mean of the ``window`` runs before them.
+    """
+    if len(runtimes) < 2 * window:
+        return False
+    recent = statistics.mean(runtimes[-window:])
+    previous = statistics.mean(runtimes[-2 * window:-window])
+    return recent >= previous * (1 - tolerance)
+
+
+def outliers(samples):
+    """Indices of samples outside 1.5 interquartile ranges of the quartiles."""
+    if len(samples) < 4:
+        return []
+    ordered = sorted(samples)
+    lower = analytics._interpolate(ordered, 0.25)
+    upper = analytics._interpolate(ordered, 0.75)
+    spread = 1.5 * (upper - lower)
+    return [index for index, value in enumerate(samples)
+            if value < lower - spread or value > upper + spread]
+
+
+def parse_param(text):
+    """
+    Parse a ``name=v1,v2,...`` sweep parameter.
+
+    Returns
+    -------
+    name : str
+        Parameter name, used as ``{name}`` in the command
+    values : list
+        Parameter values, as strings
+    """
+    name, separator, values = text.partition("=")
+    name = name.strip()
+    if not separator or not name.isidentifier():
+        raise exceptions.JortException(f"Parameter must look like name=v1,v2: `{text}`")
+    values = [value.strip() for value in values.split(",")]
+    if not all(values):
+        raise exceptions.JortException(f"Parameter `{name}` has an empty value")
+    return name, values
+
+
+def expand_params(command, params):
+    """
+    Substitute every combination of parameter values into a command.
+
+    Only the ``{name}`` placeholders of declared parameters are replaced, so
+    other braces, e.g. in shell or awk syntax, are left alone.
+
+    Parameters
+    ----------
+    command : str
+        Command template
+    params : list
+        ``(name, values)`` pairs, as returned by :func:`parse_param`
+
+    Returns
+    -------
+    cells : list
+        ``(values, command)`` pairs in row-major order, where ``values`` maps
+        each parameter name to its value
+    """
+    names = [name for name, _ in params]
+    for name in names:
+        if names.count(name) > 1:
+            raise exceptions.JortException(f"Parameter `{name}` is given more than once")
+        if "{" + name + "}" not in command:
+            raise exceptions.JortException(f"Command has no `{{{name}}}` placeholder")
+    cells = []
+    for combination in itertools.product(*(values for _, values in params)):
+        values = dict(zip(names, combination))
+        cell = command
+        for name, value in values.items():
+            cell = cell.replace("{" + name + "}", value)
+        cells.append((values, cell))
+    return cells
+
+
+def parse_cpus(text):
+    """Parse a CPU list such as ``0-3,6`` into a set of CPU numbers."""
+    cpus = set()
+    try:
+        for part in text.split(","):
+            first, _, last = part.strip().partition("-")
+            cpus.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise exceptions.JortException(f"CPU list must look like 0-3,6: `{text}`") from None
+    if not cpus:
+        raise exceptions.JortException(f"CPU list is empty: `{text}`")
+    return cpus
+
+
+def parse_ionice(text):
+    """
+    Parse an I/O scheduling ``class[:level]``, e.g. ``idle`` or ``best-effort:7``.
+
+    Returns
+    -------
+    ioclass : str
+        One of ``IONICE_CLASSES``
+    level : int or None
+        Priority level within the class, 0 (highest) to 7
+    """
+    ioclass, _, level = text.partition(":")
+    if ioclass not in IONICE_CLASSES:
+        raise exceptions.JortException(
+            f"I/O class must be one of {', '.join(IONICE_CLASSES)}: `{text}`"
+        )
+    if not level:
+        return ioclass, None
+    if ioclass == "idle" or not level.isdigit() or int(level) > 7:
+        raise exceptions.JortException(f"Invalid I/O priority level: `{text}`")
+    return ioclass, int(level)
+
+
+def process_setup(cpus=None, nice=None, ionice=None):
+    """
+    Check scheduling settings and return a function applying them in a child.
+
+    The function runs between fork and exec, so the benchmarked process starts
+    pinned and prioritized while this process keeps its own settings.
+
+    Parameters
+    ----------
+    cpus : set, optional
+        CPU numbers to pin to
+    nice : int, optional
+        Absolute niceness, -20 to 19
+    ionice : tuple, optional
+        ``(ioclass, level)``, as returned by :func:`parse_ionice`
+
+    Returns
+    -------
+    setup : callable or None
+        ``None`` when there is nothing to apply
+    """
+    if cpus:
+        if not hasattr(os, "sched_setaffinity"):
+            raise exceptions.JortException("CPU pinning is not supported on this platform")
+        unavailable = set(cpus) - os.sched_getaffinity(0)
+        if unavailable:
+            raise exceptions.JortException(
+                f"CPUs not available to this process: {', '.join(map(str, sorted(unavailable)))}"
+            )
+    if nice is not None:
+        if not hasattr(os, "setpriority"):
+            raise exceptions.JortException("Setting niceness is not supported on this platform")
+        if nice < os.getpriority(os.PRIO_PROCESS, 0) and os.geteuid() != 0:
+            raise exceptions.JortException("Lowering niceness requires root")
+    if ionice is not None:
+        if not sys.platform.startswith("linux"):
+            raise exceptions.JortException("I/O priority is only supported on Linux")
+        ioclass = {
+            "realtime": psutil.IOPRIO_CLASS_RT,
+            "best-effort": psutil.IOPRIO_CLASS_BE,
+            "idle": psutil.IOPRIO_CLASS_IDLE,
+        }[ionice[0]]
+        if ioclass == psutil.IOPRIO_CLASS_RT and os.geteuid() != 0:
+            raise exceptions.JortException("Realtime I/O priority requires root")
+    if not cpus and nice is None and ionice is None:
+        return None
+
+    def setup():
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+        if nice is not None:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+        if ionice is not None:
+            psutil.Process().ionice(ioclass, ionice[1])
+    return setup
+
+
+def system_state(cpus=None):
+    """
+    Load average and CPU frequency governor, recorded at the start of each run.
+
+    Governors are read for ``cpus``, or for every CPU this process may run on.
+    A single string is returned when they agree, otherwise a mapping of CPU
+    number to governor; ``None`` where the platform does not expose them.
+    """
+    loadavg = list(os.getloadavg()) if hasattr(os, "getloadavg") else None
+    if cpus is None:
+        cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else ()
+    governors = {}
+    for cpu in sorted(cpus):
+        try:
+            with open(GOVERNOR_PATH.format(cpu)) as f:
+                governors[str(cpu)] = f.read().strip()
+        except OSError:
+            continue
+    if len(set(governors.values())) > 1:
+        governor = governors
+    else:
+        governor = next(iter(governors.values()), None)
+    return {"loadavg": loadavg, "cpu_governor": governor}
+
+
+def run_hook(command, cwd=None, description="hook"):
+    """Run a prepare or cleanup shell command, raising if it fails."""
+    code = subprocess.run(command, shell=True, cwd=cwd, stdin=subprocess.DEVNULL,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+    if code != 0:
+        raise exceptions.JortException(
+            f"{description.capitalize()} command failed with exit code {code}: `{command}`"
+        )
+
+
+def spawn(command, shell=False, cwd=None, preexec_fn=None):
+    """
+    Run a command once with its output discarded and time it.
+
+    The child is reaped with ``os.wait4`` where available, which also returns
+    its resource usage without a sampling thread. ``preexec_fn``, e.g. from
+    :func:`process_setup`, runs in the child before exec.
+
+    Returns
+    -------
+    result : dict
+        ``runtime`` (wall seconds), ``exit_code``, ``pid``, and ``metrics``
+    """
+    started = time.perf_counter()
+    try:
+        process = subprocess.Popen(command, shell=shell, cwd=cwd, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   preexec_fn=preexec_fn)
+    except subprocess.SubprocessError as error:
+        raise exceptions.JortException(
+            f"Could not apply process settings to `{command}`: {error}"
+        ) from error
+    if hasattr(os, "wait4") and resource is not None:
+        _, status, usage = os.wait4(process.pid, 0)
+        runtime = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # A child's peak RSS starts from this process's peak, which it inherits
+        # on exec; below that the child's own peak is unknown.
+        peak_rss = usage.ru_maxrss
+        if peak_rss <= resource.getrusage(resource.RUSAGE_SELF).ru_maxrss:
+            peak_rss = 0
+        metrics = {
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+            "peak_rss_bytes": peak_rss * (1 if sys.platform == "darwin" else 1024) or None,
+            "cpu_user_seconds": usage.ru_utime,
+            "cpu_system_seconds": usage.ru_stime,
+        }
+    else:
+        process.wait()
+        runtime = time.perf_counter() - started
+        metrics = {}
+    return {"runtime": runtime, "exit_code": process.returncode, "pid": process.pid,
+            "metrics": metrics}
+
+
+def calibrate(shell=False, cwd=None, runs=CALIBRATION_RUNS, preexec_fn=None):
+    """
+    Median time to start and reap an empty shell, or 0 without a shell.
+
+    Commands run through a shell pay for the shell itself on every
+    repetition; this overhead is subtracted from their runtimes.
+    """
+    if not shell:
+        return 0.0
+    return statistics.median(spawn("", shell=True, cwd=cwd, preexec_fn=preexec_fn)["runtime"]
+                             for _ in range(runs))
+
+
+def run_benchmark(command, repeat=3, warmup=1, max_warmup=None, target_ci=None,
+                  max_repeat=None, shell=False, cwd=None, session_name="benchmark",
+                  to_db=True, metadata=None, cpus=None, nice=None, ionice=None,
+                  prepare=None, cleanup=None):
+    """
+    Time a command repeatedly with minimal per-run overhead.
+
+    Command metadata, the session, and the git revision are resolved once;
+    each repetition is a bare spawn with output discarded. After ``warmup``
+    runs, warming up continues until runtimes stop improving, up to
+    ``max_warmup`` runs. After ``repeat`` measured runs, measuring continues
+    until the 95% confidence interval of the mean is within ``target_ci``
+    percent of it, up to ``max_repeat`` runs. Shell overhead is calibrated
+    and subtracted, runs outside 1.5 interquartile ranges are flagged as
+    outliers, and all runs are saved in one transaction.
+
+    Each repetition, warmups included, can be pinned to ``cpus``, run at a
+    given ``nice`` and ``ionice`` priority, and surrounded by ``prepare`` and
+    ``cleanup`` shell commands, e.g. to empty a cache for cold-start runs.
+    The load average and CPU frequency governor at the start of each run are
+    stored in its metadata under ``environment``.
+
+    Parameters
+    ----------
+    command : str or list
+        Command string, or argv list when ``shell`` is false
+    repeat : int, optional
+        Minimum number of measured runs
+    warmup : int, optional
+        Minimum number of unmeasured warmup runs
+    max_warmup : int, optional
+        Maximum number of warmup runs; defaults to ``warmup``
+    target_ci : float, optional
+        Target confidence-interval half-width, in percent of the mean
+    max_repeat : int, optional
+        Maximum number of measured runs; defaults to ``repeat``, or 100 with
+        ``target_ci``
+    shell : bool, optional
+        Run through the shell
+    cwd : str, optional
+        Working directory
+    session_name : str, optional
+        Session for saved runs
+    to_db : bool, optional
+        Save runs to the database
+    metadata : dict, optional
+        Extra metadata stored with each run
+    cpus : set, optional
+        CPU numbers to pin each run to, see :func:`parse_cpus`
+    nice : int, optional
+        Niceness of each run
+    ionice : tuple, optional
+        I/O scheduling class and level of each run, see :func:`parse_ionice`
+    prepare, cleanup : str, optional
+        Shell commands run before and after each repetition, untimed
+
+    Returns
+    -------
+    summary : dict
+        Timing statistics, outlier indices, and saved ``job_ids``
+    """
+    info = track_cli._command_metadata(command, shell, cwd=cwd)
+    max_warmup = max(warmup, max_warmup or warmup)
+    if max_repeat is None:
+        max_repeat = 100 if target_ci is not None else repeat
+    max_repeat = max(repeat, max_repeat)
+    setup = process_setup(cpus, nice, ionice)
+    spawn_overhead = calibrate(shell, cwd=info["cwd"], preexec_fn=setup)
+    settings = _settings(cpus, nice, ionice, prepare, cleanup)
+
+    def repetition():
+        return _repetition(info, shell, setup, settings, spawn_overhead)
+
+    warmups = []
+    while len(warmups) < max_warmup:
+        if len(warmups) >= warmup and is_steady(warmups):
+            break
+        result = repetition()
+        if result["exit_code"] != 0:
+            break
+        warmups.append(result["raw_runtime"])
+
+    runs = []
+    while len(runs) < max_repeat:
+        if len(runs) >= repeat and _converged(runs, target_ci):
+            break
+        result = repetition()
+        runs.append(result)
+        if result["exit_code"] != 0:
+            break
+
+    session_id = database.get_or_create_session(session_name) if to_db else None
+    payloads = _payloads(info, runs, session_id, spawn_overhead, metadata)
+    if to_db and payloads:
+        database.save_jobs(payloads)
+    return _summary(info, runs, payloads, session_name, len(warmups), spawn_overhead)
+
+
+def _settings(cpus, nice, ionice, prepare, cleanup):
+    return {
+        "cpus": sorted(cpus) if cpus else None,
+        "nice": nice,
+        "ionice": ":".join(str(part) for part in ionice if part is not None) if ionice else None,
+        "prepare": prepare,
+        "cleanup": cleanup,
+    }
+
+
+def _repetition(info, shell, setup, settings, spawn_overhead):
+    """Run one repetition between the prepare and cleanup hooks."""
+    target = info["command"] if shell else info["argv"]
+    if settings["prepare"]:
+        run_hook(settings["prepare"], cwd=info["cwd"], description="prepare")
+    state = system_state(settings["cpus"])
+    started = time.time()
+    result = spawn(target, shell=shell, cwd=info["cwd"], preexec_fn=setup)
+    if settings["cleanup"]:
+        run_hook(settings["cleanup"], cwd=info["cwd"], description="cleanup")
+    result["started"] = started
+    result["environment"] = {**settings, **state}
+    result["raw_runtime"] = result["runtime"]
+    result["runtime"] = max(0.0, result["runtime"] - spawn_overhead)
+    return result
+
+
+def _converged(runs, target_ci):
+    """Whether measured runs meet the target confidence interval, if any."""
+    if target_ci is None:
+        return True
+    runtimes = [run["runtime"] for run in runs]
+    return ci_half_width(runtimes) <= target_ci / 100 * abs(statistics.mean(runtimes))
+
+
+def _payloads(info, runs, session_id, spawn_overhead, metadata=None):
+    """Build job payloads for measured runs, flagging outliers."""
+    flagged = outliers([run["runtime"] for run in runs])
+    machine = socket.gethostname()
+    payloads = []
+    for index, run in enumerate(runs):
+        payload = {
+            "job_id": shortuuid.uuid(),
+            "session_id": session_id,
+            "name": info["command"],
+            "machine": machine,
+            "date_created": datetime_utils.get_iso_date(run["started"]),
+            "date_modified": datetime_utils.get_iso_date(run["started"] + run["raw_runtime"]),
+            "runtime": run["runtime"],
+            "stdout_fn": None,
+            "pid": run["pid"],
+            "signal": None,
+            "cwd": info["cwd"],
+            "argv": info["argv"],
+            "git_sha": info["git_sha"],
+            "command_hash": info["command_hash"],
+            "metadata": {
+                **info["metadata"],
+                **(metadata or {}),
+                "benchmark": {
+                    "index": index,
+                    "raw_runtime": run["raw_runtime"],
+                    "spawn_overhead": spawn_overhead,
+                    "outlier": index in flagged,
+                    **run.get("benchmark", {}),
+                },
+                "environment": run["environment"],
+            },
+            "metrics": run["metrics"],
+            "notification_channels": [],
+        }
+        track_cli._set_process_result(payload, run["exit_code"])
+        payloads.append(payload)
+    return payloads
+
+
+def _summary(info, runs, payloads, session_name, warmups, spawn_overhead):
+    runtimes = [run["runtime"] for run in runs]
+    summary = {
+        "command": info["command"],
+        "command_hash": info["command_hash"],
+        "session": session_name,
+        "repeat": len(runs),
+        "warmup": warmups,
+        "status": "success" if all(run["exit_code"] == 0 for run in runs) else "error",
+        "spawn_overhead_seconds": spawn_overhead,
+        "job_ids": [payload["job_id"] for payload in payloads],
+        "outliers": [index for index, payload in enumerate(payloads)
+                     if payload["metadata"]["benchmark"]["outlier"]],
+        "finished": datetime_utils.get_iso_date(),
+    }
+    if runtimes:
+        ordered = sorted(runtimes)
+        mean = statistics.mean(runtimes)
+        half_width = ci_half_width(runtimes)
+        summary.update({
+            "mean_seconds": mean,
+            "median_seconds": statistics.median(runtimes),
+            "p95_seconds": ordered[min(len(ordered) - 1, max(0, int(len(ordered) * 0.95)))],
+            "stdev_seconds": statistics.stdev(runtimes) if len(runtimes) > 1 else 0.0,
+            "min_seconds": ordered[0],
+            "max_seconds": ordered[-1],
+            "ci_half_width_percent": (half_width / mean * 100
+                                      if mean and math.isfinite(half_width) else None),
+        })
+    return summary
+
+
+def speedup(baseline, candidate, resamples=2000, confidence=0.95, seed=None):
+    """
+    How many times faster ``candidate`` runs than ``baseline``, by median.
+
+    Returns
+    -------
+    comparison : dict
+        ``speedup`` with its bootstrap confidence interval ``ci_low`` and
+        ``ci_high``, ``change_percent`` of the median, and the Mann-Whitney U
+        ``p_value``
+    """
+    change, (low, high) = analytics.bootstrap_change(baseline, candidate, resamples=resamples,
+                                                     confidence=confidence, seed=seed)
+
+    def invert(value):
+        return None if value is None or value <= -100 else 100 / (100 + value)
+
+    return {
+        "speedup": invert(change),
+        # A larger slowdown bound is a smaller speedup bound.
+        "ci_low": invert(high),
+        "ci_high": invert(low),
+        "change_percent": change,
+        "p_value": analytics.mann_whitney_u(baseline, candidate)[1],
+    }
+
+
+def run_interleaved(commands, repeat=10, warmup=1, max_warmup=None, target_ci=None,
+                    max_repeat=None, shell=False, cwd=None, session_name="benchmark",
+                    to_db=True, metadata=None, cpus=None, nice=None, ionice=None,
+                    prepare=None, cleanup=None, seed=None, resamples=2000):
+    """
+    Benchmark several commands in interleaved rounds for a fair comparison.
+
+    Every round runs each command once in a freshly shuffled order, so drift
+    in machine load or temperature affects all commands alike instead of
+    whichever ran last. Each command is saved under its own fingerprint, and
+    every command after the first is compared against the first.
+
+    Parameters
+    ----------
+    commands : list
+        Two or more command strings, or argv lists when ``shell`` is false
+    repeat : int, optional
+        Minimum number of rounds
+    warmup : int, optional
+        Minimum number of unmeasured warmup rounds
+    max_warmup : int, optional
+        Continue warming up, up to this many rounds, until every command's
+        warmup runtimes are steady, as for :func:`run_benchmark`
+    target_ci : float, optional
+        Continue until every command's confidence interval is within this
+        percent of its mean
+    max_repeat : int, optional
+        Maximum number of rounds; defaults to ``repeat``, or 100 with
+        ``target_ci``
+    seed : int, optional
+        Seed for the round order and bootstrap intervals
+    resamples : int, optional
+        Bootstrap resamples per comparison
+    **kwargs
+        ``shell``, ``cwd``, ``session_name``, ``to_db``, ``metadata``, and
+        the environment controls are as for :func:`run_benchmark`
+
+    Returns
+    -------
+    result : dict
+        ``commands`` with one :func:`run_benchmark`-style summary each, and
+        ``comparisons`` of each later command against the first, see
+        :func:`speedup`
+    """
+    infos = [track_cli._command_metadata(command, shell, cwd=cwd) for command in commands]
+    if len(infos) < 2:
+        raise exceptions.JortException("Interleaving needs at least two commands")
+    if len({info["command_hash"] for info in infos}) < len(infos):
+        raise exceptions.JortException("Interleaved commands must differ")
+    if max_repeat is None:
+        max_repeat = 100 if target_ci is not None else repeat
+    max_repeat = max(repeat, max_repeat)
+    setup = process_setup(cpus, nice, ionice)
+    spawn_overhead = calibrate(shell, cwd=infos[0]["cwd"], preexec_fn=setup)
+    settings = _settings(cpus, nice, ionice, prepare, cleanup)
+    generator = random.Random(seed)
+    group = shortuuid.uuid()
+    order = list(range(len(infos)))
+
+    max_warmup = max(warmup, max_warmup or warmup)
+    warmup_runs = [[] for _ in infos]
+    warmups = 0
+    while warmups < max_warmup:
+        if warmups >= warmup and all(is_steady(runtimes) for runtimes in warmup_runs):
+            break
+        generator.shuffle(order)
+        results = {position: _repetition(infos[position], shell, setup, settings,
+                                         spawn_overhead)
+                   for position in order}
+        warmups += 1
+        if any(result["exit_code"] != 0 for result in results.values()):
+            break
+        for position, result in results.items():
+            warmup_runs[position].append(result["raw_runtime"])
+
+    failed = False
+    runs = [[] for _ in infos]
+    rounds = 0
+    while not failed and rounds < max_repeat:
+        if rounds >= repeat and all(_converged(command_runs, target_ci) for command_runs in runs):
+            break
+        generator.shuffle(order)
+        for slot, position in enumerate(order):
+            result = _repetition(infos[position], shell, setup, settings, spawn_overhead)
+            result["benchmark"] = {"group": group, "round": rounds, "slot": slot}
+            runs[position].append(result)
+            if result["exit_code"] != 0:
+                failed = True
+                break
+        rounds += 1
+
+    session_id = database.get_or_create_session(session_name) if to_db else None
+    payloads = [_payloads(info, command_runs, session_id, spawn_overhead, metadata)
+                for info, command_runs in zip(infos, runs)]
+    if to_db and any(payloads):
+        database.save_jobs([payload for command_payloads in payloads
+                            for payload in command_payloads])
+    summaries = [
+        _summary(info, command_runs, command_payloads, session_name, warmups, spawn_overhead)
+        for info, command_runs, command_payloads in zip(infos, runs, payloads)
+    ]
+    comparisons = []
+    baseline = [run["runtime"] for run in runs[0]]
+    for summary, command_runs in zip(summaries[1:], runs[1:]):
+        candidate = [run["runtime"] for run in command_runs]
+        if not failed and baseline and candidate:
+            comparisons.append({
+                "baseline": summaries[0]["command"],
+                "command": summary["command"],
+                **speedup(baseline, candidate, resamples=resamples, seed=seed),
+            })
+    return {
+        "session": session_name,
+        "group": group,
+        "rounds": rounds,
+        "warmup": warmups,
+        "status": ("success" if not failed and all(summary["status"] == "success"
+                                                   for summary in summaries) else "error"),
+        "commands": summaries,
+        "comparisons": comparisons,
+        "finished": datetime_utils.get_iso_date(),
+    }
@@ -0,0 +1,305 @@
+"""Runtime history along git commits and regression bisection."""
+
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+import click
+
+from . import analytics
+from . import database
+from . import exceptions
+from . import harness
+
+
+def _git(args, cwd):
+    """Run a git command and return its standard output."""
+    try:
+        result = subprocess.run(["git", *args], cwd=cwd, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                check=False)
+    except OSError as error:
+        raise exceptions.JortException(f"Could not run git: {error}") from error
+    if result.returncode != 0:
+        message = result.stderr.strip().splitlines()
+        raise exceptions.JortException(
+            f"git {args[0]} failed: {message[-1] if message else result.returncode}"
+        )
+    return result.stdout
+
+
+def repository_root(cwd=None):
+    """Return the top-level directory of the work tree containing ``cwd``."""
+    return _git(["rev-parse", "--show-toplevel"], cwd or os.getcwd()).strip()
+
+
+def _command_filter(command):
+    """Match a command by fingerprint if one is saved, else by job name pattern."""
+    database.ensure_database()
+    with contextlib.closing(database._connect()) as connection:
+        known = connection.execute(
+            "SELECT 1 FROM commands WHERE command_hash = ?", (command,)
+        ).fetchone()
+    return {"command_hash": command} if known else {"name": command}
+
+
+def commit_history(command, rev="HEAD", max_commits=None, cwd=None, **filters):
+    """
+    Summarize runtime and peak RSS of a command per commit, oldest first.
+
+    Commits come from ``git log --topo-order``; commits without
+    saved successful runs of the command, and runs at commits outside the
+    history of ``rev``, are left out.
+
+    Parameters
+    ----------
+    command : str
+        Command fingerprint, or a job name pattern
+    rev : str, optional
+        Revision whose history is shown
+    max_commits : int, optional
+        Only consider this many most recent commits
+    cwd : str, optional
+        Directory inside the repository
+    **filters
+        Further filters accepted by :func:`jort.analytics.summarize`
+
+    Returns
+    -------
+    commits : list
+        One dictionary per commit with ``git_sha``, ``subject``, the runtime
+        summary of :func:`jort.analytics.summarize`, and ``change_percent`` of
+        the median against the previous listed commit
+    """
+    args = ["log", "--topo-order", "--format=%H%x00%s"]
+    if max_commits is not None:
+        args.append(f"--max-count={max_commits}")
+    log = _git([*args, rev, "--"], cwd or os.getcwd())
+    groups = {
+        group["git_sha"]: group
+        for group in analytics.summarize(by="git_sha", exact=True,
+                                         **_command_filter(command), **filters)
+    }
+    commits = []
+    for line in reversed(log.splitlines()):
+        sha, _, subject = line.partition("\x00")
+        if sha not in groups:
+            continue
+        group = {**groups[sha], "subject": subject, "change_percent": None}
+        if commits and commits[-1]["p50"]:
+            previous = commits[-1]["p50"]
+            group["change_percent"] = (group["p50"] - previous) / previous * 100
+        commits.append(group)
+    return commits
+
+
+@contextlib.contextmanager
+def temporary_worktree(root, rev):
+    """Check out ``rev`` in a detached temporary worktree, removed on exit."""
+    directory = tempfile.mkdtemp(prefix="jort-bisect-")
+    path = os.path.join(directory, os.path.basename(root))
+    _git(["worktree", "add", "--detach", "--quiet", path, rev], root)
+    try:
+        yield path
+    finally:
+        try:
+            _git(["worktree", "remove", "--force", path], root)
+        except exceptions.JortException:
+            _git(["worktree", "prune"], root)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bisect(command, good, bad, threshold=10.0, repeat=5, warmup=1, shell=False, cwd=None,
+           build=None, session_name="bisect", progress=None):
+    """
+    Find the first commit whose median runtime exceeds a threshold.
+
+    The first-parent commits from ``good`` to ``bad`` are checked out in a
+    temporary worktree and benchmarked with :func:`jort.harness.run_benchmark`;
+    a commit is slow when its median runtime is more than ``threshold``
+    percent above the median at ``good``. Like ``git bisect``, this assumes
+    commits are fast up to some commit and slow from it on.
+
+    Parameters
+    ----------
+    command : str or list
+        Command string, or argv list when ``shell`` is false
+    good, bad : str
+        Revisions known to be fast and slow
+    threshold : float, optional
+        Slowdown in percent of the median at ``good``
+    repeat, warmup : int, optional
+        Measured and warmup runs per commit
+    shell : bool, optional
+        Run through the shell
+    cwd : str, optional
+        Directory inside the repository to run the command from
+    build : str, optional
+        Shell command run once after each checkout, before benchmarking
+    session_name : str, optional
+        Session for saved runs
+    progress : callable, optional
+        Called with each tested commit's result
+
+    Returns
+    -------
+    result : dict
+        ``first_bad`` commit and ``subject``, the medians at ``good`` and
+        there, and every tested commit in ``steps``
+    """
+    cwd = os.path.abspath(cwd or os.getcwd())
+    root = repository_root(cwd)
+    good, bad = (_git(["rev-parse", "--verify", f"{rev}^{{commit}}"], root).strip()
+                 for rev in (good, bad))
+    commits = _git(["rev-list", "--first-parent", "--ancestry-path", "--reverse",
+                    f"{good}..{bad}"], root).split()
+    if not commits:
+        raise exceptions.JortException("The bad commit is not a descendant of the good commit")
+    relative = os.path.relpath(cwd, root)
+    steps = []
+
+    with temporary_worktree(root, good) as worktree:
+        def measure(sha):
+            _git(["checkout", "--detach", "--force", "--quiet", sha], worktree)
+            if build:
+                harness.run_hook(build, cwd=worktree, description="build")
+            summary = harness.run_benchmark(
+                command, repeat=repeat, warmup=warmup, shell=shell,
+                cwd=os.path.join(worktree, relative), session_name=session_name,
+                metadata={"bisect": {"good": good, "bad": bad}},
+            )
+            if summary["status"] != "success":
+                raise exceptions.JortException(f"Command failed at commit {sha[:12]}")
+            step = {"git_sha": sha, "median_seconds": summary["median_seconds"],
+                    "mean_seconds": summary["mean_seconds"], "repeat": summary["repeat"]}
+            steps.append(step)
+            return step
+
+        def is_slow(sha):
+            step = measure(sha)
+            step["slow"] = step["median_seconds"] > limit
+            if progress is not None:
+                progress(step)
+            return step["slow"]
+
+        baseline = measure(good)["median_seconds"]
+        limit = baseline * (1 + threshold / 100)
+        steps[0]["slow"] = False
+        if progress is not None:
+            progress(steps[0])
+        if not is_slow(bad):
+            raise exceptions.JortException(
+                f"The bad commit is not more than {threshold:g}% slower than the good commit"
+            )
+        # commits[low] is fast, or is `good` at -1; commits[high] is slow.
+        low, high = -1, len(commits) - 1
+        while high - low > 1:
+            middle = (low + high) // 2
+            if is_slow(commits[middle]):
+                high = middle
+            else:
+                low = middle
+
+    first_bad = commits[high]
+    subject = _git(["log", "-1", "--format=%s", first_bad], root).strip()
+    return {
+        "command": command if isinstance(command, str) else " ".join(command),
+        "good": good,
+        "bad": bad,
+        "threshold_percent": threshold,
+        "good_median_seconds": baseline,
+        "limit_seconds": limit,
+        "first_bad": first_bad,
+        "subject": subject,
+        "median_seconds": next(step["median_seconds"] for step in steps
+                               if step["git_sha"] == first_bad),
+        "steps": steps,
+    }
+
+
+@click.command(name="history", options_metavar="[<options>]")
+@click.argument("command", metavar="<command>")
+@click.option("--rev", default="HEAD", show_default=True, help="show the history of this revision")
+@click.option("-n", "--max-commits", type=click.IntRange(min=1),
+              help="only consider this many most recent commits")
+@click.option("-s", "--session", help="filter by session name")
+@click.option("--machine", help="filter by machine name")
+@click.option("-C", "directory", type=click.Path(file_okay=False, exists=True),
+              help="use the repository containing this directory")
+@click.option("--json", "as_json", is_flag=True, help="print machine-readable JSON")
+def history(command, rev, max_commits, session, machine, directory, as_json):
+    """Show runtime and peak RSS of a command per commit, oldest first.
+
+    <command> is a command fingerprint or a job name pattern.
+    """
+    try:
+        commits = commit_history(command, rev=rev, max_commits=max_commits, cwd=directory,
+                                 session=session, machine=machine)
+    except exceptions.JortException as error:
+        raise click.ClickException(str(error)) from error
+    if as_json:
+        click.echo(json.dumps(commits, indent=2, sort_keys=True))
+        return
+    if not commits:
+        click.echo("No runs at commits in this history")
+        return
+    click.echo(f"{'commit':<12} {'count':>6} {'p50':>10} {'p95':>10} {'change':>8} "
+               f"{'peak rss':>10}  subject")
+    for commit in commits:
+        change = commit["change_percent"]
+        subject = commit["subject"]
+        if len(subject) > 40:
+            subject = subject[:37] + "..."
+        click.echo(
+            f"{commit['git_sha'][:12]:<12} {commit['count']:>6} {commit['p50']:>10.3f} "
+            f"{commit['p95']:>10.3f} {'-' if change is None else f'{change:+.1f}%':>8} "
+            f"{analytics._format_bytes(commit['peak_rss_bytes']):>10}  {subject}"
+        )
+
+
+@click.command(name="bisect", options_metavar="[<options>]")
+@click.argument("job", nargs=-1, required=True, metavar="<job>")
+@click.option("--good", required=True, help="revision with acceptable runtime")
+@click.option("--bad", default="HEAD", show_default=True, help="revision with slow runtime")
+@click.option("--threshold", type=click.FloatRange(min=0, min_open=True), default=10.0,
+              show_default=True, help="percent slowdown of the median that counts as slow")
+@click.option("-r", "--repeat", type=click.IntRange(min=1), default=5, show_default=True,
+              help="measured runs per commit")
+@click.option("--warmup", type=click.IntRange(min=0), default=1, show_default=True,
+              help="warmup runs per commit")
+@click.option("--build", metavar="<command>", help="shell command to run after each checkout")
+@click.option("--session", default="bisect", show_default=True)
+@click.option("--shell", is_flag=True)
+@click.option("-C", "directory", type=click.Path(file_okay=False, exists=True),
+              help="run from this directory of the repository")
+@click.option("--json", "as_json", is_flag=True, help="print machine-readable JSON")
+def bisect_command(job, good, bad, threshold, repeat, warmup, build, session, shell, directory,
+                   as_json):
+    """Find the commit that made a command slower.
+
+    Commits between --good and --bad are checked out in a temporary worktree
+    and benchmarked, binary searching for the first commit whose median
+    runtime is more than --threshold percent above the median at --good.
+    """
+    def report(step):
+        if not as_json:
+            verdict = "slow" if step["slow"] else "fast"
+            click.echo(f"{step['git_sha'][:12]}  {step['median_seconds']:.6f} s  {verdict}",
+                       err=True)
+
+    try:
+        result = bisect(" ".join(job) if shell else list(job), good, bad, threshold=threshold,
+                        repeat=repeat, warmup=warmup, shell=shell, cwd=directory, build=build,
+                        session_name=session, progress=report)
+    except exceptions.JortException as error:
+        raise click.ClickException(str(error)) from error
+    if as_json:
+        click.echo(json.dumps(result, indent=2))
+        return
+    change = (result["median_seconds"] / result["good_median_seconds"] - 1) * 100
+    click.echo(f"First slow commit: {result['first_bad'][:12]} {result['subject']}")
+    click.echo(f"Median {result['good_median_seconds']:.6f} s -> "
+               f"{result['median_seconds']:.6f} s ({change:+.1f}%)")
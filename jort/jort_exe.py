@@ -1,19 +1,33 @@
 #!/usr/bin/env python3
 """Jort command-line interface."""
 
+import concurrent.futures
 import json
 import os
 import signal
-import statistics
+import threading
 
 import click
 import psutil
 
+from . import analytics
+from . import arrays
 from . import config
 from . import database
 from . import datetime_utils
 from . import detached
+from . import dispatch
+from . import exceptions
+from . import export
+from . import harness
+from . import history
+from . import liveness
+from . import outbox
+from . import phases
+from . import pipeline
 from . import reporting_callbacks
+from . import retention
+from . import rules
 from . import track_cli
 from ._version import __version__
 
@@ -38,7 +52,7 @@ def _emit_result(payload, as_json, strict_notifications=False):
     if strict_notifications:
         failed = [
             channel for channel, result in payload.get("notifications", {}).items()
-            if result.get("status") == "failed"
+            if result.get("status") in ("failed", "timeout")
         ]
         if failed:
             raise click.exceptions.Exit(2)
@@ -65,32 +79,95 @@ def cli():
 @click.option("--pid", type=int, help="track an existing process explicitly")
 @click.option("-t", "--text", is_flag=True, help="send SMS text at job exit")
 @click.option("-e", "--email", is_flag=True, help="send email at job exit")
+@click.option("-w", "--webhook", is_flag=True, help="post to the configured webhook at job exit")
+@click.option("--notify-if", "notify_if", multiple=True, metavar="<rule>",
+              help="only notify when a rule such as 'runtime > p95' matches")
+@click.option("--baseline-runs", type=click.IntRange(min=1),
+              help="recent successful runs that rule baselines use [default: 30]")
 @click.option("-d", "--database", is_flag=True, help="store job details in database")
 @click.option("-s", "--session", metavar="<session>", help="job session name for database")
 @click.option("-u", "--unique", is_flag=True, help="skip a previously successful matching job")
+@click.option("--inputs", multiple=True, metavar="<glob>",
+              help="input files whose contents are part of the --unique key")
+@click.option("--outputs", multiple=True, metavar="<path>",
+              help="output paths that must exist for --unique to skip")
 @click.option("-o", "--output", is_flag=True, help="capture output for an email attachment")
 @click.option("--max-output-bytes", type=click.IntRange(min=1), help="bound captured output size")
 @click.option("--timeout", "timeout_seconds", type=click.FloatRange(min=0.001),
               help="terminate the job after this many seconds")
+@click.option("--heartbeat", "heartbeat_seconds", type=click.FloatRange(min=0),
+              help="save a running job's progress this often, 0 to disable [default: 30]")
+@click.option("--phase-regex", metavar="<regex>",
+              help="time phases between output lines matching this, named by its first group")
 @click.option("--shell", is_flag=True, help="use shell execution for a new command")
 @click.option("--argv", "argv_mode", is_flag=True,
               help="treat command arguments as an exact argv list")
 @click.option("--cwd", type=click.Path(file_okay=False), help="working directory for a new command")
 @click.option("--detach", is_flag=True, help="run the monitor in a durable background worker")
+@click.option("--array", "array_range", metavar="<range>",
+              help="run once per value, e.g. 1-1000, substituted for {i}")
+@click.option("--array-file", type=click.Path(dir_okay=False, exists=True),
+              help="run once per line of a file, substituted for {i}")
+@click.option("--parallel", type=click.IntRange(min=1), default=4, show_default=True,
+              help="maximum number of array instances running at once")
 @click.option("--json", "as_json", is_flag=True, help="print a machine-readable result")
 @click.option("--strict-notifications", is_flag=True,
               help="exit 2 when a requested notification cannot be sent")
 @click.option("-q", "--quiet", is_flag=True, help="suppress live command output")
 @click.option("-v", "--verbose", is_flag=True, help="print job payloads and details")
 @click.pass_context
-def track(ctx, job, pid, text, email, database, session, unique, output,
-          max_output_bytes, timeout_seconds, shell, argv_mode, cwd, detach, as_json, strict_notifications,
-          quiet, verbose):
+def track(ctx, job, pid, text, email, webhook, notify_if, baseline_runs, database, session, unique, inputs, outputs, output,
+          max_output_bytes, timeout_seconds, heartbeat_seconds, phase_regex, shell, argv_mode, cwd, detach,
+          array_range, array_file, parallel, as_json, strict_notifications, quiet, verbose):
     """Track <job>, either a shell command or an existing process."""
+    if phase_regex is not None:
+        try:
+            phases.compile_pattern(phase_regex)
+        except exceptions.JortException as error:
+            raise click.BadParameter(str(error), param_hint="--phase-regex")
+    if array_range is not None or array_file is not None:
+        # Instances are always saved, so -d is implied; these options have no
+        # per-instance equivalent.
+        if (pid is not None or detach or unique or notify_if or baseline_runs is not None
+                or heartbeat_seconds is not None or verbose):
+            raise click.UsageError("--array cannot be combined with --pid, --detach, "
+                                   "--unique, --notify-if, --baseline-runs, --heartbeat, "
+                                   "or --verbose")
+        if array_range is not None and array_file is not None:
+            raise click.UsageError("choose one of --array and --array-file")
+        if argv_mode and shell:
+            raise click.UsageError("--argv cannot be combined with --shell")
+        instance_kwargs = dict(use_shell=shell, store_stdout=output)
+        for key, value in (("cwd", cwd), ("max_output_bytes", max_output_bytes),
+                           ("timeout_seconds", timeout_seconds),
+                           ("phase_regex", phase_regex)):
+            if value is not None:
+                instance_kwargs[key] = value
+        if inputs:
+            instance_kwargs["inputs"] = list(inputs)
+        if outputs:
+            instance_kwargs["outputs"] = list(outputs)
+        _track_array(list(job) if argv_mode else " ".join(job), array_range, array_file,
+                     parallel, session, instance_kwargs, email, text, webhook, as_json,
+                     strict_notifications, quiet)
+        return
+    try:
+        rules.parse_rules(notify_if)
+    except exceptions.JortException as error:
+        raise click.BadParameter(str(error), param_hint="--notify-if")
+    monitor_kwargs = {}
+    if notify_if:
+        monitor_kwargs["notify_if"] = list(notify_if)
+    if baseline_runs is not None:
+        monitor_kwargs["baseline_runs"] = baseline_runs
+    if heartbeat_seconds is not None:
+        monitor_kwargs["heartbeat_seconds"] = heartbeat_seconds
     explicit_pid = pid is not None
     implicit_pid = len(job) == 1 and job[0].isdigit()
     if explicit_pid or implicit_pid:
         process_id = pid if explicit_pid else int(job[0])
+        if phase_regex is not None:
+            raise click.UsageError("--phase-regex needs a new command, not an existing process")
         if detach:
             result = detached.launch({
                 "mode": "existing",
@@ -98,6 +175,8 @@ def track(ctx, job, pid, text, email, database, session, unique, output,
                 "session_name": session,
                 "send_text": text,
                 "send_email": email,
+                "send_webhook": webhook,
+                **monitor_kwargs,
             })
         else:
             if not as_json:
@@ -111,6 +190,9 @@ def track(ctx, job, pid, text, email, database, session, unique, output,
             )
             if timeout_seconds is not None:
                 existing_kwargs["timeout_seconds"] = timeout_seconds
+            if webhook:
+                existing_kwargs["send_webhook"] = True
+            existing_kwargs.update(monitor_kwargs)
             result = track_cli.track_existing(process_id, **existing_kwargs)
     else:
         joined_command = " ".join(job)
@@ -127,8 +209,14 @@ def track(ctx, job, pid, text, email, database, session, unique, output,
                 "timeout_seconds": timeout_seconds,
                 "cwd": cwd,
                 "session_name": session,
+                "unique": unique,
+                "inputs": list(inputs),
+                "outputs": list(outputs),
                 "send_text": text,
                 "send_email": email,
+                "send_webhook": webhook,
+                "phase_regex": phase_regex,
+                **monitor_kwargs,
             })
         else:
             if not as_json and not quiet:
@@ -146,98 +234,337 @@ def track(ctx, job, pid, text, email, database, session, unique, output,
             )
             if cwd is not None:
                 track_kwargs["cwd"] = cwd
+            if inputs:
+                track_kwargs["inputs"] = list(inputs)
+            if outputs:
+                track_kwargs["outputs"] = list(outputs)
             if max_output_bytes is not None:
                 track_kwargs["max_output_bytes"] = max_output_bytes
             if timeout_seconds is not None:
                 track_kwargs["timeout_seconds"] = timeout_seconds
+            if webhook:
+                track_kwargs["send_webhook"] = True
+            if phase_regex is not None:
+                track_kwargs["phase_regex"] = phase_regex
+            track_kwargs.update(monitor_kwargs)
             if quiet or as_json:
                 track_kwargs["quiet"] = True
             result = track_cli.track_new(command_input, **track_kwargs)
     _emit_result(result, as_json, strict_notifications=strict_notifications)
 
 
+def _track_array(command, array_range, array_file, parallel, session, instance_kwargs,
+                 email, text, webhook, as_json, strict_notifications, quiet):
+    """Run an array job, print its summary, and send one digest per channel."""
+    try:
+        if array_range is not None:
+            values = arrays.parse_range(array_range)
+        else:
+            values = arrays.load_inputs(array_file)
+    except exceptions.JortException as error:
+        raise click.BadParameter(str(error), param_hint="--array") from error
+
+    def report(payload):
+        if not as_json and not quiet:
+            click.echo(f"{payload['status']:>10}  [{payload['metadata']['array_value']}]  "
+                       f"{datetime_utils.format_timespan(payload['runtime'] or 0.0)}")
+
+    try:
+        result = arrays.run_array(command, values, parallel=parallel, session_name=session,
+                                  on_result=report, **instance_kwargs)
+    except exceptions.JortException as error:
+        raise click.ClickException(str(error)) from error
+    payloads = result.pop("payloads")
+    callbacks = track_cli._notification_callbacks(send_text=text, send_email=email,
+                                                  include_print=False, send_webhook=webhook)
+    notifications = dispatch.deliver_digest(callbacks, payloads)
+    if notifications:
+        result["notifications"] = notifications
+    if as_json:
+        click.echo(json.dumps(result, default=str))
+    else:
+        counts = ", ".join(f"{count} {status}" for status, count in result["counts"].items())
+        click.echo(f"Array {result['array_id']}: {result['instances']} instances ({counts}) "
+                   f"in {datetime_utils.format_timespan(result['wall_seconds'])}")
+        if result["runtime"] is not None:
+            click.echo("Runtime: " + ", ".join(
+                f"{label} {datetime_utils.format_timespan(result['runtime'][label])}"
+                for label in ("min", "median", "p90", "max")
+            ))
+        for failure in result["failures"][:10]:
+            click.echo(f"Failed [{failure['value']}]: {failure['status']} "
+                       f"(exit code {failure['exit_code']}) {failure['error_message'] or ''}".rstrip())
+        if len(result["failures"]) > 10:
+            click.echo(f"... and {len(result['failures']) - 10} more failures")
+    if result["status"] != "success":
+        raise click.exceptions.Exit(1)
+    if strict_notifications and any(outcome["status"] in ("failed", "timeout")
+                                    for outcome in notifications.values()):
+        raise click.exceptions.Exit(2)
+
+
+def _notify_summary(payload, email, text, include_print=True):
+    """Send one summary notification, returning per-channel results."""
+    notifications = dispatch.deliver_all(track_cli._notification_callbacks(
+        send_email=email,
+        send_text=text,
+        include_print=include_print,
+    ), payload)
+    notifications.pop("print", None)
+    return notifications
+
+
 @click.command()
 @click.argument("job", nargs=-1, metavar="<job>")
-@click.option("-r", "--repeat", type=click.IntRange(min=1), default=3, show_default=True)
-@click.option("--warmup", type=click.IntRange(min=0), default=1, show_default=True)
+@click.option("-r", "--repeat", type=click.IntRange(min=1), default=3, show_default=True,
+              help="minimum number of measured runs")
+@click.option("--warmup", type=click.IntRange(min=0), default=1, show_default=True,
+              help="minimum number of unmeasured warmup runs")
+@click.option("--max-warmup", type=click.IntRange(min=0),
+              help="keep warming up until runtimes stop improving, up to this many runs")
+@click.option("--target-ci", type=click.FloatRange(min=0, min_open=True), metavar="<percent>",
+              help="repeat until the 95% confidence interval is within this percent of the mean")
+@click.option("--max-repeat", type=click.IntRange(min=1),
+              help="maximum number of measured runs with --target-ci  [default: 100]")
+@click.option("-p", "--param", "params", multiple=True, metavar="<name=v1,v2,...>",
+              help="sweep {name} in the command over these values (repeatable)")
+@click.option("-c", "--command", "commands", multiple=True, metavar="<command>",
+              help="interleave runs of this command with the others (repeatable)")
+@click.option("--seed", type=int, help="seed for the interleaved run order")
 @click.option("--session", default="benchmark", show_default=True)
 @click.option("--baseline-session", help="compare against successful runs in this session")
+@click.option("--cpus", metavar="<list>", help="pin each run to these CPUs, e.g. 0-3,6")
+@click.option("--nice", type=click.IntRange(-20, 19), help="run at this niceness")
+@click.option("--ionice", metavar="<class[:level]>",
+              help="run at this I/O priority: realtime, best-effort, or idle")
+@click.option("--prepare", metavar="<command>", help="shell command to run before each run")
+@click.option("--cleanup", metavar="<command>", help="shell command to run after each run")
 @click.option("--shell", is_flag=True)
 @click.option("--cwd", type=click.Path(file_okay=False))
 @click.option("-e", "--email", is_flag=True)
 @click.option("-t", "--text", is_flag=True)
 @click.option("--json", "as_json", is_flag=True)
-def benchmark(job, repeat, warmup, session, baseline_session, shell, cwd, email, text, as_json):
-    """Run a command repeatedly and summarize timing statistics."""
+def benchmark(job, repeat, warmup, max_warmup, target_ci, max_repeat, params, commands, seed,
+              session, baseline_session, cpus, nice, ionice, prepare, cleanup, shell, cwd, email, text,
+              as_json):
+    """Run a command repeatedly and summarize timing statistics.
+
+    With --param, every combination of parameter values is benchmarked as its
+    own command, e.g. --param threads=1,2,4 'mytool -j {threads}'.
+
+    With two or more --command options, the commands run in interleaved rounds
+    of random order, and each is compared against the first, e.g.
+    -c './old-build' -c './new-build'.
+
+    For steadier numbers, --cpus, --nice and --ionice control scheduling of
+    each run, and --prepare/--cleanup reset state around it, e.g.
+    --prepare 'rm -rf .cache' for cold starts.
+    """
+    if commands:
+        if job or params or baseline_session:
+            raise click.UsageError(
+                "--command cannot be combined with a positional command, --param, "
+                "or --baseline-session"
+            )
+        if len(commands) == 1:
+            job = commands
+            commands = ()
     command = " ".join(job)
-    if not command:
+    if not command and not commands:
         raise click.UsageError("a command is required")
-    baseline = []
-    if baseline_session is not None:
-        fingerprint = track_cli._command_metadata(command, shell, cwd=cwd)["command_hash"]
-        baseline = database.runtimes(session=baseline_session, command_hash=fingerprint)
-    for _ in range(warmup):
-        track_cli.track_new(command, use_shell=shell, cwd=cwd, quiet=True)
-    results = [
-        track_cli.track_new(
-            command,
-            use_shell=shell,
-            cwd=cwd,
-            to_db=True,
-            session_name=session,
-            quiet=True,
+    try:
+        environment = {
+            "cpus": harness.parse_cpus(cpus) if cpus else None,
+            "nice": nice,
+            "ionice": harness.parse_ionice(ionice) if ionice else None,
+            "prepare": prepare,
+            "cleanup": cleanup,
+        }
+        if commands:
+            interleaved = harness.run_interleaved(
+                list(commands), repeat=repeat, warmup=warmup, max_warmup=max_warmup,
+                target_ci=target_ci, max_repeat=max_repeat, shell=shell, cwd=cwd,
+                session_name=session, seed=seed, **environment,
+            )
+        cells = [] if commands else harness.expand_params(
+            command, [harness.parse_param(text) for text in params]
         )
-        for _ in range(repeat)
-    ]
-    runtimes = [result["runtime"] for result in results]
-    summary = {
-        "command": command,
-        "session": session,
-        "repeat": repeat,
-        "warmup": warmup,
-        "status": "success" if all(result["status"] == "success" for result in results) else "error",
-        "mean_seconds": statistics.mean(runtimes),
-        "median_seconds": statistics.median(runtimes),
-        "p95_seconds": sorted(runtimes)[min(len(runtimes) - 1, max(0, int(len(runtimes) * 0.95)))],
-        "stdev_seconds": statistics.stdev(runtimes) if len(runtimes) > 1 else 0.0,
-        "job_ids": [result["job_id"] for result in results],
-        "finished": datetime_utils.get_iso_date(),
-    }
-    if baseline:
-        baseline_median = statistics.median(baseline)
-        summary["baseline_session"] = baseline_session
-        summary["baseline_median_seconds"] = baseline_median
-        summary["delta_percent"] = ((summary["median_seconds"] - baseline_median) / baseline_median * 100
-                                     if baseline_median else None)
+        summaries = []
+        for values, cell_command in cells:
+            baseline = []
+            if baseline_session is not None:
+                fingerprint = track_cli._command_metadata(cell_command, shell,
+                                                          cwd=cwd)["command_hash"]
+                baseline = analytics.summarize(session=baseline_session,
+                                               command_hash=fingerprint)
+            summary = harness.run_benchmark(
+                cell_command, repeat=repeat, warmup=warmup, max_warmup=max_warmup,
+                target_ci=target_ci, max_repeat=max_repeat, shell=shell, cwd=cwd,
+                session_name=session,
+                metadata={"params": values, "template": command} if params else None,
+                **environment,
+            )
+            if params:
+                summary = {"params": values, **summary}
+            if not as_json:
+                _warn_outliers(summary)
+            if baseline:
+                baseline_median = baseline[0]["p50"]
+                summary["baseline_session"] = baseline_session
+                summary["baseline_median_seconds"] = baseline_median
+                summary["delta_percent"] = (
+                    (summary["median_seconds"] - baseline_median) / baseline_median * 100
+                    if baseline_median else None
+                )
+            summaries.append(summary)
+    except (exceptions.JortException, OSError) as error:
+        raise click.ClickException(str(error)) from error
+
+    if commands:
+        if not as_json:
+            for summary in interleaved["commands"]:
+                _warn_outliers(summary)
+        _finish_benchmark(interleaved, " vs ".join(commands), interleaved["commands"],
+                          email, text, as_json)
+        return
+    status = "success" if all(summary["status"] == "success" for summary in summaries) else "error"
+    if params:
+        result = {
+            "command": command,
+            "session": session,
+            "params": dict(harness.parse_param(text) for text in params),
+            "status": status,
+            "cells": summaries,
+            "finished": datetime_utils.get_iso_date(),
+        }
+    else:
+        result = summaries[0]
+    _finish_benchmark(result, command, summaries, email, text, as_json)
+
+
+def _warn_outliers(summary):
+    if summary["outliers"]:
+        click.echo(f"Warning: {len(summary['outliers'])} of {summary['repeat']} runs "
+                   f"of `{summary['command']}` are outliers; results may be "
+                   "disturbed by other load", err=True)
+
+
+def _finish_benchmark(result, command, summaries, email, text, as_json):
+    """Notify about and print a benchmark result, exiting 1 on failure."""
+    status = result["status"]
     notification_payload = {
         "name": f"benchmark: {command}",
-        "status": summary["status"],
-        "runtime": summary["mean_seconds"],
-        "date_modified": summary["finished"],
+        "status": status,
+        "runtime": sum(summary.get("mean_seconds", 0.0) for summary in summaries),
+        "date_modified": result["finished"],
         "machine": config.socket.gethostname(),
         "stdout_fn": None,
-        "error_message": None if summary["status"] == "success" else "one or more repetitions failed",
+        "error_message": None if status == "success" else "one or more repetitions failed",
     }
-    notifications = {}
-    for callback in track_cli._notification_callbacks(
-        send_email=email,
-        send_text=text,
-        include_print=not as_json,
-    ):
-        channel = getattr(callback, "channel", callback.__class__.__name__.lower())
-        if channel == "print":
-            callback.execute(notification_payload)
+    notifications = _notify_summary(notification_payload, email, text, include_print=not as_json)
+    if notifications:
+        result["notifications"] = notifications
+    if as_json:
+        click.echo(json.dumps(result, default=str))
+    elif "cells" in result:
+        _print_sweep(result)
+    elif "comparisons" in result:
+        _print_interleaved(result)
+    else:
+        click.echo(json.dumps(result, indent=2, default=str))
+    if status != "success":
+        raise click.exceptions.Exit(1)
+
+
+def _print_interleaved(result):
+    width = max(len(summary["command"]) for summary in result["commands"])
+    click.echo(f"{'command':<{width}}  {'mean (s)':>10}  {'95% ci':>7}  {'median (s)':>10}  "
+               f"{'runs':>5}  status")
+    for summary in result["commands"]:
+        interval = summary.get("ci_half_width_percent")
+        interval = f"±{interval:.1f}%" if interval is not None else "-"
+        click.echo(
+            f"{summary['command']:<{width}}  {summary.get('mean_seconds', 0.0):>10.6f}  "
+            f"{interval:>7}  {summary.get('median_seconds', 0.0):>10.6f}  "
+            f"{summary['repeat']:>5}  {summary['status']}"
+        )
+    for comparison in result["comparisons"]:
+        if comparison["speedup"] is None:
             continue
-        try:
-            notifications[channel] = {"status": "sent", "result": callback.execute(notification_payload)}
-        except Exception as error:
-            notifications[channel] = {"status": "failed", "error": str(error)}
+        interval = ("" if comparison["ci_low"] is None else
+                    f" [{comparison['ci_low']:.3f}, {comparison['ci_high']:.3f}]")
+        click.echo(f"`{comparison['command']}` is {comparison['speedup']:.3f}x{interval} as fast "
+                   f"as `{comparison['baseline']}` (p = {comparison['p_value']:.3g})")
+
+
+def _print_sweep(result):
+    names = list(result["params"])
+    widths = {name: max(len(name), *(len(cell["params"][name]) for cell in result["cells"]))
+              for name in names}
+    header = "  ".join(f"{name:<{widths[name]}}" for name in names)
+    click.echo(f"{header}  {'mean (s)':>10}  {'95% ci':>7}  {'median (s)':>10}  "
+               f"{'stdev (s)':>10}  {'runs':>5}  status")
+    for cell in result["cells"]:
+        values = "  ".join(f"{cell['params'][name]:<{widths[name]}}" for name in names)
+        interval = cell.get("ci_half_width_percent")
+        interval = f"±{interval:.1f}%" if interval is not None else "-"
+        click.echo(
+            f"{values}  {cell.get('mean_seconds', 0.0):>10.6f}  {interval:>7}  "
+            f"{cell.get('median_seconds', 0.0):>10.6f}  {cell.get('stdev_seconds', 0.0):>10.6f}  "
+            f"{cell['repeat']:>5}  {cell['status']}"
+        )
+
+
+@click.command(name="run")
+@click.argument("pipeline_file", type=click.Path(dir_okay=False, exists=True))
+@click.option("-j", "--jobs", "max_workers", type=click.IntRange(min=1), default=4,
+              show_default=True, help="maximum number of commands running at once")
+@click.option("-s", "--session", help="session name (defaults to the pipeline's)")
+@click.option("--force", is_flag=True, help="rerun jobs that already succeeded")
+@click.option("-e", "--email", is_flag=True, help="send email when the pipeline exits")
+@click.option("-t", "--text", is_flag=True, help="send SMS text when the pipeline exits")
+@click.option("--json", "as_json", is_flag=True, help="print a machine-readable result")
+def run(pipeline_file, max_workers, session, force, email, text, as_json):
+    """Run a dependency graph of commands from a JSON pipeline file."""
+    try:
+        spec = pipeline.load_pipeline(pipeline_file)
+    except exceptions.JortException as error:
+        raise click.ClickException(str(error)) from error
+
+    def report(name, result):
+        if not as_json:
+            click.echo(f"{result['status']:>10}  {name}  "
+                       f"{datetime_utils.format_timespan(result['runtime'] or 0.0)}")
+
+    summary = pipeline.run_pipeline(
+        spec["nodes"],
+        session_name=session or spec["session"],
+        max_workers=max_workers,
+        unique=not force,
+        pipeline_name=os.path.basename(pipeline_file),
+        on_result=report,
+    )
+    notification_payload = {
+        "name": f"pipeline: {summary['pipeline']}",
+        "status": summary["status"],
+        "runtime": summary["wall_seconds"],
+        "date_modified": summary["date_modified"],
+        "machine": config.socket.gethostname(),
+        "stdout_fn": None,
+        "error_message": (f"failed or blocked: {', '.join(summary['failed'])}"
+                          if summary["failed"] else None),
+    }
+    notifications = _notify_summary(notification_payload, email, text, include_print=False)
     if notifications:
         summary["notifications"] = notifications
     if as_json:
         click.echo(json.dumps(summary, default=str))
     else:
-        click.echo(json.dumps(summary, indent=2, default=str))
+        click.echo(f"Wall time: {datetime_utils.format_timespan(summary['wall_seconds'])}")
+        click.echo(
+            f"Critical path: {' -> '.join(summary['critical_path'])} "
+            f"({datetime_utils.format_timespan(summary['critical_path_seconds'])})"
+        )
     if summary["status"] != "success":
         raise click.exceptions.Exit(1)
 
@@ -256,7 +583,8 @@ def doctor(as_json):
     except Exception as error:
         checks["storage"] = f"error: {error}"
     for name, callback_type in (("email", reporting_callbacks.EmailNotification),
-                                ("text", reporting_callbacks.TextNotification)):
+                                ("text", reporting_callbacks.TextNotification),
+                                ("webhook", reporting_callbacks.WebhookNotification)):
         try:
             callback_type(validate=True)
             checks[name] = "configured"
@@ -308,20 +636,20 @@ def notify():
 
 
 def _callback_for_channel(channel, validate=True):
-    if channel == "email":
-        return reporting_callbacks.EmailNotification(validate=validate)
-    if channel == "text":
-        return reporting_callbacks.TextNotification(validate=validate)
-    raise click.ClickException(f"Unknown notification channel: {channel}")
+    try:
+        return dispatch.callback_for_channel(channel, validate=validate)
+    except exceptions.JortException as error:
+        raise click.ClickException(str(error)) from error
 
 
 @notify.command("test")
 @click.option("-e", "--email", is_flag=True)
 @click.option("-t", "--text", is_flag=True)
-def notify_test(email, text):
+@click.option("-w", "--webhook", is_flag=True)
+def notify_test(email, text, webhook):
     """Send a real test notification for configured channels."""
-    if not email and not text:
-        raise click.UsageError("choose --email, --text, or both")
+    if not email and not text and not webhook:
+        raise click.UsageError("choose any of --email, --text, and --webhook")
     payload = {
         "name": "jort notification test",
         "status": "success",
@@ -331,7 +659,7 @@ def notify_test(email, text):
         "stdout_fn": None,
         "error_message": None,
     }
-    for channel, enabled in (("email", email), ("text", text)):
+    for channel, enabled in (("email", email), ("text", text), ("webhook", webhook)):
         if enabled:
             callback = _callback_for_channel(channel)
             callback.execute(payload)
@@ -342,26 +670,22 @@ def notify_test(email, text):
 @click.argument("job_id")
 @click.option("-e", "--email", is_flag=True)
 @click.option("-t", "--text", is_flag=True)
-def notify_retry(job_id, email, text):
+@click.option("-w", "--webhook", is_flag=True)
+def notify_retry(job_id, email, text, webhook):
     """Retry failed or pending notifications for a completed job."""
     payload = database.get_job(job_id)
     if payload is None:
         raise click.ClickException(f"No job found with id `{job_id}`")
-    channels = [channel for channel, enabled in (("email", email), ("text", text)) if enabled]
+    channels = [channel for channel, enabled in (("email", email), ("text", text),
+                                                 ("webhook", webhook)) if enabled]
     if not channels:
         channels = payload.get("notification_channels", [])
-    for channel in channels:
-        callback = _callback_for_channel(channel, validate=False)
-        try:
-            result = callback.execute(payload)
-            database.update_notification(job_id, channel, "sent")
-            payload.setdefault("notifications", {})[channel] = {"status": "sent", "result": result}
+    callbacks = [_callback_for_channel(channel, validate=False) for channel in channels]
+    for channel, outcome in dispatch.deliver_all(callbacks, payload, persist=True).items():
+        if outcome["status"] == "sent":
             click.echo(f"{channel}: sent")
-        except Exception as error:
-            database.update_notification(job_id, channel, "failed", str(error))
-            payload.setdefault("notifications", {})[channel] = {"status": "failed", "error": str(error)}
-            click.echo(f"{channel}: failed: {error}", err=True)
-    database.save_job(payload)
+        else:
+            click.echo(f"{channel}: failed: {outcome['error']}", err=True)
 
 
 @notify.command("pending")
@@ -375,15 +699,63 @@ def notify_pending(as_json):
         click.echo(json.dumps(pending, indent=2, default=str))
 
 
+@notify.command("drain")
+@click.option("--watch", is_flag=True, help="keep polling for due deliveries until interrupted")
+@click.option("--interval", type=click.FloatRange(min=0.1), default=10.0, show_default=True,
+              help="seconds between polls with --watch")
+@click.option("--max-attempts", type=click.IntRange(min=1), default=outbox.MAX_ATTEMPTS,
+              show_default=True, help="attempts before a delivery is dead-lettered")
+@click.option("--concurrency", "concurrency_specs", metavar="CHANNEL=N", multiple=True,
+              help="deliveries in flight at once for a channel, e.g. email=1")
+@click.option("--json", "as_json", is_flag=True)
+def notify_drain(watch, interval, max_attempts, concurrency_specs, as_json):
+    """Deliver pending and failed notifications, retrying with backoff."""
+    concurrency = {}
+    for spec in concurrency_specs:
+        channel, _, limit = spec.partition("=")
+        if not channel or not limit.isdigit() or int(limit) < 1:
+            raise click.BadParameter(f"expected CHANNEL=N, got `{spec}`",
+                                     param_hint="--concurrency")
+        concurrency[channel.strip()] = int(limit)
+
+    def progress(row, status):
+        if not as_json and status is not None:
+            click.echo(f"{row['job_id']} {row['channel']}: {status}")
+
+    stop = threading.Event()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(outbox.drain, watch=watch, interval=interval,
+                                 max_attempts=max_attempts, concurrency=concurrency,
+                                 stop=stop, progress=progress)
+        try:
+            drained = future.result()
+        except KeyboardInterrupt:
+            # Finish the deliveries already claimed so none wait out their lease.
+            stop.set()
+            drained = future.result()
+    if as_json:
+        click.echo(json.dumps(drained))
+    else:
+        click.echo(", ".join(f"{count} {status}" for status, count in drained.items()))
+
+
 cli.add_command(config.init)
 cli.add_command(config.config_group)
 cli.add_command(track)
 cli.add_command(benchmark)
+cli.add_command(run)
 cli.add_command(doctor)
 cli.add_command(notify)
 cli.add_command(database.inspect)
 cli.add_command(database.status)
 cli.add_command(database.logs)
+cli.add_command(analytics.stats)
+cli.add_command(analytics.compare)
+cli.add_command(history.history)
+cli.add_command(history.bisect_command)
+cli.add_command(export.export)
+cli.add_command(retention.gc)
+cli.add_command(liveness.reap)
 cli.add_command(cancel)
 
 
@@ -0,0 +1,213 @@
+"""Heartbeats for running jobs, and reaping jobs whose monitor has died."""
+
+import contextlib
+import functools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import click
+import psutil
+
+from . import database
+from . import datetime_utils
+
+
+HEARTBEAT_SECONDS = 30
+# A job is stale once this many heartbeats in a row are missing.
+STALE_INTERVALS = 3
+ACTIVE_STATUSES = ("running", "queued")
+# Process creation times are derived from boot time and clock ticks.
+CREATE_TIME_TOLERANCE = 1.0
+
+
+@functools.lru_cache(maxsize=None)
+def _monitor_identity(pid):
+    return pid, psutil.Process(pid).create_time()
+
+
+def monitor_identity():
+    """Return the process ID and creation time of the current process."""
+    return _monitor_identity(os.getpid())
+
+
+class Heartbeat(object):
+    """
+    Persist a running job's progress at most once per ``interval``.
+
+    Each heartbeat saves the job as ``running`` with its current runtime, the
+    latest resource sample, and the time of its latest output line, stamped
+    with the monitoring process's identity, so ``jort inspect`` shows live
+    progress and ``jort reap`` can tell a job whose monitor was killed from a
+    job that is still running.
+
+    The first heartbeat is due one ``interval`` after the job starts, so
+    jobs shorter than that are saved once, when they finish, as before.
+
+    Parameters
+    ----------
+    payload : dict
+        Open block payload of the running job
+    interval : float, optional
+        Seconds between heartbeats
+    """
+    def __init__(self, payload, interval=HEARTBEAT_SECONDS):
+        self.payload = payload
+        self.interval = interval
+        self.last_output = None
+        self._last_beat = time.monotonic()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def output(self):
+        """Note that the job printed a line; persisted with the next heartbeat."""
+        self.last_output = time.time()
+
+    def beat(self, metrics=None, force=False):
+        """
+        Save a heartbeat if one is due, returning whether one was saved.
+
+        Failures to write, such as a locked database, are skipped; the next
+        heartbeat tries again.
+        """
+        now = time.monotonic()
+        # Held while writing, so close() waits for a heartbeat in flight.
+        with self._lock:
+            if self._closed or (not force and now - self._last_beat < self.interval):
+                return False
+            self._last_beat = now
+            snapshot = dict(self.payload, status="running")
+            datetime_utils._update_payload_times(snapshot)
+            snapshot.pop("_monotonic_start", None)
+            if metrics is not None:
+                snapshot["metrics"] = metrics
+            try:
+                database.record_heartbeat(snapshot, self.interval, monitor_identity(),
+                                          last_output=self.last_output)
+            except sqlite3.OperationalError:
+                return False
+            return True
+
+    def close(self):
+        """Stop heartbeats, so none can overwrite the job's final save."""
+        with self._lock:
+            self._closed = True
+
+
+def _is_alive(pid, create_time):
+    if not pid:
+        return False
+    try:
+        process = psutil.Process(int(pid))
+        if create_time is not None and abs(process.create_time() - create_time) > CREATE_TIME_TOLERANCE:
+            # The process ID was reused.
+            return False
+        return process.status() not in (psutil.STATUS_ZOMBIE, psutil.STATUS_DEAD)
+    except psutil.NoSuchProcess:
+        return False
+    except psutil.AccessDenied:
+        return True
+
+
+def stale_jobs(intervals=STALE_INTERVALS, now=None):
+    """
+    Return running and queued jobs on this machine whose monitor has died.
+
+    A job is stale when its latest heartbeat, or its creation for a job that
+    never sent one, is more than ``intervals`` heartbeat intervals old and
+    the process that sent it is gone or its process ID has been reused. Only
+    those candidates are looked up in the process table.
+
+    Returns
+    -------
+    jobs : list of dict
+        Stale jobs' ``job_id``, ``status``, ``pid``, and ``heartbeat_at``
+        (epoch microseconds), oldest first
+    """
+    database.ensure_database()
+    now_us = int((time.time() if now is None else now) * 10**6)
+    machine = socket.gethostname()
+    with contextlib.closing(database._connect()) as connection:
+        rows = connection.execute(
+            "SELECT job_id, status, machine, pid, date_created, heartbeat_at, "
+            "heartbeat_interval, monitor_pid, monitor_create_time, metadata_json FROM jobs "
+            f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)}) "
+            "AND COALESCE(heartbeat_at, date_created) < "
+            "? - ? * COALESCE(heartbeat_interval, ?) * 1000000 "
+            "ORDER BY date_created",
+            (*ACTIVE_STATUSES, now_us, intervals, HEARTBEAT_SECONDS),
+        ).fetchall()
+    stale = []
+    for row in rows:
+        if row["machine"] not in (None, machine):
+            # Processes on other machines cannot be checked from here.
+            continue
+        if row["monitor_pid"] is not None:
+            alive = _is_alive(row["monitor_pid"], row["monitor_create_time"])
+        else:
+            # Queued by `jort track --detach`, before its worker's first heartbeat.
+            metadata = json.loads(row["metadata_json"] or "{}")
+            alive = _is_alive(metadata.get("worker_pid") or row["pid"], None)
+        if not alive:
+            stale.append({"job_id": row["job_id"], "status": row["status"], "pid": row["pid"],
+                          "heartbeat_at": row["heartbeat_at"]})
+    return stale
+
+
+def reap_jobs(intervals=STALE_INTERVALS, dry_run=False):
+    """
+    Mark stale running and queued jobs as ``dead``; see :func:`stale_jobs`.
+
+    A job's runtime is kept as of its last heartbeat. A job that sends a
+    heartbeat or finishes while being reaped is left alone.
+
+    Returns
+    -------
+    jobs : list of dict
+        Jobs marked dead, or that would be with ``dry_run``
+    """
+    stale = stale_jobs(intervals=intervals)
+    if dry_run or not stale:
+        return stale
+    reaped = []
+    with contextlib.closing(database._connect()) as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        for job in stale:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'dead', "
+                "date_finished = COALESCE(heartbeat_at, date_finished), "
+                "error_message = ? "
+                f"WHERE job_id = ? AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)}) "
+                "AND heartbeat_at IS ?",
+                ("monitor stopped without recording a result", job["job_id"],
+                 *ACTIVE_STATUSES, job["heartbeat_at"]),
+            )
+            if cursor.rowcount:
+                reaped.append(job)
+        connection.commit()
+    return reaped
+
+
+@click.command(options_metavar="[<options>]")
+@click.option("--intervals", type=click.FloatRange(min=1), default=STALE_INTERVALS,
+              show_default=True, metavar="<n>",
+              help="missed heartbeat intervals before a job is considered dead")
+@click.option("-n", "--dry-run", is_flag=True, help="only report stale jobs")
+@click.option("--json", "as_json", is_flag=True, help="print machine-readable JSON")
+def reap(intervals, dry_run, as_json):
+    """Mark running jobs whose monitor has died as dead."""
+    jobs = reap_jobs(intervals=intervals, dry_run=dry_run)
+    for job in jobs:
+        job["heartbeat_at"] = datetime_utils.epoch_us_to_iso(job["heartbeat_at"])
+    if as_json:
+        click.echo(json.dumps({"dry_run": dry_run, "jobs": jobs}))
+        return
+    verb = "Would mark" if dry_run else "Marked"
+    for job in jobs:
+        last_seen = job["heartbeat_at"] or "never"
+        click.echo(f"{verb} {job['job_id']} dead (was {job['status']}, last heartbeat {last_seen})")
+    if not jobs:
+        click.echo("No stale jobs found")
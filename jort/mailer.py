@@ -0,0 +1,193 @@
+"""Pooled, authenticated SMTP connections shared by email notifications."""
+
+import atexit
+import contextlib
+import functools
+import smtplib
+import ssl
+import threading
+import time
+
+
+MAX_CONNECTIONS = 2
+# Reused connections idle longer than this are checked with NOOP first.
+CHECK_AFTER_SECONDS = 5.0
+# Connections idle longer than this are closed instead; servers commonly drop
+# clients after a few minutes of inactivity.
+IDLE_TIMEOUT_SECONDS = 60.0
+# Messages sent before a connection is replaced, below common provider limits.
+MAX_MESSAGES_PER_CONNECTION = 100
+CONNECT_TIMEOUT_SECONDS = 30
+
+# Errors after which a reused connection is assumed to have gone stale.
+STALE_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _default_context():
+    # Loading the system trust store dominates connection setup; do it once.
+    return ssl.create_default_context()
+
+
+class _Connection(object):
+    def __init__(self, server):
+        self.server = server
+        self.last_used = time.monotonic()
+        self.sent = 0
+        self.reused = False
+
+
+class SMTPPool(object):
+    """
+    Reuse logged-in SMTP over SSL connections across messages.
+
+    Up to ``max_connections`` connections are opened on demand and handed to
+    one sender at a time, so a burst of notifications costs one login per
+    connection instead of one per message. Idle connections are checked with
+    ``NOOP`` before reuse and closed after ``idle_timeout``; a send that finds
+    its reused connection dropped by the server is retried once on a new one.
+
+    Parameters
+    ----------
+    host : str
+        SMTP server
+    port : int
+        SMTP over SSL port
+    username : str
+        Login user
+    password : str
+        Login password
+    max_connections : int, optional
+        Connections open at once; further senders wait for a free one
+    context : ssl.SSLContext, optional
+        TLS settings; defaults to a shared default context
+    """
+    def __init__(self, host, port, username, password, max_connections=MAX_CONNECTIONS,
+                 context=None, idle_timeout=IDLE_TIMEOUT_SECONDS,
+                 check_after=CHECK_AFTER_SECONDS, max_messages=MAX_MESSAGES_PER_CONNECTION,
+                 timeout=CONNECT_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_connections = max_connections
+        self.context = context
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._available = threading.Condition()
+
+    def _connect(self):
+        server = smtplib.SMTP_SSL(self.host, port=self.port,
+                                  context=self.context or _default_context(),
+                                  timeout=self.timeout)
+        try:
+            server.login(self.username, self.password)
+        except BaseException:
+            _close(server)
+            raise
+        return _Connection(server)
+
+    def _healthy(self, connection):
+        idle = time.monotonic() - connection.last_used
+        if idle > self.idle_timeout or connection.sent >= self.max_messages:
+            return False
+        if idle > self.check_after:
+            try:
+                return connection.server.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                return False
+        return True
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Check out a logged-in connection, returning it to the pool afterwards."""
+        with self._available:
+            self._available.wait_for(lambda: self._idle or self._open < self.max_connections)
+            if self._idle:
+                # The most recently used connection is the least likely to be stale.
+                connection = self._idle.pop()
+            else:
+                connection = None
+                self._open += 1
+        try:
+            if connection is not None and not self._healthy(connection):
+                _close(connection.server)
+                connection = None
+            if connection is None:
+                connection = self._connect()
+            else:
+                connection.reused = True
+            yield connection
+        except BaseException:
+            if connection is not None:
+                _close(connection.server)
+                connection = None
+            raise
+        finally:
+            with self._available:
+                if connection is None:
+                    self._open -= 1
+                else:
+                    connection.last_used = time.monotonic()
+                    self._idle.append(connection)
+                self._available.notify()
+
+    def sendmail(self, from_addr, to_addrs, message):
+        """Send one message, see :meth:`smtplib.SMTP.sendmail`."""
+        reused = False
+        try:
+            with self.connection() as connection:
+                reused = connection.reused
+                result = connection.server.sendmail(from_addr, to_addrs, message)
+                connection.sent += 1
+                return result
+        except STALE_ERRORS:
+            if not reused:
+                raise
+            # Other idle connections were most likely dropped at the same time.
+            self.close()
+        with self.connection() as connection:
+            result = connection.server.sendmail(from_addr, to_addrs, message)
+            connection.sent += 1
+            return result
+
+    def close(self):
+        """Log out of idle connections; connections in use are kept."""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._available.notify_all()
+        for connection in idle:
+            with contextlib.suppress(smtplib.SMTPException, OSError):
+                connection.server.quit()
+            _close(connection.server)
+
+
+def _close(server):
+    with contextlib.suppress(OSError):
+        server.close()
+
+
+def get_pool(host, port, username, password):
+    """Return the shared pool for an SMTP account, creating it on first use."""
+    key = host, int(port), username, password
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SMTPPool(host, int(port), username, password)
+        return _pools[key]
+
+
+@atexit.register
+def close_all():
+    """Log out of every pooled connection."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,328 @@
+"""Durable redelivery of notifications that were not sent when their job ended."""
+
+import concurrent.futures
+import contextlib
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+import shortuuid
+
+from . import config
+from . import database
+from . import datetime_utils
+from . import dispatch
+from . import exceptions
+
+
+MAX_ATTEMPTS = 8
+BASE_DELAY_SECONDS = 30
+MAX_DELAY_SECONDS = 3600
+LEASE_SECONDS = 600
+BATCH_SIZE = 100
+# Deliveries in flight at once per channel; other channels get the default.
+CHANNEL_CONCURRENCY = {"email": 2, "text": 4}
+DEFAULT_CONCURRENCY = 2
+CHANNELS = ("email", "text", "webhook")
+# Jobs summarized in one digest at most.
+DIGEST_MAX_JOBS = 1000
+
+
+def _connect():
+    connection = sqlite3.connect(config._get_database_path(), timeout=30)
+    connection.isolation_level = None
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def _now_us():
+    return int(time.time() * 10**6)
+
+
+def backoff_seconds(attempts, generator=random):
+    """
+    Delay before retrying a delivery that has failed ``attempts`` times.
+
+    The delay doubles per attempt from ``BASE_DELAY_SECONDS`` up to
+    ``MAX_DELAY_SECONDS``, and a random half of it is jitter, so deliveries
+    that failed together during an outage do not all retry at once.
+    """
+    delay = min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * 2 ** max(0, attempts - 1))
+    return delay / 2 + generator.uniform(0, delay / 2)
+
+
+def claim(worker_id, limit=BATCH_SIZE, lease=LEASE_SECONDS):
+    """
+    Claim due deliveries for one worker.
+
+    Rows are selected and leased in one immediate transaction, so concurrent
+    drainers, in this or other processes, never claim the same row. A lease
+    that expires, e.g. because its worker died, makes the row claimable again.
+    Once a row of a channel with a digest window is due, every other pending
+    row of that channel is claimed with it, to be sent in the same digest.
+
+    Returns
+    -------
+    rows : list
+        Claimed rows with ``notification_id``, ``job_id``, ``channel``, and
+        ``attempts``
+    """
+    database.ensure_database()
+    now = _now_us()
+    with contextlib.closing(_connect()) as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                "SELECT notification_id, job_id, channel, attempts FROM notifications "
+                "WHERE status IN ('pending', 'failed') "
+                "AND (next_attempt_at IS NULL OR next_attempt_at <= ?) "
+                "AND (claimed_until IS NULL OR claimed_until < ?) "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            claimed = {row["notification_id"] for row in rows}
+            for channel in sorted({row["channel"] for row in rows}):
+                if not config.digest_seconds(channel):
+                    continue
+                rows += [row for row in connection.execute(
+                    "SELECT notification_id, job_id, channel, attempts FROM notifications "
+                    "WHERE channel = ? AND status = 'pending' "
+                    "AND (claimed_until IS NULL OR claimed_until < ?) "
+                    "ORDER BY next_attempt_at LIMIT ?",
+                    (channel, now, DIGEST_MAX_JOBS),
+                ).fetchall() if row["notification_id"] not in claimed]
+            connection.executemany(
+                "UPDATE notifications SET claimed_by = ?, claimed_until = ? "
+                "WHERE notification_id = ?",
+                [(worker_id, now + lease * 10**6, row["notification_id"]) for row in rows],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    return [dict(row) for row in rows]
+
+
+def renew(rows, worker_id, lease=LEASE_SECONDS):
+    """
+    Extend the claim on rows about to be delivered.
+
+    Rows whose lease expired and were claimed by another worker in the
+    meantime are left to that worker, so no delivery is sent twice.
+
+    Returns
+    -------
+    rows : list
+        Rows still claimed by ``worker_id``
+    """
+    owned = []
+    claimed_until = _now_us() + int(lease * 10**6)
+    with contextlib.closing(_connect()) as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                if connection.execute(
+                    "UPDATE notifications SET claimed_until = ? "
+                    "WHERE notification_id = ? AND claimed_by = ?",
+                    (claimed_until, row["notification_id"], worker_id),
+                ).rowcount:
+                    owned.append(row)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    return owned
+
+
+def complete(row, worker_id, outcome, max_attempts=MAX_ATTEMPTS, retry_at=None):
+    """
+    Record the outcome of a claimed delivery and release the claim.
+
+    A failed delivery is rescheduled with :func:`backoff_seconds`, or at
+    ``retry_at`` (epoch µs) if given, or marked ``dead`` once it has been
+    attempted ``max_attempts`` times. Nothing is recorded if the claim was
+    lost to another worker.
+
+    Returns
+    -------
+    status : str or None
+        ``sent``, ``failed``, or ``dead``; ``None`` if the claim was lost
+    """
+    attempts = row["attempts"] + 1
+    next_attempt_at = None
+    if outcome["status"] == "sent":
+        status = "sent"
+    elif attempts >= max_attempts or outcome.get("permanent"):
+        status = "dead"
+    else:
+        status = "failed"
+        next_attempt_at = retry_at or _now_us() + int(backoff_seconds(attempts) * 10**6)
+    recorded = {key: value for key, value in outcome.items() if key != "permanent"}
+    recorded.update({"status": status, "attempts": attempts})
+    with contextlib.closing(_connect()) as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            updated = connection.execute(
+                "UPDATE notifications SET status = ?, attempts = ?, error_message = ?, "
+                "date_modified = ?, next_attempt_at = ?, claimed_by = NULL, "
+                "claimed_until = NULL WHERE notification_id = ? AND claimed_by = ?",
+                (status, attempts, outcome.get("error"), datetime_utils.get_iso_date(),
+                 next_attempt_at, row["notification_id"], worker_id),
+            ).rowcount
+            if updated:
+                connection.execute(
+                    "UPDATE jobs SET notifications_json = json_set("
+                    "COALESCE(notifications_json, '{}'), '$.' || json_quote(?), json(?)) "
+                    "WHERE job_id = ?",
+                    (row["channel"], database._json(recorded), row["job_id"]),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    return status if updated else None
+
+
+def _attempt(rows, callbacks):
+    """Deliver claimed rows of one channel, as a digest if there are several."""
+    outcomes = []
+    payloads = []
+    for row in rows:
+        payload = database.get_job(row["job_id"])
+        if payload is None:
+            outcomes.append((row, {"status": "failed", "error": "job no longer exists",
+                                   "permanent": True}))
+        else:
+            payloads.append((row, payload))
+    if not payloads:
+        return outcomes
+    try:
+        callback = callbacks(rows[0]["channel"])
+    except exceptions.JortException as error:
+        outcome = {"status": "failed", "error": str(error), "permanent": True}
+        return outcomes + [(row, outcome) for row, _ in payloads]
+    try:
+        if len(payloads) == 1:
+            outcome = {"status": "sent", "result": callback.execute(payload=payloads[0][1])}
+        else:
+            result = callback.execute_digest([payload for _, payload in payloads])
+            outcome = {"status": "sent", "result": result, "digest": len(payloads)}
+    except Exception as error:
+        outcome = {"status": "failed", "error": str(error)}
+    return outcomes + [(row, outcome) for row, _ in payloads]
+
+
+def drain(watch=False, interval=10.0, max_attempts=MAX_ATTEMPTS, concurrency=None,
+          batch_size=BATCH_SIZE, worker_id=None, stop=None, progress=None,
+          lease=LEASE_SECONDS):
+    """
+    Deliver pending and failed notifications until none are due.
+
+    Due rows are claimed in batches with :func:`claim` and delivered
+    concurrently, with at most ``concurrency[channel]`` deliveries per channel
+    in flight. No more rows are claimed at once than can be in flight, and
+    each claim is renewed right before its delivery, so rows waiting for a
+    free slot cannot be claimed and sent again by another drainer. Rows
+    claimed together for a channel with a digest window are sent as one
+    digest. Several drainers may run at once, in any number of processes.
+
+    Parameters
+    ----------
+    watch : bool, optional
+        Keep polling every ``interval`` seconds instead of returning once
+        nothing is due
+    interval : float, optional
+        Seconds between polls with ``watch``
+    max_attempts : int, optional
+        Attempts after which a delivery is dead-lettered
+    concurrency : dict, optional
+        Per-channel concurrency limits overriding ``CHANNEL_CONCURRENCY``
+    batch_size : int, optional
+        Most rows claimed at once, further limited by the total concurrency
+    worker_id : str, optional
+        Claim owner; defaults to one unique to this call
+    stop : threading.Event, optional
+        Set to stop watching after the current batch
+    progress : callable, optional
+        Called with each claimed row and its final status
+    lease : float, optional
+        Seconds a claim lasts before another drainer may take the row
+
+    Returns
+    -------
+    counts : dict
+        Number of deliveries ending ``sent``, ``failed`` (to be retried), and
+        ``dead``
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{shortuuid.uuid()[:8]}"
+    limits = {**CHANNEL_CONCURRENCY, **(concurrency or {})}
+    capacity = sum(limits.get(channel, DEFAULT_CONCURRENCY)
+                   for channel in set(CHANNELS) | set(limits))
+    stop = stop or threading.Event()
+    counts = {"sent": 0, "failed": 0, "dead": 0}
+    pools = {}
+    callbacks = {}
+    lock = threading.Lock()
+
+    def callback_for(channel):
+        with lock:
+            if channel not in callbacks:
+                callbacks[channel] = dispatch.callback_for_channel(channel, validate=False)
+            return callbacks[channel]
+
+    def handle(rows):
+        owned = renew(rows, worker_id, lease=lease)
+        if progress is not None:
+            for row in rows:
+                if row not in owned:
+                    progress(row, None)
+        if not owned:
+            return
+        rows = owned
+        outcomes = _attempt(rows, callback_for)
+        # Rows of a failed digest are retried together.
+        attempts = max(row["attempts"] for row in rows) + 1
+        retry_at = _now_us() + int(backoff_seconds(attempts) * 10**6)
+        for row, outcome in outcomes:
+            status = complete(row, worker_id, outcome, max_attempts=max_attempts,
+                              retry_at=retry_at)
+            if status is not None:
+                with lock:
+                    counts[status] += 1
+            if progress is not None:
+                progress(row, status)
+
+    try:
+        while not stop.is_set():
+            rows = claim(worker_id, limit=min(batch_size, capacity), lease=lease)
+            if not rows:
+                if not watch:
+                    break
+                stop.wait(interval)
+                continue
+            deliveries = []
+            digests = {}
+            for row in rows:
+                if config.digest_seconds(row["channel"]):
+                    digests.setdefault(row["channel"], []).append(row)
+                else:
+                    deliveries.append([row])
+            deliveries.extend(digests.values())
+            futures = []
+            for delivery in deliveries:
+                channel = delivery[0]["channel"]
+                if channel not in pools:
+                    pools[channel] = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=limits.get(channel, DEFAULT_CONCURRENCY),
+                        thread_name_prefix=f"jort-drain-{channel}",
+                    )
+                futures.append(pools[channel].submit(handle, delivery))
+            for future in futures:
+                future.result()
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+    return counts
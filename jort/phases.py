@@ -0,0 +1,98 @@
+"""Split a tracked command's runtime into phases marked in its output."""
+
+import re
+import time
+
+from . import block
+from . import datetime_utils
+from . import exceptions
+
+
+def compile_pattern(pattern):
+    """
+    Compile a phase marker regular expression.
+
+    The phase name is the pattern's first group, or the whole match when the
+    pattern has no groups.
+    """
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    try:
+        return re.compile(pattern)
+    except re.error as error:
+        raise exceptions.JortException(f"Invalid phase regex `{pattern}`: {error}") from error
+
+
+class PhaseTimer(object):
+    """
+    Time the phases of a running command from marker lines in its output.
+
+    Each line matching ``pattern`` closes the current phase and opens the
+    next, named by the match; the last phase closes when the command exits.
+    Output before the first marker belongs to no phase. Every phase is also
+    added to the tracker as a block named ``<command> / <phase>``, nested
+    under the command's own block, so repeated phases accumulate iterations.
+
+    Parameters
+    ----------
+    pattern : str or re.Pattern
+        Phase marker regular expression, searched in each output line
+    tracker : Tracker
+        Tracker timing the command
+    name : str
+        Name of the command's block
+
+    :ivar phases: finished phases, each with its ``name``, ``start_seconds``
+        (offset from the start of the command), and ``seconds``
+    """
+    def __init__(self, pattern, tracker, name):
+        self.pattern = compile_pattern(pattern)
+        self.tracker = tracker
+        self.name = name
+        self.phases = []
+        self._started = time.monotonic()
+        self._current = None
+
+    def line(self, text):
+        """Check one output line for a marker, returning the new phase name if any."""
+        match = self.pattern.search(text)
+        if match is None:
+            return None
+        phase = match.group(1) if self.pattern.groups else match.group(0)
+        phase = (phase or "").strip() or "-"
+        self._close()
+        self._current = (phase, time.monotonic(), datetime_utils.get_iso_date())
+        return phase
+
+    def close(self):
+        """Close the open phase, returning all finished phases."""
+        self._close()
+        return self.phases
+
+    def _close(self):
+        if self._current is None:
+            return
+        phase, start, start_iso = self._current
+        self._current = None
+        elapsed = time.monotonic() - start
+        key = f"{self.name} / {phase}"
+        if key not in self.tracker.blocks:
+            self.tracker.blocks[key] = block.Block(key)
+        self.tracker.blocks[key].add_times(start_iso, datetime_utils.get_iso_date(),
+                                           elapsed=elapsed)
+        self.phases.append({"name": phase, "start_seconds": start - self._started,
+                            "seconds": elapsed})
+
+
+def totals(phases):
+    """Total seconds per phase name, in order of first appearance."""
+    result = {}
+    for phase in phases or []:
+        result[phase["name"]] = result.get(phase["name"], 0.0) + phase["seconds"]
+    return result
+
+
+def format_phases(phases):
+    """Format phase totals as ``name 1.2 s, name 300.0 ms``."""
+    return ", ".join(f"{name} {block.format_reported_times(seconds)}"
+                     for name, seconds in totals(phases).items())
@@ -0,0 +1,264 @@
+"""Run dependency graphs of tracked commands with bounded parallelism."""
+
+import concurrent.futures
+import json
+import time
+
+from . import database
+from . import datetime_utils
+from . import exceptions
+from . import track_cli
+
+
+SUCCESSFUL_STATUSES = ("success", "skipped")
+
+
+def load_pipeline(path):
+    """
+    Read a JSON pipeline file.
+
+    The file holds an optional ``session`` name and a ``jobs`` mapping from node
+    name to a command specification::
+
+        {
+            "session": "nightly",
+            "jobs": {
+                "fetch": {"command": "python fetch.py"},
+                "train": {"command": "python train.py", "needs": ["fetch"]}
+            }
+        }
+
+    A specification may also be a bare command string. Optional keys are
+    ``needs``, ``shell``, ``cwd``, ``timeout``, ``inputs``, and ``outputs``;
+    the last two make skipping depend on input contents and existing outputs,
+    as with :func:`jort.track_new`.
+
+    Parameters
+    ----------
+    path : str
+        Pipeline filename
+
+    Returns
+    -------
+    pipeline : dict
+        Dictionary with ``session`` and normalized ``nodes``
+    """
+    try:
+        with open(path, "r") as stream:
+            data = json.load(stream)
+    except (OSError, json.JSONDecodeError) as error:
+        raise exceptions.JortException(f"Cannot read pipeline {path}: {error}") from error
+    if not isinstance(data, dict) or not isinstance(data.get("jobs"), dict):
+        raise exceptions.JortException("Pipeline must contain a `jobs` mapping")
+    return {"session": data.get("session"), "nodes": normalize_nodes(data["jobs"])}
+
+
+def normalize_nodes(jobs):
+    """Validate node specifications and return them in topological order."""
+    nodes = {}
+    for name, spec in jobs.items():
+        if isinstance(spec, str):
+            spec = {"command": spec}
+        if not isinstance(spec, dict) or not spec.get("command"):
+            raise exceptions.JortException(f"Pipeline job `{name}` needs a command")
+        needs = spec.get("needs", [])
+        if isinstance(needs, str):
+            needs = [needs]
+        nodes[name] = {
+            "command": spec["command"],
+            "needs": list(needs),
+            "shell": bool(spec.get("shell", False)),
+            "cwd": spec.get("cwd"),
+            "timeout": spec.get("timeout"),
+            "inputs": list(spec.get("inputs", [])),
+            "outputs": list(spec.get("outputs", [])),
+        }
+    for name, node in nodes.items():
+        for dependency in node["needs"]:
+            if dependency not in nodes:
+                raise exceptions.JortException(
+                    f"Pipeline job `{name}` needs unknown job `{dependency}`"
+                )
+    order = _topological_order(nodes)
+    return {name: nodes[name] for name in order}
+
+
+def _topological_order(nodes):
+    remaining = {name: len(node["needs"]) for name, node in nodes.items()}
+    dependents = _dependents(nodes)
+    ready = [name for name, count in remaining.items() if count == 0]
+    order = []
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for dependent in dependents[name]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    if len(order) != len(nodes):
+        cycle = sorted(name for name in nodes if name not in order)
+        raise exceptions.JortException(f"Pipeline has a dependency cycle among: {', '.join(cycle)}")
+    return order
+
+
+def _dependents(nodes):
+    dependents = {name: [] for name in nodes}
+    for name, node in nodes.items():
+        for dependency in node["needs"]:
+            dependents[dependency].append(name)
+    return dependents
+
+
+def critical_path(nodes, results):
+    """
+    Return the longest runtime-weighted dependency chain.
+
+    Parameters
+    ----------
+    nodes : dict
+        Topologically ordered node specifications
+    results : dict
+        Node results with ``runtime`` in seconds
+
+    Returns
+    -------
+    path : list
+        Node names along the critical path
+    seconds : float
+        Summed runtime along the path
+    """
+    finish = {}
+    previous = {}
+    for name, node in nodes.items():
+        runtime = results.get(name, {}).get("runtime") or 0.0
+        best = None
+        for dependency in node["needs"]:
+            if best is None or finish[dependency] > finish[best]:
+                best = dependency
+        previous[name] = best
+        finish[name] = runtime + (finish[best] if best is not None else 0.0)
+    if not finish:
+        return [], 0.0
+    name = max(finish, key=finish.get)
+    seconds = finish[name]
+    path = []
+    while name is not None:
+        path.append(name)
+        name = previous[name]
+    return path[::-1], seconds
+
+
+def _run_node(name, node, session_name, unique, pipeline_name):
+    try:
+        return track_cli.track_new(
+            node["command"],
+            use_shell=node["shell"],
+            cwd=node["cwd"],
+            to_db=True,
+            session_name=session_name,
+            unique=unique,
+            quiet=True,
+            timeout_seconds=node["timeout"],
+            inputs=node["inputs"],
+            outputs=node["outputs"],
+            extra_metadata={"pipeline": pipeline_name, "pipeline_node": name},
+        )
+    except exceptions.JortException as error:
+        return {"status": "error", "runtime": 0.0, "job_id": None,
+                "error_message": str(error)}
+
+
+def run_pipeline(nodes, session_name=None, max_workers=4, unique=True,
+                 pipeline_name=None, on_result=None):
+    """
+    Run pipeline nodes as soon as their dependencies succeed.
+
+    Every node is tracked with :func:`jort.track_new` under one session, so a
+    rerun with ``unique=True`` skips nodes whose latest matching run succeeded.
+    Dependents of a failed node are not started and are reported as
+    ``blocked``.
+
+    Parameters
+    ----------
+    nodes : dict
+        Node specifications, as returned by :func:`normalize_nodes`
+    session_name : str, optional
+        Session for all node jobs
+    max_workers : int, optional
+        Maximum number of nodes running at once
+    unique : bool, optional
+        Skip nodes that already succeeded in the session
+    pipeline_name : str, optional
+        Label stored in each job's metadata
+    on_result : callable, optional
+        Called with ``(name, result)`` as each node finishes
+
+    Returns
+    -------
+    summary : dict
+        Per-node results, critical path, and total wall time
+    """
+    nodes = normalize_nodes(nodes)
+    # Create the session up front so parallel trackers resolve the same id.
+    session_id = database.get_or_create_session(session_name)
+    if session_name is None:
+        session_name = session_id
+    dependents = _dependents(nodes)
+    remaining = {name: len(node["needs"]) for name, node in nodes.items()}
+    results = {}
+    started = time.monotonic()
+    date_created = datetime_utils.get_iso_date()
+
+    def block_descendants(name):
+        for dependent in dependents[name]:
+            if dependent not in results:
+                results[dependent] = {"status": "blocked", "runtime": 0.0, "job_id": None,
+                                      "error_message": f"dependency `{name}` did not succeed"}
+                if on_result is not None:
+                    on_result(dependent, results[dependent])
+                block_descendants(dependent)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        for name, count in remaining.items():
+            if count == 0:
+                running[executor.submit(_run_node, name, nodes[name], session_name,
+                                        unique, pipeline_name)] = name
+        while running:
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                name = running.pop(future)
+                payload = future.result()
+                results[name] = {
+                    "status": payload.get("status"),
+                    "runtime": payload.get("runtime"),
+                    "job_id": payload.get("job_id"),
+                    "error_message": payload.get("error_message"),
+                }
+                if on_result is not None:
+                    on_result(name, results[name])
+                if results[name]["status"] not in SUCCESSFUL_STATUSES:
+                    block_descendants(name)
+                    continue
+                for dependent in dependents[name]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0 and dependent not in results:
+                        running[executor.submit(_run_node, dependent, nodes[dependent],
+                                                session_name, unique, pipeline_name)] = dependent
+
+    path, path_seconds = critical_path(nodes, results)
+    failed = [name for name in nodes if results[name]["status"] not in SUCCESSFUL_STATUSES]
+    return {
+        "pipeline": pipeline_name,
+        "session": session_name,
+        "status": "error" if failed else "success",
+        "date_created": date_created,
+        "date_modified": datetime_utils.get_iso_date(),
+        "wall_seconds": time.monotonic() - started,
+        "critical_path": path,
+        "critical_path_seconds": path_seconds,
+        "failed": failed,
+        "nodes": {name: results[name] for name in nodes},
+    }
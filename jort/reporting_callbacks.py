@@ -1,20 +1,36 @@
 from abc import ABC, abstractmethod
+import asyncio
+import collections
+import contextlib
+import gzip
+import io
+import json
 import os
-import smtplib
-import ssl
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
 from html import escape as html_escape
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
+from . import analytics
 from . import config
 from . import datetime_utils
 from . import exceptions
+from . import mailer
+from . import phases
 
 
 class Callback(ABC):
     """
     Abstract base class for notification callbacks.
+
+    :cvar timeout: seconds a delivery may take when channels are sent together,
+        ``None`` for no limit
     """
+    timeout = None
+
     def __init__(self):
         pass
 
@@ -31,6 +47,113 @@ class Callback(ABC):
         Send notification given job status payload.
         """
         pass
+
+    async def execute_async(self, payload):
+        """
+        Send notification given job status payload without blocking the event
+        loop. By default :meth:`execute` runs on a daemon thread, so a
+        delivery abandoned at its timeout cannot hold up interpreter exit.
+        """
+        return await _in_daemon_thread(self.execute, payload)
+
+    def execute_digest(self, payloads):
+        """
+        Send one notification summarizing several job status payloads.
+        Callbacks without a digest format notify for each job.
+        """
+        return [self.execute(payload) for payload in payloads]
+
+
+def _in_daemon_thread(function, *args):
+    """Run a blocking call on a new daemon thread, returning an awaitable."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if not future.done():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def run():
+        try:
+            result, error = function(*args), None
+        except Exception as exception:
+            result, error = None, exception
+        # The loop is gone if the caller stopped waiting and finished.
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(resolve, result, error)
+
+    threading.Thread(target=run, name="jort-callback", daemon=True).start()
+    return future
+
+
+DIGEST_TOP_JOBS = 5
+DIGEST_MAX_FAILURES = 20
+STATUS_LABELS = {
+    "success": "Completed",
+    "error": "Failed",
+    "finished": "Finished",
+    "terminated": "Terminated",
+    "timeout": "Timed out",
+}
+
+
+def _error_line(payload):
+    """Return the first line of a job's error, or its exit code."""
+    lines = str(payload.get("error_message") or "").strip().splitlines()
+    if lines:
+        line = " ".join(lines[0].split())
+        return f"{line[:197]}..." if len(line) > 200 else line
+    if payload.get("exit_code") is not None:
+        return f"exit code {payload['exit_code']}"
+    return "unknown error"
+
+
+def summarize_digest(payloads, top=DIGEST_TOP_JOBS, max_failures=DIGEST_MAX_FAILURES):
+    """
+    Summarize job status payloads for a digest notification.
+
+    Returns
+    -------
+    summary : dict
+        ``jobs`` count, per-status ``counts`` (most common first), the
+        ``slowest`` jobs, up to ``max_failures`` ``failures`` as ``(payload,
+        error line)`` pairs with the number of ``more_failures`` left out, the
+        ``sessions`` involved, and the ``median``, ``p90``, and ``max`` of
+        their ``runtimes``, or None if no job has a runtime
+    """
+    counts = collections.Counter(payload.get("status") for payload in payloads)
+    timed = [payload for payload in payloads if payload.get("runtime") is not None]
+    failures = [payload for payload in payloads if payload.get("status") != "success"]
+    sessions = {payload.get("session_name") or payload.get("session_id") for payload in payloads}
+    runtimes = sorted(payload["runtime"] for payload in timed)
+    return {
+        "jobs": len(payloads),
+        "counts": dict(counts.most_common()),
+        "slowest": sorted(timed, key=lambda payload: payload["runtime"], reverse=True)[:top],
+        "failures": [(payload, _error_line(payload)) for payload in failures[:max_failures]],
+        "more_failures": max(0, len(failures) - max_failures),
+        "sessions": sorted(session for session in sessions if session is not None),
+        "runtimes": {
+            "median": analytics._interpolate(runtimes, 0.5),
+            "p90": analytics._interpolate(runtimes, 0.9),
+            "max": runtimes[-1],
+        } if runtimes else None,
+    }
+
+
+def _runtime_line(summary):
+    runtimes = summary["runtimes"]
+    return ", ".join(f"{label} {datetime_utils.format_timespan(runtimes[label])}"
+                     for label in ("median", "p90", "max"))
+
+
+def _digest_headline(summary):
+    counts = ", ".join(f"{count} {STATUS_LABELS.get(status, status).lower()}"
+                       for status, count in summary["counts"].items())
+    return f'{summary["jobs"]} jobs finished ({counts})'
     
     
 class PrintReport(Callback):
@@ -43,6 +166,9 @@ class PrintReport(Callback):
         pass
 
     def format_message(self, payload):
+        return self._status_message(payload) + _alert_text(payload) + _phase_text(payload)
+
+    def _status_message(self, payload):
         if payload["status"] == "success":
             return (
                 f'\n'
@@ -80,6 +206,90 @@ class PrintReport(Callback):
     def execute(self, payload):
         print(self.format_message(payload))
 
+    async def execute_async(self, payload):
+        self.execute(payload)
+
+
+def _alert_text(payload):
+    """Append the notification rules a job matched, see :mod:`jort.rules`."""
+    alerts = payload.get("alerts") or []
+    return "".join(f"\nAlert: {alert}" for alert in alerts)
+
+
+def _phase_text(payload):
+    """Append the phase durations of a job tracked with a phase regex."""
+    phase_list = (payload.get("metadata") or {}).get("phases")
+    return f"\nPhases: {phases.format_phases(phase_list)}" if phase_list else ""
+
+
+# Largest compressed output attached to an e-mail; larger output is excerpted.
+ATTACHMENT_MAX_BYTES = 8 * 2**20
+EXCERPT_BYTES = 64 * 2**10
+_CHUNK_BYTES = 2**16
+
+
+class _AttachmentTooLarge(Exception):
+    pass
+
+
+def _gzip(chunks, max_bytes=None):
+    """Compress byte chunks, stopping once the result exceeds ``max_bytes``."""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename="", mode="wb", fileobj=buffer, mtime=0) as stream:
+        for chunk in chunks:
+            stream.write(chunk)
+            if max_bytes is not None and buffer.tell() > max_bytes:
+                raise _AttachmentTooLarge()
+    if max_bytes is not None and buffer.tell() > max_bytes:
+        raise _AttachmentTooLarge()
+    return buffer.getvalue()
+
+
+def output_attachment(path, job_id=None, max_bytes=ATTACHMENT_MAX_BYTES):
+    """
+    Read captured output into a gzip-compressed e-mail attachment.
+
+    The file is compressed in chunks while it is read, and given up on as soon
+    as the compressed size passes ``max_bytes``. Larger output is attached as
+    an excerpt of its first and last ``EXCERPT_BYTES`` instead, with a note
+    pointing at the full file, so memory use is bounded by ``max_bytes``
+    whatever the size of the output.
+
+    Returns
+    -------
+    attachment : dict
+        ``filename``, compressed ``data``, output ``size`` in bytes, whether it
+        is an ``excerpt``, and the ``path`` read
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as stream:
+        try:
+            data = _gzip(iter(lambda: stream.read(_CHUNK_BYTES), b""), max_bytes)
+            return {"filename": "output.txt.gz", "data": data, "size": size,
+                    "excerpt": False, "path": path}
+        except _AttachmentTooLarge:
+            pass
+        stream.seek(0)
+        head = stream.read(EXCERPT_BYTES)
+        stream.seek(max(len(head), size - EXCERPT_BYTES))
+        tail = stream.read(EXCERPT_BYTES)
+    hint = f"full output at {path}"
+    if job_id is not None:
+        hint += f", see `jort logs {job_id}`"
+    omitted = (f"\n\n[... {size - len(head) - len(tail)} bytes omitted; {hint} ...]\n\n")
+    return {"filename": "output-excerpt.txt.gz", "data": _gzip([head, omitted.encode(), tail]),
+            "size": size, "excerpt": True, "path": path}
+
+
+def _attachment_note(attachment):
+    if attachment is None or not attachment["excerpt"]:
+        filename = "output.txt.gz" if attachment is None else attachment["filename"]
+        return f"Full command output is attached as {filename}.", filename
+    size = analytics._format_bytes(attachment["size"])
+    return (f"The command output ({size}) is too large to attach; its first and "
+            f"last {EXCERPT_BYTES // 1024} KiB are attached as {attachment['filename']}, "
+            f"and the full output is at {attachment['path']}.", attachment["filename"])
+
 
 class EmailNotification(Callback):
     """
@@ -87,6 +297,8 @@ class EmailNotification(Callback):
     credentials, which can be entered at the command line via :code:`jort config`.
     """
     channel = "email"
+    # Connecting and logging in may each take up to the 30 s socket timeout.
+    timeout = 60
 
     def __init__(self, email=None, validate=False):
         config_data = config._get_config_data()
@@ -97,6 +309,8 @@ class EmailNotification(Callback):
         self.smtp_server = config_data.get("smtp_server")
         self.smtp_port = config_data.get("smtp_port", 465)
         self.to_email = config_data.get("email_to", self.email)
+        self.attachment_max_bytes = int(config_data.get("email_attachment_max_bytes",
+                                                        ATTACHMENT_MAX_BYTES))
 
         if validate:
             self.validate()
@@ -115,7 +329,7 @@ class EmailNotification(Callback):
         except (TypeError, ValueError) as error:
             raise exceptions.JortException("SMTP port must be an integer") from error
 
-    def format_message(self, payload):
+    def format_message(self, payload, attachment=None):
         status = payload["status"]
         status_details = {
             "success": {
@@ -193,8 +407,12 @@ class EmailNotification(Callback):
             body_lines.append(f"PID:      {pid}")
         if error_text is not None:
             body_lines.extend(["", f"Error: {error_text}"])
+        alerts = [str(alert) for alert in payload.get("alerts") or []]
+        if alerts:
+            body_lines.extend(["", "Alerts:"] + [f"  - {alert}" for alert in alerts])
+        attachment_text, attachment_name = _attachment_note(attachment)
         if payload.get("stdout_fn") is not None:
-            body_lines.extend(["", "Full command output is attached as output.txt."])
+            body_lines.extend(["", attachment_text])
         body_lines.extend(["", "--", "jort"])
         body = "\r\n".join(body_lines)
 
@@ -232,11 +450,24 @@ class EmailNotification(Callback):
                 f'<div style="margin-top:4px;color:#7a271a;word-break:break-word;">'
                 f'{html_error}</div></div>'
             )
+        alert_block = ""
+        if alerts:
+            alert_items = "".join(f"<li>{html_escape(alert)}</li>" for alert in alerts)
+            alert_block = (
+                f'<div style="margin-top:20px;padding:12px 14px;'
+                f'border-left:4px solid #dc6803;background:#fffaeb;">'
+                f'<div style="font-size:12px;font-weight:700;color:#b54708;'
+                f'text-transform:uppercase;letter-spacing:.04em;">Alerts</div>'
+                f'<ul style="margin:4px 0 0;padding-left:18px;color:#7a2e0e;">'
+                f'{alert_items}</ul></div>'
+            )
         attachment_note = ""
         if payload.get("stdout_fn") is not None:
+            html_name = html_escape(attachment_name)
             attachment_note = (
                 '<p style="margin:20px 0 0;color:#667085;font-size:13px;">'
-                'Full command output is attached as <strong>output.txt</strong>.</p>'
+                + html_escape(attachment_text).replace(html_name, f"<strong>{html_name}</strong>", 1)
+                + '</p>'
             )
 
         html_body = (
@@ -276,7 +507,7 @@ class EmailNotification(Callback):
             f'{machine_row}'
             f'{process_rows}'
             '</table>'
-            f'{error_block}{attachment_note}'
+            f'{error_block}{alert_block}{attachment_note}'
             '</td></tr>'
             '<tr><td style="padding:16px 24px;border-top:1px solid #eaecf0;'
             'color:#98a2b3;font-size:12px;">Jort · local job notification</td></tr>'
@@ -299,36 +530,117 @@ class EmailNotification(Callback):
             return f"{error_text[:497]}..."
         return error_text
 
-    def execute(self, payload):
-        email_data = self.format_message(payload)
+    def format_digest(self, payloads):
+        """Format one e-mail summarizing several finished jobs."""
+        summary = summarize_digest(payloads)
+        headline = _digest_headline(summary)
+        failed = sum(count for status, count in summary["counts"].items() if status != "success")
+        subject = f'[jort] Digest: {summary["jobs"]} jobs'
+        if failed:
+            subject += f", {failed} not completed"
+
+        body_lines = ["JORT / JOB DIGEST", "", headline, ""]
+        if summary["sessions"]:
+            body_lines.extend([f'Sessions: {", ".join(summary["sessions"])}', ""])
+        body_lines.append("Status       Jobs")
+        for status, count in summary["counts"].items():
+            body_lines.append(f"{STATUS_LABELS.get(status, status):<12} {count}")
+        if summary["runtimes"]:
+            body_lines.extend(["", f"Runtime: {_runtime_line(summary)}"])
+        body_lines.extend(["", "Slowest jobs:"])
+        for payload in summary["slowest"]:
+            runtime = datetime_utils.format_timespan(payload["runtime"])
+            body_lines.append(f'  {runtime:>20}  {payload.get("name")}')
+        if summary["failures"]:
+            body_lines.extend(["", "Failures:"])
+            for payload, error in summary["failures"]:
+                body_lines.append(f'  {payload.get("name")}: {error}')
+            if summary["more_failures"]:
+                body_lines.append(f'  ... and {summary["more_failures"]} more')
+        body_lines.extend(["", "--", "jort"])
 
+        cell = 'style="padding:6px 8px;border-bottom:1px solid #eaecf0;"'
+        status_rows = "".join(
+            f"<tr><td {cell}>{html_escape(STATUS_LABELS.get(status, str(status)))}</td>"
+            f'<td {cell} align="right">{count}</td></tr>'
+            for status, count in summary["counts"].items()
+        )
+        slowest_rows = "".join(
+            f'<tr><td {cell}>{html_escape(str(payload.get("name")))}</td>'
+            f'<td {cell} align="right">'
+            f'{html_escape(datetime_utils.format_timespan(payload["runtime"]))}</td></tr>'
+            for payload in summary["slowest"]
+        )
+        failure_rows = "".join(
+            f'<tr><td {cell}>{html_escape(str(payload.get("name")))}</td>'
+            f"<td {cell}>{html_escape(error)}</td></tr>"
+            for payload, error in summary["failures"]
+        )
+        if summary["more_failures"]:
+            failure_rows += f'<tr><td {cell} colspan="2">... and {summary["more_failures"]} more</td></tr>'
+        table = ('<table role="presentation" width="100%" cellpadding="0" cellspacing="0" '
+                 'style="margin-top:12px;border-collapse:collapse;font-size:14px;">')
+        html_body = (
+            '<!doctype html>'
+            '<html><head><meta charset="utf-8"></head>'
+            '<body style="margin:0;background:#f2f4f7;color:#101828;'
+            'font-family:-apple-system,BlinkMacSystemFont,Segoe UI,sans-serif;">'
+            '<div style="padding:28px 14px;max-width:600px;margin:0 auto;">'
+            '<div style="padding:20px 24px;background:#101828;color:#ffffff;">'
+            '<div style="font-size:11px;font-weight:700;letter-spacing:.12em;'
+            'color:#98a2b3;">JORT / JOB DIGEST</div>'
+            f'<div style="margin-top:8px;font-size:20px;font-weight:650;">'
+            f'{html_escape(headline)}</div></div>'
+            '<div style="padding:24px;background:#ffffff;border:1px solid #eaecf0;">'
+            f'{table}{status_rows}</table>'
+            + (f'<p style="margin:16px 0 0;font-size:14px;">Runtime: '
+               f'{html_escape(_runtime_line(summary))}</p>' if summary["runtimes"] else '')
+            + f'<h3 style="margin:20px 0 0;font-size:14px;">Slowest jobs</h3>{table}{slowest_rows}</table>'
+            + (f'<h3 style="margin:20px 0 0;font-size:14px;color:#b42318;">Failures</h3>'
+               f'{table}{failure_rows}</table>' if failure_rows else '')
+            + '</div></div></body></html>'
+        )
+        return {"subject": subject, "body": "\r\n".join(body_lines), "html_body": html_body}
+
+    def execute_digest(self, payloads):
+        self._send(self.format_digest(payloads))
+        return {"recipient": self.to_email, "jobs": len(payloads)}
+
+    def execute(self, payload):
+        attachment = None
+        if payload["stdout_fn"] is not None:
+            stdout_path = os.path.join(config._get_data_dir(), payload["stdout_fn"])
+            attachment = output_attachment(stdout_path, payload.get("job_id"),
+                                           self.attachment_max_bytes)
+        self._send(self.format_message(payload, attachment), attachment)
+        result = {"recipient": self.to_email}
+        if attachment is not None:
+            result["attachment"] = {"filename": attachment["filename"],
+                                    "bytes": len(attachment["data"])}
+        return result
+
+    def _send(self, email_data, attachment=None):
         message = MIMEMultipart("alternative")
         message.attach(MIMEText(email_data["body"], "plain"))
         message.attach(MIMEText(email_data["html_body"], "html"))
 
-        if payload["stdout_fn"] is not None:
-            stdout_path = os.path.join(config._get_data_dir(), payload["stdout_fn"])
-            with open(stdout_path, "r") as f:
-                attachment = MIMEApplication(f.read(), _subtype="txt")
-            attachment.add_header("Content-Disposition", "attachment", filename="output.txt")
+        if attachment is not None:
+            part = MIMEApplication(attachment["data"], _subtype="gzip")
+            part.add_header("Content-Disposition", "attachment", filename=attachment["filename"])
 
             message_mix = MIMEMultipart("mixed")
             message_mix.attach(message)
-            message_mix.attach(attachment)
+            message_mix.attach(part)
             message = message_mix
 
         message["Subject"] = email_data["subject"]
         message["From"] = self.email
         message["To"] = self.to_email
 
-        # Secure connection
-        context = ssl.create_default_context()
         self.validate()
-        with smtplib.SMTP_SSL(self.smtp_server, port=self.smtp_port, context=context,
-                              timeout=30) as server:
-            server.login(self.email, self.email_password)
-            server.sendmail(message["From"], message["To"], message.as_string())
-        return {"recipient": self.to_email}
+        # Connections are shared with other notifications for the same account.
+        pool = mailer.get_pool(self.smtp_server, self.smtp_port, self.email, self.email_password)
+        pool.sendmail(message["From"], message["To"], message.as_string())
 
 
 class TextNotification(Callback):
@@ -337,6 +649,7 @@ class TextNotification(Callback):
     Twilio credentials, which can be entered at the command line via :code:`jort config`.
     """
     channel = "text"
+    timeout = 30
 
     def __init__(self, receive_number=None, validate=False):
         config_data = config._get_config_data()
@@ -359,6 +672,9 @@ class TextNotification(Callback):
             raise exceptions.JortException("Missing receiving number")
 
     def format_message(self, payload):
+        return self._status_message(payload) + _alert_text(payload)
+
+    def _status_message(self, payload):
         if payload["status"] == "success":
             return (
                 f'Your job `{payload["name"]}` successfully completed '
@@ -389,12 +705,103 @@ class TextNotification(Callback):
         else:
             raise exceptions.JortException(f'Invalid status: {payload["status"]}')
     
+    def format_digest(self, payloads):
+        """Format one short text summarizing several finished jobs."""
+        summary = summarize_digest(payloads, top=1, max_failures=1)
+        parts = [f"jort: {_digest_headline(summary)}."]
+        if summary["runtimes"]:
+            parts.append(f"Runtime: {_runtime_line(summary)}.")
+        if summary["slowest"]:
+            slowest = summary["slowest"][0]
+            parts.append(f'Slowest: `{slowest.get("name")}` '
+                         f'({datetime_utils.format_timespan(slowest["runtime"])}).')
+        if summary["failures"]:
+            payload, error = summary["failures"][0]
+            parts.append(f'First failure: `{payload.get("name")}` ({error[:80]}).')
+        return " ".join(parts)
+
+    def execute_digest(self, payloads):
+        return {**self._send(self.format_digest(payloads)), "jobs": len(payloads)}
+
     def execute(self, payload):
+        return self._send(self.format_message(payload))
+
+    def _send(self, body):
         self.validate()
         from twilio.rest import Client
 
         client = Client(self.twilio_account_sid, self.twilio_auth_token)
-        message = client.messages.create(body=self.format_message(payload),
+        message = client.messages.create(body=body,
                                          from_=self.send_number,
                                          to=self.receive_number)
         return {"sid": getattr(message, "sid", None)}
+
+
+WEBHOOK_FIELDS = (
+    "job_id", "name", "status", "runtime", "exit_code", "machine",
+    "date_created", "date_modified", "error_message", "session_name", "alerts",
+)
+
+
+class WebhookNotification(Callback):
+    """
+    POST a JSON summary of the job to an HTTP endpoint, such as a chat bot or
+    a local automation hook. The URL can be entered at the command line via
+    :code:`jort config webhook`.
+    """
+    channel = "webhook"
+    timeout = 10
+
+    def __init__(self, url=None, validate=False):
+        self.url = url if url is not None else config._get_config_data().get("webhook_url")
+
+        if validate:
+            self.validate()
+
+    def validate(self):
+        if self.url is None:
+            raise exceptions.JortException("Missing webhook URL, add with `jort config webhook` command")
+        if urllib.parse.urlsplit(self.url).scheme not in ("http", "https"):
+            raise exceptions.JortException("Webhook URL must start with http:// or https://")
+
+    def format_message(self, payload):
+        message = {field: payload.get(field) for field in WEBHOOK_FIELDS}
+        message["text"] = PrintReport().format_message(payload).strip()
+        return message
+
+    def format_digest(self, payloads):
+        """Format one JSON summary of several finished jobs."""
+        summary = summarize_digest(payloads)
+        return {
+            "jobs": summary["jobs"],
+            "counts": summary["counts"],
+            "runtimes": summary["runtimes"],
+            "failures": [{"job_id": payload.get("job_id"), "name": payload.get("name"),
+                          "error": error} for payload, error in summary["failures"]],
+            "more_failures": summary["more_failures"],
+            "text": _digest_headline(summary),
+        }
+
+    def _request(self, payload):
+        return self._encode(self.format_message(payload))
+
+    def _encode(self, message):
+        self.validate()
+        return json.dumps(message, default=str).encode()
+
+    def _post(self, body):
+        request = urllib.request.Request(
+            self.url, data=body, method="POST",
+            headers={"Content-Type": "application/json", "User-Agent": "jort"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return {"status_code": response.status}
+        except urllib.error.HTTPError as error:
+            raise exceptions.JortException(f"Webhook returned HTTP {error.code}") from error
+
+    def execute(self, payload):
+        return self._post(self._request(payload))
+
+    def execute_digest(self, payloads):
+        return {**self._post(self._encode(self.format_digest(payloads))), "jobs": len(payloads)}
@@ -0,0 +1,289 @@
+"""Prune, archive, and compact saved job history."""
+
+import contextlib
+import json
+import os
+import re
+import sqlite3
+
+import click
+
+from . import config
+from . import database
+from . import datetime_utils
+from . import exceptions
+from . import export
+
+
+ACTIVE_STATUSES = ("running", "queued")
+# Capture files are named by track_new with a short uuid.
+CAPTURE_PATTERN = re.compile(r"^[0-9A-Za-z]+\.txt$")
+VACUUM_STEP_PAGES = 1024
+
+
+def _connect():
+    connection = sqlite3.connect(config._get_database_path(), timeout=30)
+    connection.isolation_level = None
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def _select_candidates(connection, older_than=None, keep_last=None, statuses=None):
+    """Snapshot the ids of prunable jobs into a temporary table and count them."""
+    clauses = ["status NOT IN ({})".format(", ".join("?" for _ in ACTIVE_STATUSES))]
+    params = list(ACTIVE_STATUSES)
+    if statuses:
+        clauses.append("status IN ({})".format(", ".join("?" for _ in statuses)))
+        params.extend(statuses)
+    policy = []
+    if older_than is not None:
+        policy.append("date_created < ?")
+        params.append(datetime_utils.parse_time(older_than))
+    if keep_last is not None:
+        policy.append("position > ?")
+        params.append(keep_last)
+        position = ("ROW_NUMBER() OVER (PARTITION BY session_id "
+                    "ORDER BY date_created DESC, job_id DESC)")
+    else:
+        position = "0"
+    if policy:
+        clauses.append("({})".format(" OR ".join(policy)))
+    connection.execute("DROP TABLE IF EXISTS temp.gc_candidates")
+    connection.execute(
+        "CREATE TEMP TABLE gc_candidates AS SELECT job_id, stdout_fn FROM ("
+        f"SELECT job_id, status, date_created, stdout_fn, {position} AS position FROM jobs"
+        ") WHERE " + " AND ".join(clauses),
+        params,
+    )
+    return connection.execute("SELECT COUNT(*) FROM temp.gc_candidates").fetchone()[0]
+
+
+def _remove_capture(stdout_fn):
+    # Only files jort created inside the data directory are removed.
+    if not stdout_fn or os.path.basename(stdout_fn) != stdout_fn:
+        return 0
+    try:
+        os.unlink(os.path.join(config._get_data_dir(), stdout_fn))
+    except FileNotFoundError:
+        return 0
+    return 1
+
+
+def prune_jobs(older_than=None, keep_last=None, statuses=None, archive=None,
+               batch_size=500, dry_run=False):
+    """
+    Delete saved jobs selected by a retention policy.
+
+    A job is pruned when it matches ``statuses`` (if given) and is either
+    older than ``older_than`` or beyond the newest ``keep_last`` jobs of its
+    session. Running and queued jobs are never pruned. Rows are deleted in
+    batches, each in its own short transaction, together with their
+    notifications and captured output files.
+
+    Parameters
+    ----------
+    older_than : str, optional
+        ISO date or duration such as ``90d``
+    keep_last : int, optional
+        Number of most recent jobs to keep per session
+    statuses : list, optional
+        Only prune jobs with these statuses
+    archive : str, optional
+        Append pruned jobs to this gzip-compressed NDJSON file before deleting
+    batch_size : int, optional
+        Jobs deleted per transaction
+    dry_run : bool, optional
+        Only count the jobs that would be pruned
+
+    Returns
+    -------
+    counts : dict
+        Numbers of pruned ``jobs``, ``notifications``, and ``captures``
+    """
+    if older_than is None and keep_last is None and not statuses:
+        raise exceptions.JortException(
+            "A retention policy is required: older_than, keep_last, or statuses"
+        )
+    database.ensure_database()
+    counts = {"jobs": 0, "notifications": 0, "captures": 0}
+    with contextlib.closing(_connect()) as connection:
+        total = _select_candidates(connection, older_than=older_than,
+                                   keep_last=keep_last, statuses=statuses)
+        if dry_run:
+            counts["jobs"] = total
+            return counts
+        with contextlib.ExitStack() as stack:
+            stream = None
+            if archive is not None and total:
+                stream = stack.enter_context(
+                    export.open_output(archive, compress=True, append=True)
+                )
+            for start in range(1, total + 1, batch_size):
+                bounds = (start, start + batch_size - 1)
+                batch = "SELECT job_id FROM temp.gc_candidates WHERE rowid BETWEEN ? AND ?"
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    if stream is not None:
+                        rows = connection.execute(
+                            f"{database.JOB_SELECT} WHERE jobs.job_id IN ({batch})", bounds
+                        )
+                        export.write_jobs((database._decode_job(row) for row in rows), stream)
+                        stream.flush()
+                    counts["notifications"] += connection.execute(
+                        f"DELETE FROM notifications WHERE job_id IN ({batch})", bounds
+                    ).rowcount
+                    counts["jobs"] += connection.execute(
+                        f"DELETE FROM jobs WHERE job_id IN ({batch})", bounds
+                    ).rowcount
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                captures = connection.execute(
+                    "SELECT stdout_fn FROM temp.gc_candidates WHERE rowid BETWEEN ? AND ?",
+                    bounds,
+                ).fetchall()
+                counts["captures"] += sum(_remove_capture(row[0]) for row in captures)
+        connection.execute(
+            "DELETE FROM commands WHERE NOT EXISTS ("
+            "SELECT 1 FROM jobs WHERE jobs.command_hash = commands.command_hash)"
+        )
+        connection.execute("DROP TABLE temp.gc_candidates")
+    return counts
+
+
+def remove_orphaned_files(grace="1d", dry_run=False):
+    """
+    Remove capture files no job refers to and worker specs that never started.
+
+    Parameters
+    ----------
+    grace : str, optional
+        Only files last modified before this ISO date or duration ago are
+        removed, so output of jobs that are still running is kept
+    dry_run : bool, optional
+        Only count the files that would be removed
+
+    Returns
+    -------
+    counts : dict
+        Numbers of removed ``orphaned_captures`` and ``stale_requests``
+    """
+    database.ensure_database()
+    cutoff = datetime_utils.parse_time(grace) / 1e6
+    data_dir = config._get_data_dir()
+    captures = [
+        entry.name for entry in os.scandir(data_dir)
+        if entry.is_file() and CAPTURE_PATTERN.match(entry.name)
+        and entry.stat().st_mtime < cutoff
+    ]
+    with contextlib.closing(_connect()) as connection:
+        connection.execute("CREATE TEMP TABLE gc_files (name TEXT PRIMARY KEY)")
+        connection.executemany("INSERT INTO temp.gc_files VALUES (?)",
+                               ((name,) for name in captures))
+        orphans = [row[0] for row in connection.execute(
+            "SELECT name FROM temp.gc_files WHERE name NOT IN ("
+            "SELECT stdout_fn FROM jobs WHERE stdout_fn IS NOT NULL)"
+        )]
+    requests_dir = os.path.join(data_dir, "requests")
+    requests = []
+    if os.path.isdir(requests_dir):
+        requests = [
+            entry.path for entry in os.scandir(requests_dir)
+            if entry.is_file() and entry.name.endswith(".json")
+            and entry.stat().st_mtime < cutoff
+        ]
+    counts = {"orphaned_captures": len(orphans), "stale_requests": len(requests)}
+    if dry_run:
+        return counts
+    counts["orphaned_captures"] = sum(_remove_capture(name) for name in orphans)
+    for path in requests:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+    return counts
+
+
+def reclaim_space(full=False, step_pages=VACUUM_STEP_PAGES):
+    """
+    Return free database pages to the filesystem.
+
+    Databases created with incremental auto-vacuum are shrunk a few pages at
+    a time so other jort processes only wait for short steps. Older databases
+    need one full ``VACUUM`` (``full=True``), which also switches them to
+    incremental auto-vacuum.
+
+    Returns
+    -------
+    result : dict
+        ``auto_vacuum`` mode and ``bytes_reclaimed``
+    """
+    database.ensure_database()
+    with contextlib.closing(_connect()) as connection:
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        before = connection.execute("PRAGMA page_count").fetchone()[0]
+        incremental = connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        if full:
+            connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.execute("VACUUM")
+            incremental = True
+        elif incremental:
+            while connection.execute("PRAGMA freelist_count").fetchone()[0]:
+                connection.execute(f"PRAGMA incremental_vacuum({int(step_pages)})").fetchall()
+        after = connection.execute("PRAGMA page_count").fetchone()[0]
+    return {
+        "auto_vacuum": "incremental" if incremental else "none",
+        "bytes_reclaimed": (before - after) * page_size,
+    }
+
+
+@click.command(name="gc", options_metavar="[<options>]")
+@click.option("--older-than", metavar="<age>",
+              help="prune jobs created before an ISO date or a duration ago, e.g. 90d")
+@click.option("--keep-last", type=click.IntRange(min=0), metavar="<n>",
+              help="prune all but the most recent n jobs of each session")
+@click.option("--status", multiple=True,
+              help="only prune jobs with this status (repeatable)")
+@click.option("--archive", metavar="<file>",
+              help="append pruned jobs to a gzip-compressed NDJSON file")
+@click.option("--grace", default="1d", show_default=True, metavar="<age>",
+              help="keep unreferenced capture and request files newer than this")
+@click.option("--batch-size", type=click.IntRange(min=1), default=500, show_default=True,
+              help="jobs deleted per transaction")
+@click.option("--full-vacuum", is_flag=True,
+              help="rewrite the database once to enable incremental space reclamation")
+@click.option("-n", "--dry-run", is_flag=True, help="only report what would be removed")
+@click.option("--json", "as_json", is_flag=True, help="print machine-readable JSON")
+def gc(older_than, keep_last, status, archive, grace, batch_size, full_vacuum,
+       dry_run, as_json):
+    """Prune old jobs, remove orphaned files, and reclaim database space."""
+    try:
+        for value in (older_than, grace):
+            if value is not None:
+                datetime_utils.parse_time(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error)) from error
+    summary = {"dry_run": dry_run}
+    if older_than is not None or keep_last is not None or status:
+        summary.update(prune_jobs(older_than=older_than, keep_last=keep_last,
+                                  statuses=status, archive=archive,
+                                  batch_size=batch_size, dry_run=dry_run))
+    summary.update(remove_orphaned_files(grace=grace, dry_run=dry_run))
+    if not dry_run:
+        summary.update(reclaim_space(full=full_vacuum))
+    if as_json:
+        click.echo(json.dumps(summary, sort_keys=True))
+        return
+    verb = "Would remove" if dry_run else "Removed"
+    if "jobs" in summary:
+        click.echo(f"{verb} {summary['jobs']} jobs", nl=False)
+        if not dry_run:
+            click.echo(f", {summary['notifications']} notifications, "
+                       f"{summary['captures']} capture files", nl=False)
+        click.echo("")
+    click.echo(f"{verb} {summary['orphaned_captures']} orphaned capture files and "
+               f"{summary['stale_requests']} stale worker requests")
+    if not dry_run:
+        click.echo(f"Reclaimed {summary['bytes_reclaimed']} bytes")
+        if summary["auto_vacuum"] != "incremental":
+            click.echo("Run `jort gc --full-vacuum` once to enable incremental "
+                       "space reclamation for this database")
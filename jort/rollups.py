@@ -0,0 +1,93 @@
+"""Daily runtime rollups of successful jobs per command and session."""
+
+import itertools
+
+from .sketch import QuantileSketch
+
+
+US_PER_DAY = 86400 * 10**6
+ROLLUP_COLUMNS = ("count", "total", "total_squares", "minimum", "maximum", "max_rss", "sketch")
+
+
+def day_of(epoch_us):
+    """Return the UTC day number of a timestamp in epoch microseconds."""
+    return epoch_us // US_PER_DAY
+
+
+def add_samples(connection, command_hash, session_id, day, runtimes, peak_rss=()):
+    """
+    Fold successful runtimes into one rollup row.
+
+    Must be called inside the caller's write transaction, so the rollup
+    changes together with the job rows it summarizes.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        Connection with an open write transaction
+    command_hash, session_id : str
+        Rollup key
+    day : int
+        UTC day number, see :func:`day_of`
+    runtimes : list
+        Runtimes in seconds
+    peak_rss : list, optional
+        Peak resident set sizes in bytes; ``None`` entries are ignored
+    """
+    key = (command_hash, session_id, day)
+    row = connection.execute(
+        f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM runtime_rollups "
+        "WHERE command_hash = ? AND session_id = ? AND day = ?",
+        key,
+    ).fetchone()
+    if row is None:
+        count, total, total_squares = 0, 0.0, 0.0
+        minimum = maximum = max_rss = None
+        sketch = QuantileSketch()
+    else:
+        count, total, total_squares, minimum, maximum, max_rss = tuple(row)[:6]
+        sketch = QuantileSketch.from_json(row[6])
+    for runtime in runtimes:
+        count += 1
+        total += runtime
+        total_squares += runtime * runtime
+        minimum = runtime if minimum is None else min(minimum, runtime)
+        maximum = runtime if maximum is None else max(maximum, runtime)
+        sketch.add(runtime)
+    for value in peak_rss:
+        if value is not None:
+            max_rss = value if max_rss is None else max(max_rss, value)
+    connection.execute(
+        "INSERT INTO runtime_rollups (command_hash, session_id, day, "
+        f"{', '.join(ROLLUP_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(command_hash, session_id, day) DO UPDATE SET "
+        + ", ".join(f"{column} = excluded.{column}" for column in ROLLUP_COLUMNS),
+        (*key, count, total, total_squares, minimum, maximum, max_rss, sketch.to_json()),
+    )
+
+
+def rebuild(connection, command_hashes):
+    """
+    Recompute the rollups of some commands from their saved jobs.
+
+    Runs inside the caller's write transaction; rebuilding is idempotent, so
+    an interrupted backfill can simply be repeated.
+    """
+    placeholders = ", ".join("?" for _ in command_hashes)
+    connection.execute(
+        f"DELETE FROM runtime_rollups WHERE command_hash IN ({placeholders})", command_hashes
+    )
+    rows = connection.execute(
+        "SELECT command_hash, session_id, date_created, runtime, "
+        "json_extract(metrics_json, '$.peak_rss_bytes') FROM jobs "
+        "WHERE status = 'success' AND runtime IS NOT NULL AND session_id IS NOT NULL "
+        f"AND date_created IS NOT NULL AND command_hash IN ({placeholders}) "
+        "ORDER BY command_hash, session_id, date_created",
+        command_hashes,
+    )
+    for (command_hash, session_id, day), group in itertools.groupby(
+        rows, key=lambda row: (row[0], row[1], day_of(row[2]))
+    ):
+        group = list(group)
+        add_samples(connection, command_hash, session_id, day,
+                    [row[3] for row in group], [row[4] for row in group])
@@ -0,0 +1,163 @@
+"""Notification rules evaluated against a command's stored history."""
+
+import re
+
+from . import analytics
+from . import database
+from . import datetime_utils
+from . import exceptions
+
+
+BASELINE_RUNS = 30
+# Baseline statistics are not trusted over fewer runs than this.
+MIN_BASELINE_RUNS = 5
+METRICS = {
+    "status": "status",
+    "exit_code": "exit code",
+    "runtime": "runtime",
+    "peak_rss": "peak RSS",
+}
+OPERATORS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+RULE_PATTERN = re.compile(
+    r"^\s*(?P<metric>\w+)\s*(?P<operator>>=|<=|==|!=|>|<)\s*(?P<value>\S.*?)\s*$"
+)
+BASELINE_PATTERN = re.compile(
+    r"^(?P<statistic>p\d{1,2}|median|mean|min|max)"
+    r"(?:\s*(?P<sign>[+-])\s*(?P<percent>\d+(?:\.\d+)?)%)?$"
+)
+
+
+class Rule(object):
+    """
+    One notification condition, such as ``runtime > p95`` or
+    ``status != success``.
+
+    A rule compares a job's ``status``, ``exit_code``, ``runtime`` (seconds),
+    or ``peak_rss`` (bytes) with a literal value or, for the numeric metrics,
+    a statistic of the command's recent successful runs: ``p50`` through
+    ``p99``, ``median``, ``mean``, ``min``, or ``max``, optionally adjusted by
+    a percentage, e.g. ``peak_rss > median+20%``.
+
+    Parameters
+    ----------
+    text : str
+        Rule expression
+    """
+    def __init__(self, text):
+        match = RULE_PATTERN.match(text)
+        if match is None or match["metric"] not in METRICS:
+            raise exceptions.JortException(
+                f"Rule must look like `<{'|'.join(METRICS)}> <operator> <value>`: `{text}`"
+            )
+        self.text = text.strip()
+        self.metric = match["metric"]
+        self.operator = match["operator"]
+        value = match["value"]
+        self.statistic = None
+        self.percent = 0.0
+        if self.metric == "status":
+            if self.operator not in ("==", "!="):
+                raise exceptions.JortException(f"Status rules compare with == or !=: `{text}`")
+            self.value = value
+            return
+        baseline = BASELINE_PATTERN.match(value)
+        if baseline is not None:
+            if self.metric == "exit_code":
+                raise exceptions.JortException(f"Exit codes have no baseline: `{text}`")
+            self.statistic = baseline["statistic"]
+            if baseline["percent"] is not None:
+                self.percent = float(baseline["percent"]) * (-1 if baseline["sign"] == "-" else 1)
+            self.value = None
+            return
+        try:
+            self.value = float(value)
+        except ValueError:
+            raise exceptions.JortException(f"Rule value must be a number or a baseline "
+                                           f"statistic such as p95 or median+20%: `{text}`")
+
+    def __repr__(self):
+        return f"Rule({self.text!r})"
+
+    def threshold(self, history):
+        """Return the value compared against, or ``None`` without enough history."""
+        if self.statistic is None:
+            return self.value
+        values = sorted(value for value in history[self.metric] if value is not None)
+        if len(values) < MIN_BASELINE_RUNS:
+            return None
+        if self.statistic == "mean":
+            value = sum(values) / len(values)
+        elif self.statistic == "min":
+            value = values[0]
+        elif self.statistic == "max":
+            value = values[-1]
+        else:
+            percentile = 50 if self.statistic == "median" else int(self.statistic[1:])
+            value = analytics._interpolate(values, percentile / 100)
+        return value * (1 + self.percent / 100)
+
+    def evaluate(self, payload, history):
+        """
+        Check the rule against a finished job.
+
+        Returns
+        -------
+        alert : str or None
+            Description of the match with the baseline numbers, or ``None``
+            if the rule does not match
+        """
+        if self.metric == "peak_rss":
+            actual = (payload.get("metrics") or {}).get("peak_rss_bytes")
+        else:
+            actual = payload.get(self.metric)
+        threshold = self.threshold(history)
+        if actual is None or threshold is None or not OPERATORS[self.operator](actual, threshold):
+            return None
+        if self.metric == "status":
+            return f"status is {actual} ({self.text})"
+        if self.statistic is None:
+            return f"{METRICS[self.metric]} {_format(self.metric, actual)} {self.operator} {_format(self.metric, threshold)}"
+        runs = sum(value is not None for value in history[self.metric])
+        baseline = self.statistic
+        if self.percent:
+            baseline += f"{self.percent:+g}%"
+        return (f"{METRICS[self.metric]} {_format(self.metric, actual)} {self.operator} "
+                f"{baseline} {_format(self.metric, threshold)} of the last {runs} successful runs")
+
+
+def _format(metric, value):
+    if metric == "runtime":
+        return datetime_utils.format_timespan(value)
+    if metric == "peak_rss":
+        return analytics._format_bytes(value)
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def parse_rules(texts):
+    """Parse rule expressions, raising :class:`JortException` on the first invalid one."""
+    return [text if isinstance(text, Rule) else Rule(text) for text in texts or []]
+
+
+def evaluate(rules, payload, baseline_runs=BASELINE_RUNS):
+    """
+    Return alerts for the rules a finished job matches.
+
+    Baselines are the command's newest ``baseline_runs`` successful saved runs,
+    found by ``command_hash``; the job itself is not among them as long as it
+    is evaluated before it is saved.
+    """
+    rules = parse_rules(rules)
+    history = {"runtime": [], "peak_rss": []}
+    if payload.get("command_hash") and any(rule.statistic for rule in rules):
+        for run in database.recent_runs(payload["command_hash"], limit=baseline_runs):
+            history["runtime"].append(run["runtime"])
+            history["peak_rss"].append(run["peak_rss"])
+    alerts = (rule.evaluate(payload, history) for rule in rules)
+    return [alert for alert in alerts if alert is not None]
@@ -0,0 +1,88 @@
+"""Mergeable quantile sketch with bounded relative error."""
+
+import json
+import math
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch for positive values such as runtimes.
+
+    Each value is counted in a bucket whose bounds grow geometrically, so any
+    quantile is returned within ``relative_accuracy`` of a true sample value
+    while the sketch stays a few hundred buckets wide at most. Sketches with
+    the same accuracy merge exactly by adding bucket counts, which lets daily
+    rollups combine into summaries over any range of days.
+
+    Parameters
+    ----------
+    relative_accuracy : float, optional
+        Maximum relative error of reported quantiles
+    """
+    # Values at or below this are counted as zero.
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        self.buckets = {}
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value, count=1):
+        """Count ``value``, ``count`` times."""
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        """Add the counts of another sketch with the same accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def quantile(self, q):
+        """
+        Return the approximate ``q`` quantile, for ``q`` between 0 and 1.
+
+        Returns ``None`` for an empty sketch.
+        """
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # The bucket midpoint in relative terms bounds the error.
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_json(self):
+        return json.dumps({
+            "accuracy": self.relative_accuracy,
+            "zero": self.zero_count,
+            "buckets": {str(index): count for index, count in sorted(self.buckets.items())},
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        sketch = cls(data["accuracy"])
+        sketch.zero_count = data["zero"]
+        sketch.buckets = {int(index): count for index, count in data["buckets"].items()}
+        return sketch
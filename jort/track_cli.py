@@ -19,37 +19,34 @@ from . import config
 from . import database
 from . import datetime_utils
 from . import exceptions
+from . import fingerprint
+from . import gitrev
+from . import liveness
+from . import phases
 from . import reporting_callbacks
+from . import rules
 from . import tracker
 
 
-def _notification_callbacks(send_text=False, send_email=False, include_print=True):
+def _notification_callbacks(send_text=False, send_email=False, include_print=True,
+                            send_webhook=False):
     """Build independent, lazy-validating notification callbacks."""
     callbacks = [reporting_callbacks.PrintReport()] if include_print else []
     if send_email:
         callbacks.append(reporting_callbacks.EmailNotification())
     if send_text:
         callbacks.append(reporting_callbacks.TextNotification())
+    if send_webhook:
+        callbacks.append(reporting_callbacks.WebhookNotification())
     return callbacks
 
 
-def _git_sha(cwd):
-    try:
-        result = subprocess.run(
-            ["git", "rev-parse", "HEAD"],
-            cwd=cwd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True,
-            timeout=2,
-            check=False,
-        )
-    except (OSError, subprocess.SubprocessError):
-        return None
-    return result.stdout.strip() if result.returncode == 0 else None
+def _notification_channels(send_text=False, send_email=False, send_webhook=False):
+    return [channel for channel, enabled in (("email", send_email), ("text", send_text),
+                                             ("webhook", send_webhook)) if enabled]
 
 
-def _command_metadata(command, use_shell, cwd=None):
+def _command_metadata(command, use_shell, cwd=None, inputs=None):
     effective_cwd = os.path.abspath(cwd or os.getcwd())
     if not os.path.isdir(effective_cwd):
         raise exceptions.JortException(f"Working directory does not exist: {effective_cwd}")
@@ -61,20 +58,25 @@ def _command_metadata(command, use_shell, cwd=None):
     else:
         display_command = str(command)
         argv = [display_command] if use_shell else shlex.split(display_command)
-    fingerprint = hashlib.sha256(
-        json.dumps(
-            {"command": display_command, "argv": argv, "shell": use_shell,
-             "cwd": effective_cwd},
-            sort_keys=True,
-        ).encode("utf-8")
+    identity = {"command": display_command, "argv": argv, "shell": use_shell,
+                "cwd": effective_cwd}
+    extra = {"shell": bool(use_shell)}
+    if inputs:
+        # Declared input contents are part of the cache key, so a --unique job
+        # reruns whenever any input changes.
+        identity["inputs"], extra["inputs"] = fingerprint.inputs_fingerprint(
+            inputs, effective_cwd
+        )
+    command_hash = hashlib.sha256(
+        json.dumps(identity, sort_keys=True).encode("utf-8")
     ).hexdigest()
     return {
         "command": display_command,
         "cwd": effective_cwd,
         "argv": argv,
-        "git_sha": _git_sha(effective_cwd),
-        "command_hash": fingerprint,
-        "metadata": {"shell": bool(use_shell)},
+        "git_sha": gitrev.head_sha(effective_cwd),
+        "command_hash": command_hash,
+        "metadata": extra,
     }
 
 
@@ -134,15 +136,32 @@ def _process_metrics(process, peak_rss=0):
     return metrics
 
 
+def _heartbeat(payload, persist, heartbeat_seconds):
+    """Return a heartbeat for a saved running job, or None when disabled."""
+    if not persist or heartbeat_seconds == 0:
+        return None
+    return liveness.Heartbeat(payload, interval=heartbeat_seconds or liveness.HEARTBEAT_SECONDS)
+
+
 def _is_successful_duplicate(command_hash, session_id, command):
+    # Skipped rows only echo an earlier success. Each lookup is served by an
+    # index; job names are only compared for rows saved before command
+    # fingerprints existed.
     database.ensure_database()
-    with contextlib.closing(sqlite3.connect(config._get_database_path())) as connection:
+    with contextlib.closing(sqlite3.connect(config._get_database_path(),
+                                            timeout=30)) as connection:
         row = connection.execute(
-            "SELECT status FROM jobs WHERE session_id = ? "
-            "AND (command_hash = ? OR job_name = ?) "
-            "ORDER BY date_created DESC LIMIT 1",
-            (session_id, command_hash, command),
+            "SELECT status FROM jobs WHERE session_id = ? AND command_hash = ? "
+            "AND status != 'skipped' ORDER BY date_created DESC LIMIT 1",
+            (session_id, command_hash),
         ).fetchone()
+        if row is None:
+            row = connection.execute(
+                "SELECT status FROM jobs WHERE session_id = ? AND command_hash IS NULL "
+                "AND job_name = ? AND status != 'skipped' "
+                "ORDER BY date_created DESC LIMIT 1",
+                (session_id, command),
+            ).fetchone()
     return row is not None and row[0] == "success"
 
 
@@ -161,22 +180,62 @@ def track_new(command,
               max_output_bytes=None,
               quiet=False,
               job_id=None,
-              timeout_seconds=None):
+              timeout_seconds=None,
+              extra_metadata=None,
+              inputs=None,
+              outputs=None,
+              background_notifications=False,
+              send_webhook=False,
+              notify_if=None,
+              baseline_runs=None,
+              heartbeat_seconds=None,
+              phase_regex=None):
     """Run and track a new command, returning its completed payload.
 
     The original dictionary-based return value is preserved. New fields include
     ``exit_code``, ``signal``, ``cwd``, ``argv``, ``git_sha``, ``command_hash``,
-    ``metrics``, and per-channel ``notifications``.
+    ``metrics``, and per-channel ``notifications``. ``extra_metadata`` is merged
+    into the stored ``metadata`` dictionary.
+
+    ``inputs`` are glob patterns whose file contents are folded into
+    ``command_hash``, and ``outputs`` are paths the command produces. With
+    ``unique``, the command is skipped only when its inputs are unchanged since
+    the last successful run and every output exists.
+
+    With ``background_notifications``, email and text notifications are sent
+    from background threads and reported as ``pending`` in the returned
+    payload; call :func:`jort.flush_notifications` to wait for them.
+    ``send_webhook`` posts the result to the configured webhook URL.
+
+    ``notify_if`` rules, such as ``runtime > p95``, limit notifications to
+    runs that match one, judged against the command's last ``baseline_runs``
+    successful runs; see :mod:`jort.rules`.
+
+    Saved jobs that run longer than ``heartbeat_seconds`` (by default
+    ``liveness.HEARTBEAT_SECONDS``; 0 disables) are also saved while running,
+    once per interval, with their runtime, memory use, and last output time;
+    see :class:`jort.liveness.Heartbeat`.
+
+    With ``phase_regex``, output lines matching it, such as ``^== (\\w+) ==``,
+    split the runtime into phases named by the first group, which are stored
+    as ``metadata["phases"]``; see :class:`jort.phases.PhaseTimer`.
     """
+    notify_if = rules.parse_rules(notify_if)
+    if phase_regex is not None:
+        phase_regex = phases.compile_pattern(phase_regex)
     if not command or (isinstance(command, str) and not command.strip()):
         raise exceptions.JortException("A command is required")
     if timeout_seconds is not None and timeout_seconds <= 0:
         raise exceptions.JortException("timeout_seconds must be positive")
-    metadata = _command_metadata(command, use_shell, cwd=cwd)
+    metadata = _command_metadata(command, use_shell, cwd=cwd, inputs=inputs)
+    if outputs:
+        metadata["metadata"]["outputs"] = list(outputs)
+    if extra_metadata:
+        metadata["metadata"].update(extra_metadata)
     command = metadata["command"]
-    persist = to_db or unique or send_email or send_text
+    persist = to_db or unique or send_email or send_text or send_webhook
     callbacks = _notification_callbacks(send_text=send_text, send_email=send_email,
-                                        include_print=not quiet)
+                                        include_print=not quiet, send_webhook=send_webhook)
     if save_filename or store_stdout:
         os.makedirs(config._get_data_dir(), mode=0o700, exist_ok=True)
         stdout_fn = f"{shortuuid.uuid()}.txt"
@@ -185,8 +244,10 @@ def track_new(command,
         stdout_fn = None
         stdout_path = None
 
-    tr = tracker.Tracker(to_db=persist, session_name=session_name)
-    if unique and _is_successful_duplicate(
+    tr = tracker.Tracker(to_db=persist, session_name=session_name,
+                         background_notifications=background_notifications)
+    outputs_present = not fingerprint.missing_outputs(outputs or [], metadata["cwd"])
+    if unique and outputs_present and _is_successful_duplicate(
         metadata["command_hash"], tr.session_id, command
     ):
         payload = {
@@ -211,11 +272,7 @@ def track_new(command,
             database.save_job(payload)
         return payload
 
-    notification_channels = []
-    if send_email:
-        notification_channels.append("email")
-    if send_text:
-        notification_channels.append("text")
+    notification_channels = _notification_channels(send_text, send_email, send_webhook)
     tr.start(
         name=command,
         job_id=job_id,
@@ -227,6 +284,8 @@ def track_new(command,
     )
     payload = tr.open_block_payloads[command]
     payload["signal"] = None
+    heartbeat = _heartbeat(payload, persist, heartbeat_seconds)
+    phase_timer = phases.PhaseTimer(phase_regex, tr, command) if phase_regex else None
     output_stream = None
     capture_state = {"bytes": 0, "truncated": False}
     metric_state = {"peak_rss": 0}
@@ -255,11 +314,13 @@ def track_new(command,
         def sample_metrics():
             while not metric_stop.is_set():
                 try:
-                    metric_state["peak_rss"] = max(
-                        metric_state["peak_rss"], process.memory_info().rss
-                    )
+                    rss = process.memory_info().rss
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     return
+                metric_state["peak_rss"] = max(metric_state["peak_rss"], rss)
+                if heartbeat is not None:
+                    heartbeat.beat(metrics={"rss_bytes": rss,
+                                            "peak_rss_bytes": metric_state["peak_rss"]})
                 metric_stop.wait(0.1)
 
         metric_thread = threading.Thread(target=sample_metrics, daemon=True)
@@ -296,6 +357,10 @@ def track_new(command,
                 if verbose:
                     from pprint import pprint
                     pprint(payload)
+            if heartbeat is not None:
+                heartbeat.output()
+            if phase_timer is not None:
+                phase_timer.line(line)
             if not quiet:
                 sys.stdout.write(line)
                 sys.stdout.flush()
@@ -306,6 +371,8 @@ def track_new(command,
         if process.stdout is not None:
             process.stdout.close()
         process.wait()
+        if phase_timer is not None:
+            phase_timer.close()
         if timed_out.is_set():
             payload["status"] = "timeout"
             payload["error_message"] = f"process exceeded {timeout_seconds} seconds"
@@ -322,19 +389,22 @@ def track_new(command,
         payload["exit_code"] = None
     finally:
         metric_stop.set()
+        if heartbeat is not None:
+            heartbeat.close()
         if metric_thread is not None:
             metric_thread.join(timeout=1)
         if "timer" in locals() and timer is not None:
             timer.cancel()
         if output_stream is not None:
             output_stream.close()
+        if phase_timer is not None:
+            payload["metadata"]["phases"] = phase_timer.close()
 
-    payload = tr.stop(callbacks=callbacks)
     if save_filename and stdout_path is not None:
+        # Move the capture before notifying, so attachments read its final path.
         shutil.move(stdout_path, save_filename)
         payload["stdout_fn"] = os.path.abspath(save_filename)
-        if persist:
-            database.save_job(payload)
+    payload = tr.stop(callbacks=callbacks, notify_if=notify_if, baseline_runs=baseline_runs)
     if verbose:
         from pprint import pprint
         pprint(payload)
@@ -349,9 +419,15 @@ def track_existing(pid,
                    verbose=False,
                    update_period=-1,
                    job_id=None,
-                   timeout_seconds=None):
+                   timeout_seconds=None,
+                   send_webhook=False,
+                   notify_if=None,
+                   baseline_runs=None,
+                   heartbeat_seconds=None):
     """Track an existing process, reporting unknown exit status explicitly."""
-    callbacks = _notification_callbacks(send_text=send_text, send_email=send_email)
+    notify_if = rules.parse_rules(notify_if)
+    callbacks = _notification_callbacks(send_text=send_text, send_email=send_email,
+                                        send_webhook=send_webhook)
     try:
         process = psutil.Process(int(pid))
         command_line = process.cmdline()
@@ -367,12 +443,9 @@ def track_existing(pid,
         "command_hash": hashlib.sha256(command.encode()).hexdigest(),
         "metadata": {"existing_pid": int(pid), "exit_status_known": False},
         "stdout_fn": None,
-        "notification_channels": [
-            channel for channel, enabled in (("email", send_email), ("text", send_text))
-            if enabled
-        ],
+        "notification_channels": _notification_channels(send_text, send_email, send_webhook),
     }
-    persist = to_db or send_email or send_text
+    persist = to_db or send_email or send_text or send_webhook
     tr = tracker.Tracker(to_db=persist, session_name=session_name)
     tr.start(
         name=command,
@@ -383,6 +456,8 @@ def track_existing(pid,
     payload = tr.open_block_payloads[command]
     payload["pid"] = int(pid)
     payload["_monotonic_start"] = time.monotonic() - max(0.0, time.time() - create_time)
+    heartbeat = _heartbeat(payload, persist, heartbeat_seconds)
+    peak_rss = 0
     started_at = time.monotonic()
     temp_start = started_at
     timed_out = False
@@ -409,7 +484,18 @@ def track_existing(pid,
             _terminate_process(process)
             timed_out = True
             break
+        if heartbeat is not None:
+            try:
+                rss = process.memory_info().rss
+                peak_rss = max(peak_rss, rss)
+                heartbeat.beat(metrics={"rss_bytes": rss, "peak_rss_bytes": peak_rss})
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                heartbeat.beat()
         time.sleep(0.5)
+    if heartbeat is not None:
+        heartbeat.close()
+    if peak_rss:
+        payload["metrics"] = {"peak_rss_bytes": peak_rss}
 
     returncode = getattr(process, "returncode", None)
     if timed_out:
@@ -421,4 +507,4 @@ def track_existing(pid,
     else:
         payload["status"] = "finished"
         payload["error_message"] = None
-    return tr.stop(callbacks=callbacks)
+    return tr.stop(callbacks=callbacks, notify_if=notify_if, baseline_runs=baseline_runs)
@@ -16,6 +16,8 @@ from . import block
 from . import datetime_utils
 from . import exceptions
 from . import database
+from . import dispatch
+from . import rules
         
 
 def _get_linenumber():
@@ -38,6 +40,10 @@ class Tracker(object):
         Options for verbosity. 0 for none, 1 for INFO, and 2 for DEBUG.
     to_db : bool, optional
         Save all block runtime details to database
+    background_notifications : bool, optional
+        Deliver notification callbacks other than printing on background
+        threads, so stopping a block does not wait for them; see
+        :func:`jort.flush_notifications`
 
     :ivar date_created: time of initialization
     :ivar machine: name of local machine
@@ -46,8 +52,10 @@ class Tracker(object):
     :ivar log_name: log filename
     :iver to_db: option to save all blocks to database
     :iver session_name: name of job session
+    :ivar background_notifications: option to deliver notifications in the background
     """
-    def __init__(self, session_name=None, log_name="tracker.log", verbose=0, to_db=False):
+    def __init__(self, session_name=None, log_name="tracker.log", verbose=0, to_db=False,
+                 background_notifications=False):
         self.date_created = datetime_utils.get_iso_date()
         self.machine = socket.gethostname() #config._get_config_data().get("machine")
         self.blocks = {}
@@ -58,6 +66,7 @@ class Tracker(object):
         self.session_id = shortuuid.uuid()
         self.session_configured = False
         self.to_db = to_db
+        self.background_notifications = background_notifications
         if self.to_db:
             self._configure_db_session()
 
@@ -82,22 +91,9 @@ class Tracker(object):
         Manage session name and id. If session name is provided, get the id from database.
         """
         try:
-            database.ensure_database()
-            with contextlib.closing(sqlite3.connect(config._get_database_path())) as con:
-                cur = con.cursor()
-                if self.session_name is not None:
-                    sql = "SELECT session_id FROM sessions WHERE session_name = ?"
-                    res = cur.execute(sql, (self.session_name,))
-                    row = res.fetchone()
-                    if row is not None:
-                        self.session_id = row[0]
-                else:
-                    self.session_name = self.session_id
-                    sql = (
-                        "INSERT INTO sessions VALUES(?, ?)"
-                    )
-                    cur.execute(sql, (self.session_id, self.session_name))
-                    con.commit()
+            self.session_id = database.get_or_create_session(self.session_name)
+            if self.session_name is None:
+                self.session_name = self.session_id
             self.session_configured = True
         except sqlite3.OperationalError as e:
             raise exceptions.JortException("Missing database - make sure to initialize with `jort.init()` or `jort init`") from e
@@ -169,7 +165,8 @@ class Tracker(object):
         logger = logging.getLogger(f"{name}.start")
         logger.debug("Profiling block started.")
         
-    def stop(self, name=None, callbacks=None, to_db=False):
+    def stop(self, name=None, callbacks=None, to_db=False, background=None,
+             notify_if=None, baseline_runs=None):
         """
         Close block and stop timer. Store start, stop, and elapsed times.
         Process job status payload and execute notification callbacks.
@@ -185,8 +182,26 @@ class Tracker(object):
             List of optional notification callbacks
         to_db : bool, optional
             Save block runtime details to database
+        background : bool, optional
+            Deliver notifications in the background, overriding the tracker's
+            ``background_notifications``. Their results are reported as
+            ``pending`` and filled in, in the payload and the database, once
+            delivered. Saved jobs' notifications for channels with a digest
+            window, see ``jort config digest``, are always left pending for
+            ``jort notify drain``.
+        notify_if : list, optional
+            Notification rules, see :mod:`jort.rules`. When given, channels
+            other than ``print`` are only sent if a rule matches, and the
+            matching rules are reported in the payload's ``alerts``. Rules are
+            evaluated before the job is saved, so it is not part of its own
+            baseline.
+        baseline_runs : int, optional
+            Number of recent successful runs of the same command to compare
+            against, by default ``rules.BASELINE_RUNS``
         """
         callbacks = callbacks or []
+        if background is None:
+            background = self.background_notifications
         if name is None:
             name = list(self.open_block_payloads.keys())[-1]
         elif name not in self.open_block_payloads:
@@ -207,41 +222,46 @@ class Tracker(object):
         logger.info(f"Elapsed time: {formatted_runtime}")
 
         persist = self.to_db or to_db
+        suppressed = False
+        if notify_if:
+            alerts = rules.evaluate(notify_if, payload,
+                                    baseline_runs=baseline_runs or rules.BASELINE_RUNS)
+            if alerts:
+                payload["alerts"] = alerts
+            else:
+                suppressed = True
         if persist:
             if not self.session_configured:
                 self._configure_db_session()
-            with contextlib.closing(sqlite3.connect(config._get_database_path())) as con:
-                con.execute(
-                    "INSERT OR IGNORE INTO sessions(session_id, session_name) VALUES(?, ?)",
-                    (self.session_id, self.session_name),
-                )
-                con.commit()
+            payload["session_id"] = self.session_id
             database.save_job(payload)
-            database.enqueue_notifications(payload)
+            if not suppressed:
+                database.enqueue_notifications(payload)
 
         notification_results = {}
+        queued = []
+        immediate = []
         for callback in callbacks:
-            channel = getattr(callback, "channel", callback.__class__.__name__.lower())
-            try:
-                result = callback.execute(payload=payload)
-                notification_results[channel] = {
-                    "status": "sent",
-                    "result": result,
-                }
-                if persist and channel != "print":
-                    database.update_notification(payload["job_id"], channel, "sent")
-            except Exception as error:
-                notification_results[channel] = {
-                    "status": "failed",
-                    "error": str(error),
-                }
-                if persist and channel != "print":
-                    database.update_notification(
-                        payload["job_id"], channel, "failed", str(error)
-                    )
+            channel = dispatch.channel_of(callback)
+            if suppressed and channel != "print":
+                notification_results[channel] = {"status": "skipped"}
+            elif persist and channel != "print" and config.digest_seconds(channel):
+                # Sent with other completions by `jort notify drain`.
+                notification_results[channel] = {"status": "pending", "digest": True}
+            elif background and channel != "print":
+                notification_results[channel] = {"status": "pending"}
+                queued.append(callback)
+            else:
+                notification_results[channel] = None
+                immediate.append(callback)
+        # Channels are sent concurrently, each within its own timeout.
+        notification_results.update(dispatch.deliver_all(immediate, payload, persist=persist))
         payload["notifications"] = notification_results
         if persist:
             database.save_job(payload)
+        # Queue only after saving, so a quick delivery is not overwritten.
+        for callback in queued:
+            dispatch.submit(callback, payload, persist=persist)
         return payload
         
     def remove(self, name=None):
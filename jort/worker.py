@@ -25,6 +25,10 @@ def main():
             session_name=spec.get("session_name"),
             send_text=spec.get("send_text", False),
             send_email=spec.get("send_email", False),
+            send_webhook=spec.get("send_webhook", False),
+            notify_if=spec.get("notify_if"),
+            baseline_runs=spec.get("baseline_runs"),
+            heartbeat_seconds=spec.get("heartbeat_seconds"),
             job_id=spec.get("job_id"),
             timeout_seconds=spec.get("timeout_seconds"),
         )
@@ -35,9 +39,17 @@ def main():
             store_stdout=spec.get("store_stdout", False),
             to_db=True,
             session_name=spec.get("session_name"),
+            unique=spec.get("unique", False),
             send_text=spec.get("send_text", False),
             send_email=spec.get("send_email", False),
+            send_webhook=spec.get("send_webhook", False),
+            notify_if=spec.get("notify_if"),
+            baseline_runs=spec.get("baseline_runs"),
+            heartbeat_seconds=spec.get("heartbeat_seconds"),
+            phase_regex=spec.get("phase_regex"),
             cwd=spec.get("cwd"),
+            inputs=spec.get("inputs"),
+            outputs=spec.get("outputs"),
             max_output_bytes=spec.get("max_output_bytes"),
             quiet=True,
             job_id=spec.get("job_id"),
@@ -0,0 +1,32 @@
+"""Shared test case that keeps jort's configuration and database in a temporary directory."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from jort import config
+
+
+class IsolatedTestCase(unittest.TestCase):
+    """
+    Test case with jort's configuration, data directory, and database in a
+    fresh temporary directory, removed after each test.
+
+    :ivar directory: temporary directory path
+    :ivar database_path: path of the test database
+    """
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.database_path = os.path.join(self.directory, "jort.db")
+        for patcher in (
+            patch.object(config, "JORT_DIR", self.directory),
+            patch.object(config, "CONFIG_PATH", os.path.join(self.directory, "config")),
+            patch.object(config, "_get_data_dir", return_value=self.directory),
+            patch.object(config, "_get_database_path", return_value=self.database_path),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -0,0 +1,140 @@
+"""Regression tests for runtime statistics and columnar export."""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from jort import analytics
+from jort import database
+from jort import retention
+
+from isolated import IsolatedTestCase
+
+
+class RuntimeStatsTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        session_id = database.get_or_create_session("nightly")
+        # `make` slows down by one second per day; `test` is flat.
+        for day in range(1, 11):
+            for name, runtime in (("make", float(day)), ("test", 2.0)):
+                database.save_job({
+                    "job_id": f"{name}-{day}",
+                    "session_id": session_id,
+                    "name": name,
+                    "status": "success",
+                    "machine": "ci",
+                    "date_created": f"2026-01-{day:02d}T00:00:00+00:00",
+                    "runtime": runtime,
+                    "command_hash": f"hash-{name}",
+                    "metrics": {"peak_rss_bytes": 1000 * day},
+                })
+        database.save_job({
+            "job_id": "failed",
+            "session_id": session_id,
+            "name": "make",
+            "status": "error",
+            "date_created": "2026-01-11T00:00:00+00:00",
+            "runtime": 500.0,
+            "command_hash": "hash-make",
+        })
+
+    def test_groups_by_command_with_percentiles_and_trend(self):
+        groups = analytics.summarize(by="command", exact=True)
+        self.assertEqual([group["name"] for group in groups], ["make", "test"])
+        make = groups[0]
+        self.assertEqual(make["command_hash"], "hash-make")
+        self.assertEqual(make["count"], 10)
+        self.assertAlmostEqual(make["mean"], 5.5)
+        self.assertAlmostEqual(make["p50"], 5.5)
+        self.assertAlmostEqual(make["p95"], 9.55)
+        self.assertAlmostEqual(make["trend_per_day"], 1.0)
+        self.assertEqual(make["peak_rss_bytes"], 10000)
+        self.assertAlmostEqual(groups[1]["trend_per_day"], 0.0)
+        self.assertEqual(database.get_job("make-3")["metrics"], {"peak_rss_bytes": 3000})
+
+    def test_rollups_match_scans_and_survive_pruning(self):
+        exact = analytics.summarize(by="command", exact=True, since="2026-01-03")
+        samples = {group["command_hash"]: sorted(
+            job["runtime"] for job in database.list_jobs(command_hash=group["command_hash"],
+                                                         status="success",
+                                                         since="2026-01-03"))
+            for group in exact}
+        retention.prune_jobs(older_than="2026-01-09")
+        rolled = analytics.summarize(by="command", since="2026-01-03")
+        self.assertEqual([group["command_hash"] for group in rolled], ["hash-make", "hash-test"])
+        for expected, actual in zip(exact, rolled):
+            for key in ("count", "min", "max", "peak_rss_bytes"):
+                self.assertEqual(actual[key], expected[key])
+            for key in ("mean", "stdev", "trend_per_day"):
+                self.assertAlmostEqual(actual[key], expected[key])
+            values = samples[expected["command_hash"]]
+            for q in (50, 95, 99):
+                # Nearest-rank, rounded down, within the sketch's 1% accuracy.
+                nearest = values[int(q / 100 * (len(values) - 1))]
+                self.assertAlmostEqual(actual[f"p{q}"], nearest, delta=nearest * 0.01)
+        # Sub-day bounds are not rounded out to whole days of rollups.
+        self.assertEqual(analytics.summarize(command_hash="hash-make",
+                                             since="2026-01-09T12:00:00+00:00")[0]["count"], 1)
+        # Re-saving a finished job does not count it twice.
+        database.save_job({**database.get_job("make-9"), "notifications": {"email": {}}})
+        self.assertEqual(analytics.summarize(command_hash="hash-make")[0]["count"], 10)
+
+    def test_pure_python_fallback_matches(self):
+        expected = analytics.summarize(by="machine", since="2026-01-03")
+        with patch.object(analytics, "numpy", None):
+            actual = analytics.summarize(by="machine", since="2026-01-03")
+        self.assertEqual(len(actual), 1)
+        self.assertEqual(actual[0]["count"], 16)
+        for key, value in expected[0].items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(actual[0][key], value)
+            else:
+                self.assertEqual(actual[0][key], value)
+
+    def test_compare_flags_significant_regressions(self):
+        for session, slowdown in (("before", 1.0), ("after", 1.5)):
+            session_id = database.get_or_create_session(session)
+            for index in range(8):
+                for name, runtime in (("make", slowdown * (1 + index / 100)),
+                                      ("test", 2.0 + index / 100)):
+                    database.save_job({
+                        "job_id": f"{session}-{name}-{index}",
+                        "session_id": session_id,
+                        "name": name,
+                        "status": "success",
+                        "date_created": "2026-02-01T00:00:00+00:00",
+                        "runtime": runtime,
+                        "command_hash": f"hash-{name}",
+                        "metrics": {"peak_rss_bytes": 1000 + index},
+                    })
+        comparisons = analytics.compare_sessions("before", "after", seed=1)
+        verdicts = {comparison["name"]: comparison["verdict"] for comparison in comparisons}
+        self.assertEqual(verdicts, {"make": "regression", "test": "unchanged"})
+        make = comparisons[0]["runtime"]
+        self.assertAlmostEqual(make["change_percent"], 50.0)
+        self.assertLess(make["p_value"], 0.001)
+        self.assertGreater(make["ci_low_percent"], 40.0)
+
+        runner = CliRunner()
+        result = runner.invoke(analytics.compare, ["before", "after", "--seed", "1"])
+        self.assertEqual(result.exit_code, 1)
+        result = runner.invoke(analytics.compare, ["before", "after", "--threshold", "60"])
+        self.assertEqual(result.exit_code, 0, result.output)
+
+    def test_parquet_export(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        path = os.path.join(self.directory, "jobs.parquet")
+        self.assertEqual(analytics.write_parquet(path, batch_size=7, status="success"), 20)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.num_rows, 20)
+        self.assertEqual(table.column("peak_rss_bytes").to_pylist()[:2], [1000, 1000])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Regression tests for array jobs run under one parent."""
+
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from jort import arrays
+from jort import database
+from jort import exceptions
+from jort import jort_exe
+from jort import reporting_callbacks
+from jort import track_cli
+
+from isolated import IsolatedTestCase
+
+
+class RecordingCallback:
+    channel = "email"
+
+    def __init__(self):
+        self.digests = []
+
+    def execute_digest(self, payloads):
+        self.digests.append(payloads)
+        return {"jobs": len(payloads)}
+
+
+class ArrayJobTests(IsolatedTestCase):
+    def test_ranges_and_input_files(self):
+        self.assertEqual(arrays.parse_range("1-3"), ["1", "2", "3"])
+        self.assertEqual(arrays.parse_range("0-20:10, 7"), ["0", "10", "20", "7"])
+        for text in ("3-1", "a-b", "1-", ""):
+            with self.assertRaises(exceptions.JortException):
+                arrays.parse_range(text)
+        path = os.path.join(self.directory, "inputs.txt")
+        with open(path, "w") as stream:
+            stream.write("a b.csv\n\nc.csv\n")
+        self.assertEqual(arrays.load_inputs(path), ["a b.csv", "c.csv"])
+        self.assertEqual(arrays.expand([sys.executable, "{i}"], "a b.csv"),
+                         [sys.executable, "a b.csv"])
+
+    def test_instances_are_saved_as_jobs_sharing_an_array_id(self):
+        command = [sys.executable, "-c", "import sys; sys.exit(sys.argv[1] == '4')", "{i}"]
+        with patch.object(database, "save_jobs", wraps=database.save_jobs) as save_jobs, \
+                patch.object(database, "save_job") as save_job:
+            result = arrays.run_array(command, arrays.parse_range("1-6"), parallel=3,
+                                      array_id="scan")
+        # Instances are saved in batches by the parent, never one by one.
+        save_job.assert_not_called()
+        self.assertLess(save_jobs.call_count, 6)
+
+        self.assertEqual((result["status"], result["instances"]), ("error", 6))
+        self.assertEqual(result["counts"], {"success": 5, "error": 1})
+        self.assertEqual([(failure["value"], failure["exit_code"])
+                          for failure in result["failures"]], [("4", 1)])
+        self.assertLessEqual(result["runtime"]["min"], result["runtime"]["median"])
+        jobs = database.list_jobs(session="scan", full_details=True)
+        self.assertEqual(len(jobs), 6)
+        metadata = sorted((json.loads(job["metadata_json"])["array_index"], job["job_name"])
+                          for job in jobs)
+        self.assertEqual(metadata[3][0], 3)
+        self.assertTrue(metadata[3][1].endswith(" 4"))
+
+        with self.assertRaises(exceptions.JortException):
+            arrays.run_array("echo", ["1"])
+
+    def test_cli_sends_one_digest_for_the_array(self):
+        email = RecordingCallback()
+        with patch.object(reporting_callbacks, "EmailNotification", return_value=email):
+            result = CliRunner().invoke(jort_exe.cli, [
+                "track", "--array", "1-5", "--parallel", "2", "--json", "-e", "--argv", "--",
+                sys.executable, "-c", "print('{i}')",
+            ])
+        self.assertEqual(result.exit_code, 0, result.output)
+        summary = json.loads(result.output)
+        self.assertEqual(summary["counts"], {"success": 5})
+        self.assertEqual(summary["notifications"]["email"]["status"], "sent")
+        self.assertEqual(len(email.digests), 1)
+        self.assertEqual(len(email.digests[0]), 5)
+
+        for option in (["--detach"], ["--heartbeat", "5"], ["--baseline-runs", "3"], ["-v"]):
+            result = CliRunner().invoke(jort_exe.cli,
+                                        ["track", "--array", "1-2", *option, "x {i}"])
+            self.assertEqual(result.exit_code, 2, option)
+
+    def test_inputs_are_expanded_and_unexpected_errors_fail_one_instance(self):
+        for value in ("1", "2"):
+            with open(os.path.join(self.directory, f"in-{value}.txt"), "w") as stream:
+                stream.write(value)
+        track_new = track_cli.track_new
+
+        def move_fails_for_2(command, **kwargs):
+            if command.endswith(" 2"):
+                raise OSError("cannot move captured output")
+            return track_new(command, **kwargs)
+
+        with patch.object(track_cli, "track_new", side_effect=move_fails_for_2):
+            result = arrays.run_array("echo {i}", ["1", "2", "3"], inputs=["in-{i}.txt"],
+                                      cwd=self.directory, array_id="inputs")
+        self.assertEqual(result["counts"], {"error": 2, "success": 1})
+        first = result["payloads"][0]
+        self.assertEqual(list(first["metadata"]["inputs"]), ["in-1.txt"])
+        self.assertEqual(result["failures"][0]["error_message"], "cannot move captured output")
+        # Instance 3 has no input file to fingerprint.
+        self.assertIn("in-3.txt", result["failures"][1]["error_message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+"""Regression tests for job storage, the v2 upgrade, and job queries."""
+
+import contextlib
+import json
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+from jort import config
+from jort import database
+
+from isolated import IsolatedTestCase
+
+
+LEGACY_JOBS = (
+    "CREATE TABLE jobs ("
+    "    job_id TEXT PRIMARY KEY, session_id TEXT, job_name TEXT, status TEXT,"
+    "    machine TEXT, date_created TEXT, date_finished TEXT, runtime REAL,"
+    "    stdout_fn TEXT, error_message TEXT, pid INTEGER, exit_code INTEGER,"
+    "    signal INTEGER, cwd TEXT, argv_json TEXT, git_sha TEXT, metadata_json TEXT,"
+    "    command_hash TEXT, notification_channels_json TEXT, notifications_json TEXT,"
+    "    FOREIGN KEY(session_id) REFERENCES sessions(session_id))"
+)
+
+
+class DatabaseSchemaTests(IsolatedTestCase):
+    def create_legacy_database(self):
+        with contextlib.closing(sqlite3.connect(self.database_path)) as connection:
+            connection.execute("CREATE TABLE sessions (session_id TEXT PRIMARY KEY, session_name TEXT)")
+            connection.execute(LEGACY_JOBS)
+            connection.execute(
+                "CREATE TABLE notifications (notification_id TEXT PRIMARY KEY, job_id TEXT NOT NULL,"
+                " channel TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " error_message TEXT, date_created TEXT NOT NULL, date_modified TEXT NOT NULL,"
+                " UNIQUE(job_id, channel), FOREIGN KEY(job_id) REFERENCES jobs(job_id))"
+            )
+            connection.executemany("INSERT INTO sessions VALUES (?, ?)",
+                                   [("s1", "nightly"), ("s2", "nightly"), ("s3", "other")])
+            for index in range(5):
+                connection.execute(
+                    "INSERT INTO jobs (job_id, session_id, job_name, status, date_created, "
+                    "date_finished, runtime, cwd, argv_json, metadata_json, command_hash) "
+                    "VALUES (?, ?, 'make', 'success', ?, ?, 1.5, '/src', '[\"make\"]', "
+                    "'{\"shell\": false}', 'hash-make')",
+                    (f"job-{index}", "s2" if index % 2 else "s1",
+                     f"2026-01-01T00:00:0{index}.000001+00:00",
+                     f"2026-01-01T00:00:0{index}.500001+00:00"),
+                )
+            connection.execute("PRAGMA user_version = 2")
+            connection.commit()
+
+    def test_v2_database_is_migrated_in_batches(self):
+        self.create_legacy_database()
+        with patch.object(config, "_migrate_legacy_jobs_batch",
+                          wraps=config._migrate_legacy_jobs_batch) as batch:
+            config._initialize_db(batch_size=2)
+        # Three batches of rows and one final batch that drops the old table.
+        self.assertEqual(batch.call_count, 4)
+
+        with contextlib.closing(sqlite3.connect(self.database_path)) as connection:
+            self.assertEqual(connection.execute("PRAGMA user_version").fetchone()[0],
+                             config.SCHEMA_VERSION)
+            tables = {row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertNotIn("jobs_v2", tables)
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM commands").fetchone()[0], 1)
+            self.assertEqual(
+                connection.execute("SELECT DISTINCT session_id FROM jobs").fetchall(), [("s1",)]
+            )
+            self.assertEqual(
+                connection.execute("SELECT SUM(count) FROM runtime_rollups").fetchone()[0], 5
+            )
+            self.assertIsInstance(
+                connection.execute("SELECT date_created FROM jobs LIMIT 1").fetchone()[0], int
+            )
+            notifications_sql = connection.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'notifications'").fetchone()[0]
+            self.assertIn("REFERENCES jobs(job_id)", notifications_sql)
+
+        job = database.get_job("job-3")
+        self.assertEqual(job["date_created"], "2026-01-01T00:00:03.000001+00:00")
+        self.assertEqual(job["date_modified"], "2026-01-01T00:00:03.500001+00:00")
+        self.assertEqual(job["argv"], ["make"])
+        self.assertEqual(job["cwd"], "/src")
+        self.assertEqual(len(database.list_jobs(session="nightly")), 5)
+
+    def test_session_names_are_unique(self):
+        config._initialize_db()
+        first = database.get_or_create_session("nightly")
+        self.assertEqual(database.get_or_create_session("nightly"), first)
+        with contextlib.closing(sqlite3.connect(self.database_path)) as connection:
+            with self.assertRaises(sqlite3.IntegrityError):
+                connection.execute("INSERT INTO sessions VALUES ('other-id', 'nightly')")
+
+    def test_command_details_are_stored_once(self):
+        config._initialize_db()
+        for index in range(3):
+            database.save_job({
+                "job_id": f"job-{index}",
+                "session_id": "s1",
+                "name": "make",
+                "status": "success",
+                "date_created": "2026-01-01T00:00:00+00:00",
+                "date_modified": "2026-01-01T00:00:01+00:00",
+                "cwd": "/src",
+                "argv": ["make"],
+                "command_hash": "hash-make",
+                "metadata": {"shell": False, "inputs": {"a.csv": "digest"}},
+            })
+        with contextlib.closing(sqlite3.connect(self.database_path)) as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM commands").fetchone()[0], 1)
+            metadata = connection.execute("SELECT metadata_json FROM jobs LIMIT 1").fetchone()[0]
+        self.assertEqual(json.loads(metadata), {"shell": False})
+        self.assertEqual(database.get_job("job-2")["metadata"]["inputs"], {"a.csv": "digest"})
+
+    def test_tail_filters_and_keyset_pages_are_applied_in_sql(self):
+        config._initialize_db()
+        session_id = database.get_or_create_session("nightly")
+        for index in range(6):
+            database.save_job({
+                "job_id": f"job-{index}",
+                "session_id": session_id,
+                "name": f"step {index}",
+                "status": "error" if index == 4 else "success",
+                "machine": "a" if index % 2 else "b",
+                "date_created": f"2026-01-0{index + 1}T00:00:00+00:00",
+                "date_modified": f"2026-01-0{index + 1}T00:00:01+00:00",
+            })
+        tail = database.list_jobs(session="nightly", tail=2)
+        self.assertEqual([row["job_id"] for row in tail], ["job-4", "job-5"])
+        self.assertEqual(
+            [row["job_id"] for row in database.list_jobs(status="success", machine="b")],
+            ["job-0", "job-2"],
+        )
+        self.assertEqual(
+            [row["job_id"] for row in database.list_jobs(since="2026-01-03", until="2026-01-05",
+                                                         name="step [23]")],
+            ["job-2", "job-3"],
+        )
+
+        pages = []
+        cursor = "0"
+        while True:
+            page = list(database.iter_jobs(after=cursor, limit=4))
+            if not page:
+                break
+            pages.append([row["job_id"] for row in page])
+            cursor = database.encode_cursor(page[-1])
+        self.assertEqual(pages, [[f"job-{index}" for index in range(4)], ["job-4", "job-5"]])
+
+    def test_jobs_without_creation_time_are_paged(self):
+        session_id = database.get_or_create_session("legacy")
+        for index in range(10):
+            database.save_job({
+                "job_id": f"job-{index}",
+                "session_id": session_id,
+                "name": "make",
+                "status": "success",
+                "date_created": None if index < 5 else f"2026-01-0{index}T00:00:00+00:00",
+            })
+        jobs = [row["job_id"] for row in database.iter_jobs(batch_size=3)]
+        self.assertEqual(jobs, [f"job-{index}" for index in range(10)])
+        pages = []
+        cursor = "0"
+        while True:
+            page = list(database.iter_jobs(after=cursor, limit=3))
+            if not page:
+                break
+            pages.extend(row["job_id"] for row in page)
+            cursor = database.encode_cursor(page[-1])
+        self.assertEqual(pages, jobs)
+        self.assertEqual([row["job_id"] for row in database.list_jobs(tail=6)], jobs[4:])
+
+
+if __name__ == "__main__":
+    unittest.main()
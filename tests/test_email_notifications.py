@@ -1,7 +1,11 @@
 """Regression tests for email notification presentation."""
 
+import gzip
+import os
+import tempfile
 import unittest
 
+from jort import reporting_callbacks
 from jort.reporting_callbacks import EmailNotification
 from jort.exceptions import JortException
 
@@ -56,6 +60,51 @@ class EmailNotificationTests(unittest.TestCase):
         self.assertIn("output.txt", message["body"])
         self.assertIn("output.txt", message["html_body"])
 
+    def test_digest_summarizes_statuses_slowest_jobs_and_failures(self):
+        payloads = [self.payload(name=f"job {index}", runtime=float(index))
+                    for index in range(10)]
+        payloads.append(self.payload(name="broken", status="error", runtime=0.5,
+                                     error_message="ValueError: <bad>\nTraceback..."))
+        message = self.notification.format_digest(payloads)
+
+        self.assertEqual(message["subject"], "[jort] Digest: 11 jobs, 1 not completed")
+        self.assertIn("11 jobs finished (10 completed, 1 failed)", message["body"])
+        self.assertIn("job 9", message["body"])
+        self.assertNotIn("job 3", message["body"])
+        self.assertIn("broken: ValueError: <bad>", message["body"])
+        self.assertNotIn("Traceback", message["body"])
+        self.assertIn("ValueError: &lt;bad&gt;", message["html_body"])
+
+    def test_large_output_is_attached_as_a_compressed_excerpt(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "output.txt")
+        with open(path, "wb") as f:
+            f.write(b"first line\n")
+            # Incompressible, so the compressed size passes the cap.
+            f.write(os.urandom(reporting_callbacks.EXCERPT_BYTES * 8).hex().encode())
+            f.write(b"\nlast line\n")
+
+        attachment = reporting_callbacks.output_attachment(path, "job-1", max_bytes=2**30)
+        self.assertFalse(attachment["excerpt"])
+        with open(path, "rb") as f:
+            self.assertEqual(gzip.decompress(attachment["data"]), f.read())
+
+        attachment = reporting_callbacks.output_attachment(path, "job-1", max_bytes=2**16)
+        self.assertTrue(attachment["excerpt"])
+        self.assertEqual(attachment["filename"], "output-excerpt.txt.gz")
+        excerpt = gzip.decompress(attachment["data"])
+        self.assertLess(len(excerpt), 2 * reporting_callbacks.EXCERPT_BYTES + 200)
+        self.assertTrue(excerpt.startswith(b"first line"))
+        self.assertTrue(excerpt.endswith(b"last line\n"))
+        self.assertIn(b"see `jort logs job-1`", excerpt)
+
+        message = self.notification.format_message(self.payload(stdout_fn="output.txt"),
+                                                   attachment)
+        self.assertIn("too large to attach", message["body"])
+        self.assertIn(path, message["body"])
+        self.assertIn("<strong>output-excerpt.txt.gz</strong>", message["html_body"])
+
     def test_unknown_status_is_rejected(self):
         with self.assertRaises(JortException):
             self.notification.format_message(self.payload(status="running"))
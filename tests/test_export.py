@@ -0,0 +1,75 @@
+"""Regression tests for streaming job exports."""
+
+import contextlib
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import unittest
+
+from jort import config
+from jort import database
+from jort import export
+
+from isolated import IsolatedTestCase
+
+
+class ExportTests(IsolatedTestCase):
+    def test_export_streams_decoded_rows_to_compressed_ndjson_and_csv(self):
+        config._initialize_db()
+        session_id = database.get_or_create_session("nightly")
+        for index in range(3):
+            database.save_job({
+                "job_id": f"job-{index}",
+                "session_id": session_id,
+                "name": "make",
+                "status": "success",
+                "date_created": f"2026-01-0{index + 1}T00:00:00+00:00",
+                "argv": ["make", "-j", "4"],
+                "command_hash": "hash-make",
+                "metadata": {"shell": False},
+            })
+        path = os.path.join(config._get_data_dir(), "jobs.ndjson.gz")
+        with export.open_output(path) as stream:
+            count = export.write_jobs(database.iter_jobs(since="2026-01-02", decode=True),
+                                      stream)
+        self.assertEqual(count, 2)
+        with gzip.open(path, "rt") as stream:
+            rows = [json.loads(line) for line in stream]
+        self.assertEqual([row["job_id"] for row in rows], ["job-1", "job-2"])
+        self.assertEqual(rows[0]["argv"], ["make", "-j", "4"])
+        self.assertEqual(rows[0]["session_name"], "nightly")
+
+        path = os.path.join(config._get_data_dir(), "jobs.csv")
+        with export.open_output(path) as stream:
+            export.write_jobs(database.iter_jobs(decode=True), stream, fmt="csv")
+        with open(path, newline="") as stream:
+            rows = list(csv.DictReader(stream))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(json.loads(rows[0]["metadata"]), {"shell": False})
+
+    def test_paused_export_does_not_block_writers(self):
+        session_id = database.get_or_create_session("nightly")
+        for index in range(5):
+            database.save_job({
+                "job_id": f"job-{index}",
+                "session_id": session_id,
+                "name": "make",
+                "status": "success",
+                "date_created": f"2026-01-0{index + 1}T00:00:00+00:00",
+            })
+        jobs = database.iter_jobs(decode=True, batch_size=2)
+        self.assertEqual(next(jobs)["job_id"], "job-0")
+        with contextlib.closing(
+            sqlite3.connect(config._get_database_path(), timeout=0.1)
+        ) as connection:
+            connection.execute("UPDATE jobs SET status = 'error' WHERE job_id = 'job-3'")
+            connection.commit()
+        rest = list(jobs)
+        self.assertEqual([job["job_id"] for job in rest], [f"job-{index}" for index in range(1, 5)])
+        self.assertEqual(rest[2]["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
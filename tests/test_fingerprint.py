@@ -0,0 +1,88 @@
+"""Regression tests for input-fingerprinted --unique caching."""
+
+import contextlib
+import os
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+from jort import config
+from jort import fingerprint
+from jort import track_cli
+
+from isolated import IsolatedTestCase
+
+
+class InputFingerprintTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        os.mkdir(os.path.join(self.directory, "data"))
+        self.input_path = os.path.join(self.directory, "data", "a.csv")
+        with open(self.input_path, "w") as stream:
+            stream.write("1,2\n")
+
+    def track(self):
+        return track_cli.track_new(
+            "touch out.txt",
+            cwd=self.directory,
+            session_name="cache",
+            unique=True,
+            quiet=True,
+            inputs=["data/*.csv"],
+            outputs=["out.txt"],
+        )
+
+    def test_rerun_only_when_inputs_change_or_outputs_are_missing(self):
+        first = self.track()
+        self.assertEqual(first["status"], "success")
+        self.assertEqual(list(first["metadata"]["inputs"]), [os.path.join("data", "a.csv")])
+        self.assertEqual(self.track()["status"], "skipped")
+
+        os.unlink(os.path.join(self.directory, "out.txt"))
+        self.assertEqual(self.track()["status"], "success")
+
+        with open(self.input_path, "w") as stream:
+            stream.write("3,4\n")
+        changed = self.track()
+        self.assertEqual(changed["status"], "success")
+        self.assertNotEqual(changed["command_hash"], first["command_hash"])
+
+    def test_working_directory_is_not_treated_as_a_pattern(self):
+        cwd = os.path.join(self.directory, "runs[1]")
+        os.makedirs(os.path.join(cwd, "data"))
+        with open(os.path.join(cwd, "data", "b.csv"), "w") as stream:
+            stream.write("5,6\n")
+        self.assertEqual(fingerprint.expand_paths(["data/*.csv", "data"], cwd),
+                         [os.path.join(cwd, "data", "b.csv")])
+
+    def test_unchanged_files_reuse_cached_digest(self):
+        first = fingerprint.file_digests([self.input_path])
+        with patch.object(fingerprint, "_sha256") as sha256:
+            self.assertEqual(fingerprint.file_digests([self.input_path]), first)
+        sha256.assert_not_called()
+
+    def test_hashing_does_not_hold_a_write_lock(self):
+        second_path = os.path.join(self.directory, "data", "b.csv")
+        with open(second_path, "w") as stream:
+            stream.write("5,6\n")
+        hash_file = fingerprint._sha256
+
+        def hash_while_writing(path):
+            # Another jort process saving a job while inputs are hashed.
+            with contextlib.closing(
+                sqlite3.connect(config._get_database_path(), timeout=0.1)
+            ) as connection:
+                connection.execute("DELETE FROM file_hashes WHERE path = 'elsewhere'")
+                connection.commit()
+            return hash_file(path)
+
+        with patch.object(fingerprint, "_sha256", side_effect=hash_while_writing):
+            digests = fingerprint.file_digests([self.input_path, second_path])
+        self.assertEqual(list(digests), [self.input_path, second_path])
+        with patch.object(fingerprint, "_sha256") as sha256:
+            self.assertEqual(fingerprint.file_digests([self.input_path, second_path]), digests)
+        sha256.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
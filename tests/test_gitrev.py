@@ -0,0 +1,78 @@
+"""Regression tests for in-process git revision resolution."""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from jort import gitrev
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class HeadResolutionTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.repo = os.path.join(self.directory, "repo")
+        os.makedirs(os.path.join(self.repo, "src"))
+        self.git("init", "--quiet")
+        for patcher in (patch.object(gitrev, "_locations", {}),
+                        patch.object(gitrev, "_heads", {})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def git(self, *args, cwd=None):
+        return subprocess.run(
+            ["git", "-c", "user.name=jort", "-c", "user.email=jort@example.com", *args],
+            cwd=cwd or self.repo, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout.strip()
+
+    def commit(self, cwd=None):
+        self.git("commit", "--quiet", "--allow-empty", "-m", "change", cwd=cwd)
+        return self.git("rev-parse", "HEAD", cwd=cwd)
+
+    def assertResolves(self, cwd, expected):
+        with patch.object(gitrev, "_rev_parse", side_effect=AssertionError("git was started")):
+            self.assertEqual(gitrev.head_sha(cwd), expected)
+
+    def test_matches_git_across_layouts(self):
+        src = os.path.join(self.repo, "src")
+        self.assertResolves(src, None)
+        first = self.commit()
+        self.assertResolves(src, first)
+        # A new commit rewrites the loose branch ref and invalidates the cache.
+        second = self.commit()
+        self.assertResolves(src, second)
+
+        self.git("pack-refs", "--all")
+        self.assertFalse(os.path.exists(os.path.join(self.repo, ".git", "refs", "heads",
+                                                     self.git("branch", "--show-current"))))
+        self.assertResolves(src, second)
+
+        self.git("checkout", "--quiet", "--detach", first)
+        self.assertResolves(src, first)
+
+        worktree = os.path.join(self.directory, "worktree")
+        self.git("worktree", "add", "--quiet", "-b", "topic", worktree, second)
+        self.assertResolves(worktree, second)
+        third = self.commit(worktree)
+        self.assertResolves(worktree, third)
+        self.assertResolves(src, first)
+
+        self.assertResolves(self.directory, None)
+
+    def test_unsupported_layouts_fall_back_to_git(self):
+        sha = self.commit()
+        os.mkdir(os.path.join(self.repo, ".git", "reftable"))
+        self.assertEqual(gitrev.head_sha(self.repo), sha)
+        with patch.dict(os.environ, {"GIT_DIR": os.path.join(self.repo, ".git")}), \
+                patch.object(gitrev, "_rev_parse", return_value="from-git") as rev_parse:
+            self.assertEqual(gitrev.head_sha(self.directory), "from-git")
+        rev_parse.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""Regression tests for the low-overhead benchmark harness."""
+
+import itertools
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from jort import config
+from jort import database
+from jort import exceptions
+from jort import harness
+from jort import jort_exe
+
+from isolated import IsolatedTestCase
+
+
+class BenchmarkHarnessTests(IsolatedTestCase):
+    def fake_spawn(self, runtimes):
+        runtimes = iter(runtimes)
+        return lambda *args, **kwargs: {"runtime": next(runtimes), "exit_code": 0,
+                                        "pid": 1, "metrics": {}}
+
+    def test_warmup_continues_until_runtimes_stop_improving(self):
+        warmups = [2.0, 1.8, 1.6, 1.4, 1.2, 1.0]
+        with patch.object(harness, "spawn",
+                          self.fake_spawn(itertools.chain(warmups, itertools.repeat(1.0)))):
+            summary = harness.run_benchmark(["bench"], warmup=1, max_warmup=20, to_db=False)
+        # Two flat windows of three runs after the last improvement.
+        self.assertEqual(summary["warmup"], 11)
+
+    def test_repeats_until_target_interval_and_flags_outliers(self):
+        measured = [1.0, 1.5, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 3.0] + [1.0] * 200
+        with patch.object(harness, "spawn", self.fake_spawn([1.0] + measured)):
+            summary = harness.run_benchmark(["bench"], repeat=2, target_ci=10, to_db=False)
+        self.assertGreater(summary["repeat"], 10)
+        self.assertLess(summary["repeat"], 100)
+        self.assertLessEqual(summary["ci_half_width_percent"], 10)
+        self.assertEqual(summary["outliers"], [1, 9])
+
+    def test_runs_are_saved_together_with_resource_usage(self):
+        command = [sys.executable, "-c", "pass"]
+        with patch.object(database, "save_jobs", wraps=database.save_jobs) as save_jobs:
+            summary = harness.run_benchmark(command, repeat=3, warmup=0)
+        save_jobs.assert_called_once()
+        self.assertEqual(summary["status"], "success")
+        jobs = database.list_jobs(session="benchmark", full_details=True)
+        self.assertEqual(len(jobs), 3)
+        job = database.get_job(summary["job_ids"][0])
+        self.assertEqual(job["command_hash"], summary["command_hash"])
+        self.assertIn("cpu_user_seconds", job["metrics"])
+        self.assertEqual(job["metadata"]["benchmark"]["index"], 0)
+
+    def test_shell_overhead_is_subtracted(self):
+        with patch.object(harness, "calibrate", return_value=0.25), \
+                patch.object(harness, "spawn", self.fake_spawn(itertools.repeat(1.0))):
+            summary = harness.run_benchmark("bench", shell=True, warmup=0, to_db=False)
+        self.assertAlmostEqual(summary["mean_seconds"], 0.75)
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "CPU pinning is not supported")
+    def test_runs_are_pinned_prioritized_and_wrapped_in_hooks(self):
+        cpu = min(os.sched_getaffinity(0))
+        nice = max(os.getpriority(os.PRIO_PROCESS, 0), 5)
+        log = os.path.join(config.JORT_DIR, "hooks.log")
+        check = (f"import os, sys; sys.exit(os.sched_getaffinity(0) != {{{cpu}}} "
+                 f"or os.getpriority(os.PRIO_PROCESS, 0) != {nice})")
+        summary = harness.run_benchmark(
+            [sys.executable, "-c", check], repeat=2, warmup=1, cpus={cpu}, nice=nice,
+            prepare=f"echo prepare >> {log}", cleanup=f"echo cleanup >> {log}",
+        )
+        self.assertEqual(summary["status"], "success")
+        with open(log) as f:
+            self.assertEqual(f.read().split(), ["prepare", "cleanup"] * 3)
+        environment = database.get_job(summary["job_ids"][0])["metadata"]["environment"]
+        self.assertEqual(environment["cpus"], [cpu])
+        self.assertEqual(len(environment["loadavg"]), 3)
+        self.assertIn("cpu_governor", environment)
+
+        with self.assertRaises(exceptions.JortException):
+            harness.run_benchmark(["true"], prepare="exit 3", to_db=False)
+        with self.assertRaises(exceptions.JortException):
+            harness.parse_ionice("idle:3")
+
+    def test_interleaved_commands_are_compared_against_the_first(self):
+        slow = [sys.executable, "-c", "import time; time.sleep(0.05)"]
+        fast = [sys.executable, "-c", "pass"]
+        result = harness.run_interleaved([slow, fast], repeat=6, warmup=0, seed=3)
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["rounds"], 6)
+        comparison = result["comparisons"][0]
+        self.assertGreater(comparison["speedup"], 1.2)
+        self.assertLessEqual(comparison["ci_low"], comparison["speedup"])
+        self.assertLess(comparison["p_value"], 0.01)
+
+        jobs = database.list_jobs(session="benchmark", full_details=True)
+        self.assertEqual({job["command_hash"] for job in jobs},
+                         {summary["command_hash"] for summary in result["commands"]})
+        slots = {}
+        for job in jobs:
+            benchmark = database.get_job(job["job_id"])["metadata"]["benchmark"]
+            self.assertEqual(benchmark["group"], result["group"])
+            slots.setdefault(benchmark["round"], {})[benchmark["slot"]] = job["command_hash"]
+        self.assertEqual(len(slots), 6)
+        # The first command does not always run first.
+        self.assertEqual(len({round_slots[0] for round_slots in slots.values()}), 2)
+
+        with self.assertRaises(exceptions.JortException):
+            harness.run_interleaved([fast, fast], to_db=False)
+
+    def test_interleaved_warmup_is_adaptive_and_outliers_are_reported(self):
+        def fake_spawn(target, **kwargs):
+            return {"runtime": next(runtimes[target[0]]), "exit_code": 0, "pid": 1,
+                    "metrics": {}}
+
+        warmups = [2.0, 1.8, 1.6, 1.4, 1.2, 1.0] + [1.0] * 5
+        outputs = {}
+        for arguments in ([], ["--json"]):
+            slow = itertools.chain(warmups, [1.0] * 9, [3.0], itertools.repeat(1.0))
+            runtimes = {"slow": slow, "fast": itertools.repeat(0.5)}
+            with patch.object(harness, "calibrate", return_value=0.0), \
+                    patch.object(harness, "spawn", fake_spawn):
+                result = CliRunner().invoke(jort_exe.cli, [
+                    "benchmark", "-c", "slow", "-c", "fast", "-r", "10", "--warmup", "1",
+                    "--max-warmup", "20", *arguments,
+                ])
+            self.assertEqual(result.exit_code, 0, result.output)
+            outputs[bool(arguments)] = result.output
+        # Warmup continues until the slow command's runtimes are steady.
+        self.assertEqual(json.loads(outputs[True])["warmup"], 11)
+        self.assertIn("Warning: 1 of 10 runs of `slow` are outliers", outputs[False])
+        self.assertNotIn("of `fast`", outputs[False])
+        with patch.object(harness, "calibrate", return_value=0.0), \
+                patch.object(harness, "spawn", self.fake_spawn(itertools.repeat(1.0))):
+            result = harness.run_interleaved([["slow"], ["fast"]], repeat=2, warmup=2,
+                                             max_warmup=1, to_db=False)
+        self.assertEqual(result["warmup"], 2)
+
+    def test_parameter_sweep_runs_each_cell_as_its_own_command(self):
+        cells = harness.expand_params(
+            "awk '{print}' -v t={threads} {size}.csv",
+            [harness.parse_param("threads=1,2"), harness.parse_param("size=small, large")],
+        )
+        self.assertEqual([command for _, command in cells], [
+            "awk '{print}' -v t=1 small.csv", "awk '{print}' -v t=1 large.csv",
+            "awk '{print}' -v t=2 small.csv", "awk '{print}' -v t=2 large.csv",
+        ])
+        with self.assertRaises(exceptions.JortException):
+            harness.expand_params("true", [("threads", ["1"])])
+
+        result = CliRunner().invoke(jort_exe.cli, [
+            "benchmark", "-r", "2", "--warmup", "0", "--json", "-p", "code=0,1",
+            "--", sys.executable, "-c", "pass # {code}",
+        ])
+        self.assertEqual(result.exit_code, 0, result.output)
+        sweep = json.loads(result.output)
+        self.assertEqual([cell["params"] for cell in sweep["cells"]],
+                         [{"code": "0"}, {"code": "1"}])
+        hashes = {job["command_hash"] for job in database.list_jobs(session="benchmark",
+                                                                    full_details=True)}
+        self.assertEqual(hashes, {cell["command_hash"] for cell in sweep["cells"]})
+        self.assertEqual(len(hashes), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Regression tests for per-commit history and regression bisection."""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+
+from click.testing import CliRunner
+
+from jort import history
+from jort import jort_exe
+
+from isolated import IsolatedTestCase
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class BisectTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = os.path.join(self.directory, "repo")
+        os.mkdir(self.repo)
+        self.git("init", "--quiet")
+        # Commit 3 of 6 adds a 0.5 second sleep, ten times a run's startup time.
+        self.shas = []
+        for index in range(6):
+            with open(os.path.join(self.repo, "work.py"), "w") as f:
+                f.write(f"import time\ntime.sleep({0.5 if index >= 3 else 0.0})  # {index}\n")
+            self.git("add", "work.py")
+            self.git("commit", "--quiet", "-m", f"change {index}")
+            self.shas.append(self.git("rev-parse", "HEAD").strip())
+
+    def git(self, *args):
+        return subprocess.run(
+            ["git", "-c", "user.name=jort", "-c", "user.email=jort@example.com", *args],
+            cwd=self.repo, check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout
+
+    def test_bisect_finds_first_slow_commit_and_history_lists_it(self):
+        result = history.bisect([sys.executable, "work.py"], self.shas[0], self.shas[-1],
+                                threshold=300, repeat=2, warmup=0, cwd=self.repo)
+        self.assertEqual(result["first_bad"], self.shas[3])
+        self.assertEqual(result["subject"], "change 3")
+        self.assertLessEqual(len(result["steps"]), 5)
+        self.assertEqual(self.git("worktree", "list").count("\n"), 1)
+        steps = result["steps"]
+
+        result = CliRunner().invoke(jort_exe.cli, ["history", "-C", self.repo, "--json",
+                                                   "*work.py"])
+        commits = json.loads(result.output)
+        measured = [sha for sha in self.shas if sha in {step["git_sha"] for step in steps}]
+        self.assertEqual([commit["git_sha"] for commit in commits], measured)
+        self.assertEqual(commits[0]["count"], 2)
+        jump = next(commit for commit in commits if commit["git_sha"] == self.shas[3])
+        self.assertGreater(jump["change_percent"], 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
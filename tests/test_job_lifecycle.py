@@ -5,11 +5,13 @@ import os
 import subprocess
 import sys
 import tempfile
+import threading
 import unittest
 from unittest.mock import patch
 
 import click
 
+import jort
 from jort import jort_exe
 from jort import tracker
 from jort import track_cli
@@ -31,6 +33,18 @@ class SucceedingCallback:
         return {"id": "message-1"}
 
 
+class SlowCallback:
+    channel = "email"
+
+    def __init__(self, release):
+        self.release = release
+
+    def execute(self, payload):
+        if not self.release.wait(5):
+            raise RuntimeError("smtp timed out")
+        return {"recipient": "me@example.com"}
+
+
 class JobLifecycleTests(unittest.TestCase):
     def test_successful_output_containing_exception_is_success(self):
         payload = track_cli.track_new(
@@ -79,6 +93,30 @@ class JobLifecycleTests(unittest.TestCase):
         self.assertEqual(payload["notifications"]["email"]["status"], "failed")
         self.assertEqual(payload["notifications"]["text"]["status"], "sent")
 
+    def test_background_notifications_do_not_delay_stop(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(config, "JORT_DIR", directory), \
+                patch.object(config, "CONFIG_PATH", os.path.join(directory, "config")), \
+                patch.object(config, "_get_data_dir", return_value=directory), \
+                patch.object(config, "_get_database_path",
+                             return_value=os.path.join(directory, "jort.db")):
+            release = threading.Event()
+            tr = tracker.Tracker(to_db=True, background_notifications=True)
+            tr.start("job", metadata={"notification_channels": ["email"]})
+            payload = tr.stop(callbacks=[SlowCallback(release), SucceedingCallback()])
+            self.assertEqual(payload["notifications"]["email"], {"status": "pending"})
+            self.assertEqual(payload["notifications"]["text"], {"status": "pending"})
+            self.assertFalse(jort.flush_notifications(timeout=0.05))
+
+            release.set()
+            self.assertTrue(jort.flush_notifications(timeout=5))
+            self.assertEqual(payload["notifications"]["email"]["status"], "sent")
+            saved = database.get_job(payload["job_id"])
+            self.assertEqual(saved["notifications"]["email"]["result"],
+                             {"recipient": "me@example.com"})
+            self.assertEqual(saved["notifications"]["text"]["status"], "sent")
+            self.assertEqual(database.pending_notifications(payload["job_id"]), [])
+
     def test_database_round_trip_and_parameterized_session_filter(self):
         with tempfile.TemporaryDirectory() as directory:
             database_path = os.path.join(directory, "jort.db")
@@ -0,0 +1,98 @@
+"""Regression tests for running-job heartbeats and reaping dead jobs."""
+
+import contextlib
+import os
+import subprocess
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+import psutil
+from click.testing import CliRunner
+
+from jort import database
+from jort import datetime_utils
+from jort import liveness
+from jort import track_cli
+
+from isolated import IsolatedTestCase
+
+
+class LivenessTests(IsolatedTestCase):
+    def running_job(self, job_id, monitor, age, machine=None):
+        payload = {"job_id": job_id, "name": job_id, "status": "running",
+                   "machine": machine or liveness.socket.gethostname(),
+                   "date_created": datetime_utils.get_iso_date(time.time() - age - 60),
+                   "date_modified": datetime_utils.get_iso_date(), "runtime": 1.0}
+        database.record_heartbeat(payload, 10, monitor)
+        with contextlib.closing(database._connect()) as connection:
+            connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?",
+                               (int((time.time() - age) * 10**6), job_id))
+            connection.commit()
+
+    def test_heartbeats_save_progress_until_closed(self):
+        payload = {"job_id": "job", "name": "train", "status": "running",
+                   "session_id": database.get_or_create_session("s"),
+                   "date_created": datetime_utils.get_iso_date(),
+                   "_monotonic_start": time.monotonic() - 5, "runtime": 0.0}
+        heartbeat = liveness.Heartbeat(payload, interval=60)
+        self.assertFalse(heartbeat.beat())
+        self.assertIsNone(database.get_job("job"))
+
+        heartbeat.output()
+        self.assertTrue(heartbeat.beat(metrics={"rss_bytes": 10, "peak_rss_bytes": 20},
+                                       force=True))
+        job = database.get_job("job")
+        self.assertEqual(job["status"], "running")
+        self.assertGreaterEqual(job["runtime"], 5)
+        self.assertEqual(job["metrics"], {"rss_bytes": 10, "peak_rss_bytes": 20})
+        self.assertEqual((job["monitor_pid"], job["heartbeat_interval"]), (os.getpid(), 60))
+        self.assertIsNotNone(job["last_output_at"])
+        self.assertEqual(database.list_jobs()[0]["heartbeat_at"], job["heartbeat_at"])
+
+        heartbeat.close()
+        database.save_job(dict(job, status="success"))
+        self.assertFalse(heartbeat.beat(force=True))
+        self.assertEqual(database.get_job("job")["status"], "success")
+        self.assertEqual(database.get_job("job")["heartbeat_at"], job["heartbeat_at"])
+
+    def test_tracked_commands_send_heartbeats(self):
+        with patch.object(database, "record_heartbeat",
+                          wraps=database.record_heartbeat) as record:
+            payload = track_cli.track_new(
+                [sys.executable, "-c", "import time; print('x', flush=True); time.sleep(0.8)"],
+                to_db=True, quiet=True, heartbeat_seconds=0.2,
+            )
+        self.assertGreaterEqual(record.call_count, 2)
+        self.assertEqual(record.call_args.args[0]["status"], "running")
+        job = database.get_job(payload["job_id"])
+        self.assertEqual(job["status"], "success")
+        self.assertIsNotNone(job["last_output_at"])
+
+    def test_jobs_are_reaped_only_when_stale_and_their_monitor_is_gone(self):
+        exited = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        dead_monitor = (exited.pid, psutil.Process(exited.pid).create_time())
+        exited.kill()
+        exited.wait()
+        self.running_job("killed", dead_monitor, age=120)
+        self.running_job("recent", dead_monitor, age=5)
+        self.running_job("alive", liveness.monitor_identity(), age=120)
+        self.running_job("reused", (os.getpid(), 1.0), age=120)
+        self.running_job("remote", dead_monitor, age=120, machine="elsewhere")
+
+        self.assertEqual([job["job_id"] for job in liveness.stale_jobs()], ["killed", "reused"])
+        result = CliRunner().invoke(liveness.reap, ["--dry-run"])
+        self.assertIn("Would mark killed dead", result.output)
+        self.assertEqual(database.get_job("killed")["status"], "running")
+
+        result = CliRunner().invoke(liveness.reap, [])
+        self.assertEqual(result.exit_code, 0, result.output)
+        for job_id, status in (("killed", "dead"), ("reused", "dead"), ("recent", "running"),
+                               ("alive", "running"), ("remote", "running")):
+            self.assertEqual(database.get_job(job_id)["status"], status, job_id)
+        self.assertEqual(liveness.reap_jobs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
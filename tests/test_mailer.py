@@ -0,0 +1,163 @@
+"""Regression tests for pooled SMTP delivery against a local stand-in server."""
+
+import contextlib
+import os
+import shutil
+import socket
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from jort import config
+from jort import mailer
+from jort import reporting_callbacks
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.counts["connections"] += 1
+            server.sockets.append(self.connection)
+        self.reply("220 localhost ESMTP stand-in")
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN")
+            elif command.startswith("AUTH"):
+                with server.lock:
+                    server.counts["logins"] += 1
+                self.reply("235 2.7.0 Authentication successful")
+            elif command.startswith(("MAIL", "RCPT", "RSET")):
+                self.reply("250 OK")
+            elif command == "NOOP":
+                with server.lock:
+                    server.counts["noops"] += 1
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                with server.lock:
+                    server.counts["messages"] += 1
+                self.reply("250 OK queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, context):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.context = context
+        self.lock = threading.Lock()
+        self.sockets = []
+        self.counts = {"connections": 0, "logins": 0, "noops": 0, "messages": 0}
+
+    def get_request(self):
+        sock, address = super().get_request()
+        return self.context.wrap_socket(sock, server_side=True), address
+
+    def drop_connections(self):
+        with self.lock:
+            sockets, self.sockets = self.sockets, []
+        for sock in sockets:
+            with contextlib.suppress(OSError):
+                sock.shutdown(socket.SHUT_RDWR)
+
+
+@unittest.skipUnless(shutil.which("openssl"), "openssl is not installed")
+class SMTPPoolTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        certificate = os.path.join(directory.name, "cert.pem")
+        key = os.path.join(directory.name, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1",
+             "-keyout", key, "-out", certificate],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(certificate, key)
+        self.client_context = ssl.create_default_context(cafile=certificate)
+
+        self.server = SMTPStandIn(server_context)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.port = self.server.server_address[1]
+
+    def pool(self, **kwargs):
+        pool = mailer.SMTPPool("127.0.0.1", self.port, "me@example.com", "secret",
+                               context=self.client_context, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_connections_are_reused_checked_and_replaced(self):
+        pool = self.pool(max_messages=150)
+        start = time.perf_counter()
+        for _ in range(200):
+            pool.sendmail("me@example.com", "me@example.com", "Subject: done\r\n\r\nok")
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(self.server.counts["messages"], 200)
+        # One login per connection, replaced after max_messages.
+        self.assertEqual(self.server.counts["logins"], 2)
+
+        self.server.drop_connections()
+        pool.sendmail("me@example.com", "me@example.com", "Subject: done\r\n\r\nok")
+        self.assertEqual(self.server.counts["messages"], 201)
+        self.assertEqual(self.server.counts["logins"], 3)
+
+        pool.check_after = 0
+        pool.sendmail("me@example.com", "me@example.com", "Subject: done\r\n\r\nok")
+        self.assertEqual(self.server.counts["noops"], 1)
+        self.assertEqual(self.server.counts["logins"], 3)
+
+    def test_concurrent_senders_share_a_bounded_pool(self):
+        pool = self.pool(max_connections=2)
+        threads = [threading.Thread(target=lambda: [
+            pool.sendmail("me@example.com", "me@example.com", "Subject: x\r\n\r\nok")
+            for _ in range(10)
+        ]) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.counts["messages"], 60)
+        self.assertLessEqual(self.server.counts["connections"], 2)
+
+    def test_email_notifications_share_the_account_pool(self):
+        settings = {"email": "me@example.com", "email_password": "secret",
+                    "smtp_server": "127.0.0.1", "smtp_port": self.port}
+        payload = {"name": "job", "status": "success", "runtime": 1.0,
+                   "date_modified": "2026-01-01T00:00:00", "stdout_fn": None}
+        with patch.object(config, "_get_config_data", return_value=settings), \
+                patch.object(mailer, "_default_context", return_value=self.client_context), \
+                patch.object(mailer, "_pools", {}):
+            for _ in range(3):
+                result = reporting_callbacks.EmailNotification().execute(payload)
+                self.assertEqual(result, {"recipient": "me@example.com"})
+            mailer.close_all()
+        self.assertEqual(self.server.counts["messages"], 3)
+        self.assertEqual(self.server.counts["logins"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
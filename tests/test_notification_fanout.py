@@ -0,0 +1,104 @@
+"""Regression tests for concurrent notification delivery and the webhook channel."""
+
+import asyncio
+import http.server
+import json
+import os
+import threading
+import time
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+from jort import dispatch
+from jort import reporting_callbacks
+
+
+class WebhookHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.received.append((self.path, body))
+        self.send_response(500 if self.path == "/broken" else 204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SleepingCallback(reporting_callbacks.Callback):
+    def __init__(self, channel, seconds, timeout=None):
+        self.channel = channel
+        self.seconds = seconds
+        self.timeout = timeout
+
+    def format_message(self, payload):
+        return ""
+
+    def execute(self, payload):
+        time.sleep(self.seconds)
+        return {"slept": self.seconds}
+
+
+class NotificationFanOutTests(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+        self.server.received = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.payload = {"job_id": "job-1", "name": "make", "status": "success",
+                        "runtime": 2.0, "exit_code": 0}
+
+    def test_webhook_posts_job_summary_synchronously_and_asynchronously(self):
+        webhook = reporting_callbacks.WebhookNotification(url=f"{self.url}/hook?token=1")
+        self.assertEqual(webhook.execute(self.payload), {"status_code": 204})
+        self.assertEqual(asyncio.run(webhook.execute_async(self.payload)),
+                         {"status_code": 204})
+        self.assertEqual(len(self.server.received), 2)
+        path, body = self.server.received[1]
+        self.assertEqual(path, "/hook?token=1")
+        self.assertEqual((body["job_id"], body["status"], body["exit_code"]),
+                         ("job-1", "success", 0))
+        self.assertIn("make", body["text"])
+
+        # Asynchronous posts go through the same HTTP client, proxies included.
+        proxied = reporting_callbacks.WebhookNotification(url="http://webhook.invalid/hook")
+        # urlopen reads the proxy settings when it first builds its opener.
+        with patch.dict(os.environ, {"http_proxy": self.url, "no_proxy": ""}), \
+                patch.object(urllib.request, "_opener", None):
+            self.assertEqual(asyncio.run(proxied.execute_async(self.payload)),
+                             {"status_code": 204})
+        self.assertEqual(self.server.received[2][0], "http://webhook.invalid/hook")
+
+        broken = reporting_callbacks.WebhookNotification(url=f"{self.url}/broken")
+        outcomes = dispatch.deliver_all([broken], self.payload)
+        self.assertEqual(outcomes["webhook"],
+                         {"status": "failed", "error": "Webhook returned HTTP 500"})
+
+    def test_channels_are_sent_concurrently_within_their_timeouts(self):
+        callbacks = [
+            SleepingCallback("email", 0.5),
+            SleepingCallback("text", 0.5),
+            SleepingCallback("stuck", 5.0, timeout=0.5),
+            reporting_callbacks.WebhookNotification(url=self.url),
+        ]
+        start = time.perf_counter()
+        outcomes = dispatch.deliver_all(callbacks, self.payload, timeouts={"text": 1.0})
+        elapsed = time.perf_counter() - start
+        # Sent one after another, the channels would take at least 1.5 s.
+        self.assertLess(elapsed, 0.75 * (0.5 + 0.5 + 0.5))
+        self.assertEqual(outcomes["email"], {"status": "sent", "result": {"slept": 0.5}})
+        self.assertEqual(outcomes["text"]["status"], "sent")
+        self.assertEqual(outcomes["stuck"],
+                         {"status": "timeout", "error": "timed out after 0.5 s"})
+        self.assertEqual(outcomes["webhook"]["result"], {"status_code": 204})
+
+        async def from_running_loop():
+            return dispatch.deliver_all(callbacks[:1], self.payload)
+
+        self.assertEqual(asyncio.run(from_running_loop())["email"]["status"], "sent")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Regression tests for notification rules judged against a command's history."""
+
+import unittest
+
+from jort import database
+from jort import exceptions
+from jort import rules
+from jort import tracker
+
+from isolated import IsolatedTestCase
+
+
+class RecordingCallback:
+    channel = "email"
+
+    def __init__(self):
+        self.delivered = []
+
+    def execute(self, payload):
+        self.delivered.append(payload)
+        return {"sent": True}
+
+
+class NotificationRuleTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        # Ten successful runs taking 10-19 s and 100-190 MB, and one slow failure.
+        for index in range(11):
+            database.save_job({
+                "job_id": f"job-{index}",
+                "name": "make",
+                "status": "success" if index < 10 else "error",
+                "date_created": f"2026-01-01T00:00:{index:02d}+00:00",
+                "date_modified": f"2026-01-01T00:01:{index:02d}+00:00",
+                "runtime": 100.0 if index == 10 else 10.0 + index,
+                "command_hash": "abc",
+                "metrics": {"peak_rss_bytes": (100 + 10 * index) * 10**6},
+            })
+
+    def payload(self, **fields):
+        return {"status": "success", "exit_code": 0, "runtime": 12.0, "command_hash": "abc",
+                "metrics": {"peak_rss_bytes": 120 * 10**6}, **fields}
+
+    def test_rules_are_validated(self):
+        for text in ("runtime", "speed > 3", "status > success", "runtime > p95 * 2",
+                     "exit_code > median"):
+            with self.assertRaises(exceptions.JortException):
+                rules.Rule(text)
+        rule = rules.Rule("peak_rss > median+20%")
+        self.assertEqual((rule.metric, rule.operator, rule.statistic, rule.percent),
+                         ("peak_rss", ">", "median", 20.0))
+
+    def test_alerts_report_matches_against_successful_runs(self):
+        texts = ["runtime > p95", "peak_rss > median+20%", "status != success", "exit_code != 0"]
+        self.assertEqual(rules.evaluate(texts, self.payload()), [])
+
+        alerts = rules.evaluate(texts, self.payload(runtime=30.0, status="error", exit_code=2,
+                                                    metrics={"peak_rss_bytes": 200 * 10**6}))
+        self.assertEqual(len(alerts), 4)
+        # The failed 100 s run is not part of the baseline.
+        self.assertEqual(alerts[0], "runtime 30 seconds > p95 18.55 seconds of the last 10 "
+                                    "successful runs")
+        self.assertIn("median+20%", alerts[1])
+        self.assertEqual(alerts[2], "status is error (status != success)")
+
+        # Baselines need a few runs, and only the newest count.
+        self.assertEqual(rules.evaluate(["runtime > p95"], self.payload(runtime=30.0),
+                                        baseline_runs=3), [])
+        self.assertEqual(len(rules.evaluate(["runtime > mean"], self.payload(runtime=16.5))), 1)
+        self.assertEqual(rules.evaluate(["runtime > mean"], self.payload(runtime=16.5),
+                                        baseline_runs=5), [])
+
+    def test_unmatched_rules_skip_notifications(self):
+        email = RecordingCallback()
+        tr = tracker.Tracker(to_db=True)
+        tr.start("make", metadata={"command_hash": "abc", "notification_channels": ["email"]})
+        payload = tr.stop(callbacks=[email], notify_if=["runtime > p95"])
+        self.assertEqual(payload["notifications"]["email"], {"status": "skipped"})
+        self.assertEqual(email.delivered, [])
+        self.assertEqual(database.pending_notifications(), [])
+
+        tr.start("make", metadata={"command_hash": "abc", "notification_channels": ["email"]})
+        tr.open_block_payloads["make"]["status"] = "error"
+        payload = tr.stop(callbacks=[email], notify_if=["runtime > p95", "status != success"])
+        self.assertEqual(payload["alerts"], ["status is error (status != success)"])
+        self.assertEqual(email.delivered[0]["alerts"], payload["alerts"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""Regression tests for draining the durable notification outbox."""
+
+import contextlib
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from jort import config
+from jort import database
+from jort import dispatch
+from jort import outbox
+from jort import tracker
+
+from isolated import IsolatedTestCase
+
+
+class RecordingCallback:
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.active = 0
+        self.most_active = 0
+        self.delivered = []
+        self.digests = []
+        self.lock = threading.Lock()
+
+    def execute(self, payload):
+        with self.lock:
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            self.delivered.append(payload["job_id"])
+        if self.fail:
+            raise RuntimeError("smtp unavailable")
+        return {"id": payload["job_id"]}
+
+    def execute_digest(self, payloads):
+        self.digests.append(sorted(payload["job_id"] for payload in payloads))
+        return {"jobs": len(payloads)}
+
+
+class NotificationOutboxTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(6):
+            payload = {
+                "job_id": f"job-{index}",
+                "name": "job",
+                "status": "success",
+                "date_created": "2026-01-01T00:00:00+00:00",
+                "date_modified": "2026-01-01T00:00:01+00:00",
+                "notification_channels": ["email", "text"],
+                "notifications": {},
+            }
+            database.save_job(payload)
+            database.enqueue_notifications(payload)
+
+    def make_due(self):
+        with contextlib.closing(database._connect()) as connection:
+            connection.execute("UPDATE notifications SET next_attempt_at = NULL")
+            connection.commit()
+
+    def rows(self, channel):
+        return [row for row in database.pending_notifications() if row["channel"] == channel]
+
+    def test_deliveries_wait_out_the_grace_period_and_claims_are_exclusive(self):
+        self.assertEqual(outbox.claim("worker"), [])
+        self.make_due()
+        claims = []
+        workers = [threading.Thread(target=lambda: claims.append(outbox.claim(name, limit=5)))
+                   for name in ("a", "b", "c")]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        claimed = [row["notification_id"] for rows in claims for row in rows]
+        self.assertEqual(len(claimed), 12)
+        self.assertEqual(len(set(claimed)), 12)
+        self.assertEqual(outbox.claim("d"), [])
+        # A lost claim is not recorded.
+        self.assertIsNone(outbox.complete(claims[0][0], "d", {"status": "sent"}))
+
+    def test_timed_out_deliveries_are_not_retried(self):
+        database.update_notification("job-0", "email", "timeout", "timed out after 60 s")
+        self.make_due()
+        claimed = outbox.claim("worker")
+        self.assertEqual(len(claimed), 11)
+        self.assertNotIn(("job-0", "email"),
+                         [(row["job_id"], row["channel"]) for row in claimed])
+
+    def test_failed_deliveries_back_off_then_are_dead_lettered(self):
+        email = RecordingCallback(fail=True)
+        text = RecordingCallback(delay=0.02)
+        callbacks = {"email": email, "text": text}
+        self.make_due()
+        with patch.object(dispatch, "callback_for_channel",
+                          side_effect=lambda channel, validate: callbacks[channel]):
+            counts = outbox.drain(max_attempts=2, concurrency={"text": 2})
+            self.assertEqual(counts, {"sent": 6, "failed": 6, "dead": 0})
+            self.assertEqual(text.most_active, 2)
+            self.assertEqual(self.rows("text"), [])
+            now = time.time() * 10**6
+            for row in self.rows("email"):
+                self.assertEqual((row["status"], row["attempts"]), ("failed", 1))
+                self.assertIsNone(row["claimed_by"])
+                self.assertGreaterEqual(row["next_attempt_at"],
+                                        now + outbox.BASE_DELAY_SECONDS / 2 * 10**6 - 10**6)
+            # Not due yet.
+            self.assertEqual(outbox.drain(max_attempts=2)["failed"], 0)
+
+            self.make_due()
+            counts = outbox.drain(max_attempts=2)
+        self.assertEqual(counts, {"sent": 0, "failed": 0, "dead": 6})
+        self.assertEqual({row["status"] for row in self.rows("email")}, {"dead"})
+        self.assertEqual(len(email.delivered), 12)
+        job = database.get_job("job-0")
+        self.assertEqual(job["notifications"]["text"]["result"], {"id": "job-0"})
+        self.assertEqual(job["notifications"]["email"]["status"], "dead")
+
+    def test_rows_whose_lease_expires_mid_batch_are_not_sent_twice(self):
+        with contextlib.closing(database._connect()) as connection:
+            connection.execute("DELETE FROM notifications WHERE channel = 'text'")
+            connection.commit()
+        self.make_due()
+        intruder = []
+
+        class SlowCallback(RecordingCallback):
+            def execute(self, payload):
+                result = super().execute(payload)
+                if not intruder:
+                    # The lease has expired; another drainer claims the batch.
+                    intruder.extend(outbox.claim("intruder", lease=60))
+                return result
+
+        email = SlowCallback(delay=0.3)
+        with patch.object(dispatch, "callback_for_channel", return_value=email), \
+                patch.object(outbox, "claim", wraps=outbox.claim) as claim:
+            counts = outbox.drain(concurrency={"email": 1}, lease=0.1)
+        # Only as many rows as can be in flight are claimed at once.
+        self.assertEqual(claim.call_args_list[0].kwargs["limit"], 1 + 4 + 2)
+        # The rows taken over by the other drainer are left to it.
+        self.assertEqual(len(email.delivered), 1)
+        self.assertEqual(counts, {"sent": 0, "failed": 0, "dead": 0})
+        self.assertEqual(len(intruder), 6)
+        self.assertEqual({row["claimed_by"] for row in self.rows("email")}, {"intruder"})
+
+    def test_completions_within_a_window_are_sent_as_one_digest(self):
+        email = RecordingCallback()
+        email.channel = "email"
+        with patch.object(config, "digest_seconds",
+                          side_effect=lambda channel: 60 if channel == "email" else 0), \
+                patch.object(dispatch, "callback_for_channel", return_value=email):
+            tr = tracker.Tracker(to_db=True)
+            tr.start("late job", metadata={"notification_channels": ["email"]})
+            payload = tr.stop(callbacks=[email])
+            self.assertEqual(payload["notifications"]["email"],
+                             {"status": "pending", "digest": True})
+            self.assertEqual(email.delivered, [])
+
+            self.assertEqual(outbox.drain(), {"sent": 0, "failed": 0, "dead": 0})
+            with contextlib.closing(database._connect()) as connection:
+                connection.execute("UPDATE notifications SET next_attempt_at = NULL "
+                                   "WHERE job_id = 'job-0' AND channel = 'email'")
+                connection.commit()
+            counts = outbox.drain()
+        self.assertEqual(counts, {"sent": 7, "failed": 0, "dead": 0})
+        self.assertEqual(email.digests, [sorted([f"job-{index}" for index in range(6)]
+                                                + [payload["job_id"]])])
+        self.assertEqual(database.get_job("job-3")["notifications"]["email"]["digest"], 7)
+        # Text rows are not part of the email window.
+        self.assertEqual(len(self.rows("text")), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Regression tests for phase timing from output markers."""
+
+import json
+import sys
+import unittest
+
+from click.testing import CliRunner
+
+from jort import analytics
+from jort import database
+from jort import datetime_utils
+from jort import exceptions
+from jort import track_cli
+
+from isolated import IsolatedTestCase
+
+
+PHASED_SCRIPT = (
+    "import time\n"
+    "print('setup')\n"
+    "for name, seconds in (('load', 0.1), ('train', 0.3), ('load', 0.1)):\n"
+    "    print(f'== {name} ==', flush=True)\n"
+    "    time.sleep(seconds)\n"
+)
+
+
+class PhaseTests(IsolatedTestCase):
+    def test_output_markers_split_the_runtime_into_phases(self):
+        payload = track_cli.track_new([sys.executable, "-c", PHASED_SCRIPT], to_db=True,
+                                      quiet=True, phase_regex=r"^== (\w+) ==")
+        phases = payload["metadata"]["phases"]
+        self.assertEqual([phase["name"] for phase in phases], ["load", "train", "load"])
+        self.assertGreaterEqual(phases[1]["seconds"], 0.3)
+        self.assertLess(phases[1]["start_seconds"], phases[2]["start_seconds"])
+        self.assertLessEqual(sum(phase["seconds"] for phase in phases), payload["runtime"])
+        stored = database.get_job(payload["job_id"])
+        self.assertEqual(stored["metadata"]["phases"], phases)
+
+        with self.assertRaises(exceptions.JortException):
+            track_cli.track_new("echo", phase_regex="(")
+
+    def test_stats_compare_the_latest_phases_to_earlier_runs(self):
+        session_id = database.get_or_create_session("phases")
+        for index, train in enumerate((10.0, 12.0, 11.0, 22.0)):
+            database.save_job({
+                "job_id": f"job-{index}", "session_id": session_id, "name": "train.py",
+                "status": "success", "command_hash": "abc", "runtime": train + 1,
+                "date_created": datetime_utils.get_iso_date(1000 + index),
+                "metadata": {"phases": [{"name": "load", "start_seconds": 0, "seconds": 1.0},
+                                        {"name": "train", "start_seconds": 1, "seconds": train}]},
+            })
+        groups = analytics.summarize_phases()
+        self.assertEqual([group["phase"] for group in groups], ["load", "train"])
+        train = groups[1]
+        self.assertEqual((train["count"], train["latest"], train["p50"]), (4, 22.0, 11.5))
+        self.assertAlmostEqual(train["change_percent"], 100.0)
+        self.assertEqual(groups[0]["change_percent"], 0.0)
+
+        result = CliRunner().invoke(analytics.stats, ["--phases", "--json"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(json.loads(result.output), groups)
+        result = CliRunner().invoke(analytics.stats, ["--phases"])
+        self.assertIn("+100.0%", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
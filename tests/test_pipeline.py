@@ -0,0 +1,53 @@
+"""Regression tests for dependency-graph pipelines."""
+
+import unittest
+
+from jort import exceptions
+from jort import pipeline
+
+from isolated import IsolatedTestCase
+
+
+class PipelineTests(IsolatedTestCase):
+    def test_cycles_and_unknown_dependencies_are_rejected(self):
+        with self.assertRaises(exceptions.JortException):
+            pipeline.normalize_nodes({"a": {"command": "true", "needs": ["b"]},
+                                      "b": {"command": "true", "needs": ["a"]}})
+        with self.assertRaises(exceptions.JortException):
+            pipeline.normalize_nodes({"a": {"command": "true", "needs": ["missing"]}})
+
+    def test_critical_path_follows_slowest_chain(self):
+        nodes = pipeline.normalize_nodes({
+            "a": "true",
+            "b": {"command": "true", "needs": ["a"]},
+            "c": {"command": "true", "needs": ["a"]},
+            "d": {"command": "true", "needs": ["b", "c"]},
+        })
+        results = {"a": {"runtime": 1.0}, "b": {"runtime": 5.0},
+                   "c": {"runtime": 2.0}, "d": {"runtime": 1.0}}
+        path, seconds = pipeline.critical_path(nodes, results)
+        self.assertEqual(path, ["a", "b", "d"])
+        self.assertEqual(seconds, 7.0)
+
+    def test_rerun_skips_successful_nodes_and_failures_block_dependents(self):
+        nodes = {
+            "first": "python -c 'pass'",
+            "second": {"command": "python -c 'pass'", "needs": ["first"], "cwd": self.directory},
+            "broken": {"command": "python -c 'import sys; sys.exit(3)'", "needs": ["first"]},
+            "after_broken": {"command": "python -c 'pass'", "needs": ["broken"]},
+        }
+        summary = pipeline.run_pipeline(nodes, session_name="nightly", max_workers=2)
+        self.assertEqual(summary["status"], "error")
+        self.assertEqual(summary["nodes"]["first"]["status"], "success")
+        self.assertEqual(summary["nodes"]["broken"]["status"], "error")
+        self.assertEqual(summary["nodes"]["after_broken"]["status"], "blocked")
+        self.assertEqual(sorted(summary["failed"]), ["after_broken", "broken"])
+
+        rerun = pipeline.run_pipeline(nodes, session_name="nightly", max_workers=2)
+        self.assertEqual(rerun["nodes"]["first"]["status"], "skipped")
+        self.assertEqual(rerun["nodes"]["second"]["status"], "skipped")
+        self.assertEqual(rerun["nodes"]["broken"]["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Regression tests for pruning, archiving, and reclaiming job storage."""
+
+import gzip
+import json
+import os
+import unittest
+
+from jort import config
+from jort import database
+from jort import retention
+
+from isolated import IsolatedTestCase
+
+
+class RetentionTests(IsolatedTestCase):
+    def test_gc_archives_and_prunes_in_batches(self):
+        config._initialize_db()
+        data_dir = config._get_data_dir()
+        session_id = database.get_or_create_session("nightly")
+        for index in range(5):
+            stdout_fn = f"capture{index}.txt"
+            with open(os.path.join(data_dir, stdout_fn), "w") as stream:
+                stream.write("output\n")
+            database.save_job({
+                "job_id": f"job-{index}",
+                "session_id": session_id,
+                "name": "make",
+                "status": "running" if index == 0 else "success",
+                "date_created": f"2026-01-0{index + 1}T00:00:00+00:00",
+                "stdout_fn": stdout_fn,
+                "command_hash": "hash-make",
+                "notification_channels": ["email"],
+            })
+            database.enqueue_notifications(database.get_job(f"job-{index}"))
+        orphan = os.path.join(data_dir, "orphan.txt")
+        open(orphan, "w").close()
+        os.utime(orphan, (0, 0))
+
+        self.assertEqual(retention.prune_jobs(keep_last=1, dry_run=True)["jobs"], 3)
+        archive = os.path.join(data_dir, "archive.ndjson.gz")
+        counts = retention.prune_jobs(keep_last=1, archive=archive, batch_size=2)
+        self.assertEqual(counts, {"jobs": 3, "notifications": 3, "captures": 3})
+        # The running job is kept even though it is outside the newest one.
+        self.assertEqual([row["job_id"] for row in database.list_jobs()], ["job-0", "job-4"])
+        self.assertFalse(os.path.exists(os.path.join(data_dir, "capture1.txt")))
+        self.assertTrue(os.path.exists(os.path.join(data_dir, "capture4.txt")))
+
+        retention.prune_jobs(older_than="2026-01-06", statuses=["success"], archive=archive)
+        with gzip.open(archive, "rt") as stream:
+            archived = [json.loads(line)["job_id"] for line in stream]
+        self.assertEqual(sorted(archived), ["job-1", "job-2", "job-3", "job-4"])
+
+        self.assertEqual(retention.remove_orphaned_files(grace="1d"),
+                         {"orphaned_captures": 1, "stale_requests": 0})
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(os.path.join(data_dir, "capture0.txt")))
+        self.assertEqual(retention.reclaim_space()["auto_vacuum"], "incremental")
+
+
+if __name__ == "__main__":
+    unittest.main()